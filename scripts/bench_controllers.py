@@ -0,0 +1,113 @@
+import argparse
+import datetime
+import json
+import os
+import time
+
+import ipmininet
+from ipmininet.clean import cleanup
+from mininet.log import LEVELS, lg
+
+from srnmininet.config.config import SRCtrl, SRDNSProxy
+from srnmininet.square_axa import SquareAxA
+from srnmininet.srnnet import SRNNet
+from srnmininet.utils import daemon_in_node
+
+
+# Argument parsing
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the aggregate path request throughput"
+                                                 " of a SRN domain as SR controllers are added")
+    parser.add_argument('--log', choices=LEVELS.keys(), default='info',
+                        help='The level of details in the logs.')
+    parser.add_argument('--log-dir', help='Logging directory root',
+                        default='/tmp/logs-%s' % datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    parser.add_argument('--src-dir', help='Source directory root of SR components',
+                        default='srn')
+    parser.add_argument('--square-size', help='The size of the grid of routers', type=int, default=4)
+    parser.add_argument('--max-controllers', help='The maximum number of controllers', type=int, default=4)
+    parser.add_argument('--requests', help='The number of path requests sent by each client', type=int,
+                        default=100)
+    parser.add_argument('--spread-daemons', help='Pin the daemons of the controllers and of the access routers'
+                                                   ' to different cores', action="store_true")
+    parser.add_argument('--ctrl-cpu-quota', help='The maximum number of CPUs used by each sr-ctrl (e.g., 0.5)',
+                        type=float)
+    parser.add_argument('--ctrl-memory-max', help='The maximum memory of each sr-ctrl (e.g., 256M)')
+    return parser.parse_args()
+
+
+def spread_indexes(count, size, excluded=()):
+    """Spread count indexes evenly on the range [1, size[ while avoiding the excluded ones"""
+    candidates = [i for i in range(1, size) if i not in excluded]
+    step = len(candidates) / float(count)
+    return [candidates[int(i * step)] for i in range(count)]
+
+
+def find_proxy(net, client):
+    """Return the address of the DNS proxy on the access router of the client"""
+    router = client.defaultIntf().broadcast_domain.routers[0].node
+    if daemon_in_node(router, SRDNSProxy) is None:
+        raise Exception("Cannot find a SRDNSProxy on the access router of %s" % client.name)
+    return router.intf("lo").ip6
+
+
+def bench_controllers(n_controllers):
+    cleanup()
+    size = args.square_size
+    # One access router (and client) at the beginning of each row
+    access_router_idx = [row * size for row in range(size)]
+    controller_idx = spread_indexes(n_controllers, size * size, excluded=access_router_idx)
+    topo_args = {"schema_tables": full_schema["tables"],
+                 "cwd": os.path.join(args.log_dir, "%d-controllers" % n_controllers),
+                 "square_size": size,
+                 "controller_idx": controller_idx,
+                 "access_router_idx": access_router_idx}
+    if args.ctrl_cpu_quota is not None or args.ctrl_memory_max is not None:
+        topo_args["daemon_resources"] = {SRCtrl.NAME: {"cpu_quota": args.ctrl_cpu_quota,
+                                                       "memory_max": args.ctrl_memory_max}}
+    net = SRNNet(topo=SquareAxA(**topo_args), static_routing=True, spread_daemons=args.spread_daemons)
+    try:
+        net.start()
+        time.sleep(10)
+
+        clients = [h for h in net.hosts if h.name.startswith("client")]
+        processes = []
+        start = time.time()
+        for client in clients:
+            cmd = [sr_testdns, "sr", str(args.requests), "server.test.sr", find_proxy(net, client)]
+            processes.append(client.popen(cmd))
+        for p in processes:
+            p.communicate()
+        elapsed = time.time() - start
+
+        throughput = len(clients) * args.requests / elapsed
+        lg.info("*** %d controllers: %d requests in %.3f seconds (%.1f requests/s)\n"
+                % (n_controllers, len(clients) * args.requests, elapsed, throughput))
+        return throughput
+    finally:
+        net.stop()
+
+
+args = parse_args()
+
+with open(os.path.join(args.src_dir, "sr.ovsschema"), "r") as fileobj:
+    full_schema = json.load(fileobj)
+
+lg.setLogLevel(args.log)
+if args.log == 'debug':
+    ipmininet.DEBUG_FLAG = True
+sr_testdns = os.path.join(os.path.abspath(args.src_dir), "bin", "sr-testdns")
+
+# Add SR components to PATH
+os.environ["PATH"] += os.pathsep + os.path.join(os.path.abspath(args.src_dir), "bin")
+
+results = {}
+for n in range(1, args.max_controllers + 1):
+    results[n] = bench_controllers(n)
+
+os.makedirs(args.log_dir, exist_ok=True)
+with open(os.path.join(args.log_dir, "controller-throughput.json"), "w") as fileobj:
+    json.dump(results, fileobj, indent=4)
+for n, throughput in results.items():
+    print("%d controllers: %.1f requests/s" % (n, throughput))
@@ -0,0 +1,93 @@
+import argparse
+import datetime
+import ipaddress
+import json
+import os
+import subprocess
+import time
+
+from ipmininet.host.config import AAAARecord, DNSZone
+from ipmininet.utils import has_cmd
+from mininet.log import LEVELS, lg
+
+from srnmininet.config import SRNZone
+from srnmininet.config.config import write_zone_file
+
+
+# Argument parsing
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the time to build and to load DNS zones"
+                                                 " as the number of hosts grows")
+    parser.add_argument('--log', choices=LEVELS.keys(), default='info',
+                        help='The level of details in the logs.')
+    parser.add_argument('--log-dir', help='Logging directory root',
+                        default='/tmp/logs-%s' % datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    parser.add_argument('--host-counts', help='The numbers of hosts in the zone', type=int, nargs='+',
+                        default=[100, 1000, 10000, 100000])
+    parser.add_argument('--baseline-max', help='The maximum number of hosts for the zone built'
+                                               ' with a list of records', type=int, default=10000)
+    return parser.parse_args()
+
+
+def host_records(count):
+    network = ipaddress.ip_network("2042:aaaa::/64")
+    for i in range(count):
+        yield "host%d" % i, 60, "AAAA", network[i + 1].compressed
+
+
+def build_records_zone(count, filename):
+    """Build the zone with one DNSRecord object per host"""
+    zone = DNSZone(name="test.sr", dns_master="controller")
+    for name, ttl, _, address in host_records(count):
+        zone.add_record(AAAARecord(name, address, ttl=ttl))
+    with open(filename, "w") as fileobj:
+        write_zone_file(fileobj, zone, zone.records)
+
+
+def build_streamed_zone(count, filename):
+    """Build the zone by streaming the host records to the zone file"""
+    zone = SRNZone(name="test.sr", dns_master="controller")
+    with open(filename, "w") as fileobj:
+        write_zone_file(fileobj, zone, zone.records, host_records(count))
+
+
+def load_time(filename):
+    """Return the time needed by named to load the zone file (None if named-checkzone is not available)"""
+    if not has_cmd("named-checkzone"):
+        return None
+    start = time.time()
+    p = subprocess.run(["named-checkzone", "-q", "test.sr", filename])
+    if p.returncode != 0:
+        lg.error("named-checkzone rejected %s\n" % filename)
+    return time.time() - start
+
+
+def bench(count):
+    result = {"hosts": count}
+    for name, build in (("streamed", build_streamed_zone), ("records", build_records_zone)):
+        if name == "records" and count > args.baseline_max:
+            continue
+        filename = os.path.join(args.log_dir, "%s-%d.zone" % (name, count))
+        start = time.time()
+        build(count, filename)
+        result["%s_build_time" % name] = time.time() - start
+        result["%s_load_time" % name] = load_time(filename)
+    lg.info("*** %s\n" % json.dumps(result))
+    return result
+
+
+args = parse_args()
+lg.setLogLevel(args.log)
+os.makedirs(args.log_dir, exist_ok=True)
+
+results = [bench(count) for count in args.host_counts]
+
+with open(os.path.join(args.log_dir, "dns-zone.json"), "w") as fileobj:
+    json.dump(results, fileobj, indent=4)
+
+print("%10s %16s %16s %16s %16s" % ("hosts", "streamed build", "streamed load", "records build", "records load"))
+for result in results:
+    print("%10d %16s %16s %16s %16s" % tuple([result["hosts"]] + [
+        "%.4f" % result[key] if result.get(key) is not None else "-"
+        for key in ("streamed_build_time", "streamed_load_time", "records_build_time", "records_load_time")]))
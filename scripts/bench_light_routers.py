@@ -0,0 +1,80 @@
+import argparse
+import datetime
+import json
+import os
+import time
+
+import ipmininet
+import psutil
+from ipmininet.clean import cleanup
+from mininet.log import LEVELS, lg
+
+from srnmininet.square_axa import SquareAxA
+from srnmininet.srnnet import SRNNet
+from srnmininet.srnrouter import SRNLightRouter
+
+
+# Argument parsing
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the start time and the memory usage of transit routers"
+                                                 " with and without the lightweight mode")
+    parser.add_argument('--log', choices=LEVELS.keys(), default='info',
+                        help='The level of details in the logs.')
+    parser.add_argument('--log-dir', help='Logging directory root',
+                        default='/tmp/logs-%s' % datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    parser.add_argument('--src-dir', help='Source directory root of SR components',
+                        default='srn')
+    parser.add_argument('--square-size', help='The size of the grid of routers', type=int, default=10)
+    return parser.parse_args()
+
+
+def bench_transit_routers(lightweight):
+    cleanup()
+    topo_args = {"schema_tables": full_schema["tables"],
+                 "cwd": os.path.join(args.log_dir, "lightweight" if lightweight else "full"),
+                 "square_size": args.square_size}
+    net = SRNNet(topo=SquareAxA(**topo_args), static_routing=True, lightweight_transit=lightweight)
+    try:
+        memory_before = psutil.virtual_memory().used
+        start = time.time()
+        net.start()
+        start_time = time.time() - start
+        memory = psutil.virtual_memory().used - memory_before
+
+        transit = [r for r in net.routers if not r.controller and not r.access_router]
+        durations = [r.start_duration for r in transit]
+        result = {"routers": len(net.routers),
+                  "transit_routers": len(transit),
+                  "lightweight_routers": len([r for r in transit if isinstance(r, SRNLightRouter)]),
+                  "network_start_time": start_time,
+                  "transit_start_time_mean": sum(durations) / len(durations) if durations else 0,
+                  "transit_start_time_max": max(durations) if durations else 0,
+                  "memory_per_node": memory / float(len(net.routers) + len(net.hosts))}
+        lg.info("*** %s\n" % json.dumps(result))
+        return result
+    finally:
+        net.stop()
+
+
+args = parse_args()
+
+with open(os.path.join(args.src_dir, "sr.ovsschema"), "r") as fileobj:
+    full_schema = json.load(fileobj)
+
+lg.setLogLevel(args.log)
+if args.log == 'debug':
+    ipmininet.DEBUG_FLAG = True
+
+# Add SR components to PATH
+os.environ["PATH"] += os.pathsep + os.path.join(os.path.abspath(args.src_dir), "bin")
+
+results = {"full": bench_transit_routers(False), "lightweight": bench_transit_routers(True)}
+
+os.makedirs(args.log_dir, exist_ok=True)
+with open(os.path.join(args.log_dir, "light-routers.json"), "w") as fileobj:
+    json.dump(results, fileobj, indent=4)
+
+print("%-32s %16s %16s" % ("", "full", "lightweight"))
+for key in results["full"]:
+    print("%-32s %16.4f %16.4f" % (key, results["full"][key], results["lightweight"][key]))
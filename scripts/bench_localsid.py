@@ -0,0 +1,78 @@
+import argparse
+import datetime
+import json
+import os
+
+import ipmininet
+from ipmininet.clean import cleanup
+from mininet.log import LEVELS, lg
+
+from srnmininet.localsid import LocalSIDScaling
+from srnmininet.square_axa import SquareAxA
+from srnmininet.srnnet import SRNNet
+
+
+# Argument parsing
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure how the local SID table of an access router scales"
+                                                 " with the number of binding SIDs")
+    parser.add_argument('--log', choices=LEVELS.keys(), default='info',
+                        help='The level of details in the logs.')
+    parser.add_argument('--log-dir', help='Logging directory root',
+                        default='/tmp/logs-%s' % datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    parser.add_argument('--src-dir', help='Source directory root of SR components',
+                        default='srn')
+    parser.add_argument('--square-size', help='The size of the grid of routers', type=int, default=3)
+    parser.add_argument('--router', help='The access router whose table is filled (the first one by default)')
+    parser.add_argument('--counts', help='The numbers of binding SIDs of the steps', type=int, nargs='+',
+                        default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--segments', help='The number of segments of each binding SID', type=int, default=2)
+    parser.add_argument('--lookups', help='The number of route lookups of each step', type=int, default=10000)
+    parser.add_argument('--restart', help='Restart sr-routed at each step', action="store_true")
+    return parser.parse_args()
+
+
+def bench_localsid():
+    cleanup()
+    topo_args = {"schema_tables": full_schema["tables"], "cwd": args.log_dir, "square_size": args.square_size}
+    net = SRNNet(topo=SquareAxA(**topo_args), static_routing=True)
+    try:
+        net.start()
+        scaling = LocalSIDScaling(net, router=args.router, segments=args.segments, lookups=args.lookups,
+                                  restart_daemon=args.restart)
+        return scaling.run(counts=args.counts)
+    finally:
+        net.stop()
+
+
+args = parse_args()
+
+with open(os.path.join(args.src_dir, "sr.ovsschema"), "r") as fileobj:
+    full_schema = json.load(fileobj)
+
+lg.setLogLevel(args.log)
+if args.log == 'debug':
+    ipmininet.DEBUG_FLAG = True
+
+# Add SR components to PATH
+os.environ["PATH"] += os.pathsep + os.path.join(os.path.abspath(args.src_dir), "bin")
+
+report = bench_localsid()
+
+os.makedirs(args.log_dir, exist_ok=True)
+with open(os.path.join(args.log_dir, "localsid.json"), "w") as fileobj:
+    json.dump(report, fileobj, indent=4)
+
+print("Local SID table of %s" % report["router"])
+print("%10s %12s %14s %16s %10s %12s" % ("BSIDs", "routes/s", "bytes/BSID", "+lookup (us)", "sr-routed",
+                                         "RSS (MiB)"))
+for step in report["steps"]:
+    daemon = step["daemon"]
+    print("%10d %12.0f %14s %16s %10s %12s"
+          % (step["bsids"], step["install"]["rate"],
+             "%.0f" % step["memory_per_bsid"] if step["memory_per_bsid"] is not None else "-",
+             "%.2f" % (step["lookup"]["added"] * 1e6) if step["lookup"]["added"] is not None else "-",
+             "alive" if daemon["alive"] else "dead",
+             "%.1f" % (daemon["rss"] / 2. ** 20) if daemon["rss"] is not None else "-"))
+print("Removal: %.0f routes/s" % report["clear"]["rate"])
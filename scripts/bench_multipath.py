@@ -0,0 +1,147 @@
+import argparse
+import datetime
+import json
+import os
+import re
+import time
+
+import ipmininet
+from ipmininet.clean import cleanup
+from mininet.log import LEVELS, lg
+
+from srnmininet.config import SRCtrlDomain
+from srnmininet.srnnet import SRNNet
+from srnmininet.srntopo import SRNTopo
+
+
+# Argument parsing
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the aggregate throughput of equal-cost and weighted"
+                                                 " multipath static routes on an asymmetric topology")
+    parser.add_argument('--log', choices=LEVELS.keys(), default='info',
+                        help='The level of details in the logs.')
+    parser.add_argument('--log-dir', help='Logging directory root',
+                        default='/tmp/logs-%s' % datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    parser.add_argument('--src-dir', help='Source directory root of SR components',
+                        default='srn')
+    parser.add_argument('--fast-bw', help='The bandwidth (Mbps) of the fast branch', type=float, default=100)
+    parser.add_argument('--slow-bw', help='The bandwidth (Mbps) of the slow branch', type=float, default=10)
+    parser.add_argument('--slow-cost', help='The IGP cost of the links of the slow branch', type=int, default=1)
+    parser.add_argument('--tolerance', help='The multipath tolerance of the weighted mode', type=float, default=0.)
+    parser.add_argument('--flows', help='The number of parallel TCP flows', type=int, default=32)
+    parser.add_argument('--duration', help='The duration (in seconds) of each measurement', type=int, default=10)
+    return parser.parse_args()
+
+
+class AsymmetricTopo(SRNTopo):
+    """
+                      fast
+                    +---+
+                 +--+ B +--+
+        +------+ |  +---+  | +------+
+        |client+-A         D-+server|
+        +------+ |  +---+  | +------+
+                 +--+ C +--+
+                    +---+
+                      slow
+
+    The client is on A, the server on D and the controller on B.
+    Both branches between A and D have the same IGP cost by default.
+    """
+
+    def __init__(self, schema_tables=None, fast_bw=100, slow_bw=10, slow_cost=1, *args, **kwargs):
+        """:param schema_tables: The schema table of ovsdb
+           :param fast_bw: The bandwidth of the links on the fast branch
+           :param slow_bw: The bandwidth of the links on the slow branch
+           :param slow_cost: The IGP cost of the links on the slow branch"""
+        self.schema_tables = schema_tables if schema_tables else {}
+        self.fast_bw = fast_bw
+        self.slow_bw = slow_bw
+        self.slow_cost = slow_cost
+        super().__init__("B", *args, **kwargs)
+
+    def build(self, *args, **kwargs):
+        a = self.addRouter("A")
+        b = self.addRouter(self.controllers[0])
+        c = self.addRouter("C")
+        d = self.addRouter("D")
+        client = self.addHost("client")
+        server = self.addHost("server")
+
+        self.addLink(client, a, delay="1ms")
+        self.addLink(a, b, delay="1ms", bw=self.fast_bw)
+        self.addLink(b, d, delay="1ms", bw=self.fast_bw)
+        self.addLink(a, c, delay="1ms", bw=self.slow_bw,
+                     params1={"igp_metric": self.slow_cost}, params2={"igp_metric": self.slow_cost})
+        self.addLink(c, d, delay="1ms", bw=self.slow_bw,
+                     params1={"igp_metric": self.slow_cost}, params2={"igp_metric": self.slow_cost})
+        self.addLink(d, server, delay="1ms")
+
+        self.addOverlay(SRCtrlDomain(access_routers=(a, d), sr_controller=b,
+                                     schema_tables=self.schema_tables, hosts=self.hosts()))
+
+        super().build(*args, **kwargs)
+
+
+def measure_throughput(client, server):
+    """Return the aggregate throughput (in Mbps) of parallel TCP flows between client and server"""
+    server_process = server.popen(["iperf", "-s", "-V"])
+    try:
+        time.sleep(1)
+        out = client.cmd(["iperf", "-V", "-c", server.defaultIntf().ip6, "-P", str(args.flows),
+                          "-t", str(args.duration), "-f", "m"])
+    finally:
+        server_process.terminate()
+        server_process.wait()
+
+    lines = [line for line in out.splitlines() if "Mbits/sec" in line]
+    sum_lines = [line for line in lines if "[SUM]" in line] or lines[-1:]
+    if not sum_lines:
+        lg.error("Cannot parse the output of iperf: %s\n" % out)
+        return 0.
+    return float(re.search(r"([\d.]+) Mbits/sec", sum_lines[-1]).group(1))
+
+
+def bench_multipath(weighted):
+    cleanup()
+    topo_args = {"schema_tables": full_schema["tables"],
+                 "cwd": os.path.join(args.log_dir, "weighted" if weighted else "ecmp"),
+                 "fast_bw": args.fast_bw, "slow_bw": args.slow_bw, "slow_cost": args.slow_cost}
+    net = SRNNet(topo=AsymmetricTopo(**topo_args), static_routing=True, weighted_multipath=weighted,
+                 multipath_tolerance=args.tolerance)
+    try:
+        net.start()
+        for router in net.routers:
+            # Spread the flows on the nexthops according to their ports
+            router.sysctl_manager.set("net.ipv6.fib_multipath_hash_policy", 1)
+        time.sleep(5)
+
+        throughput = measure_throughput(net["client"], net["server"])
+        lg.info("*** %s: %.1f Mbps\n" % ("weighted" if weighted else "ecmp", throughput))
+        return throughput
+    finally:
+        net.stop()
+
+
+args = parse_args()
+
+with open(os.path.join(args.src_dir, "sr.ovsschema"), "r") as fileobj:
+    full_schema = json.load(fileobj)
+
+lg.setLogLevel(args.log)
+if args.log == 'debug':
+    ipmininet.DEBUG_FLAG = True
+
+# Add SR components to PATH
+os.environ["PATH"] += os.pathsep + os.path.join(os.path.abspath(args.src_dir), "bin")
+
+results = {"ecmp": bench_multipath(False), "weighted": bench_multipath(True)}
+results["improvement"] = results["weighted"] / results["ecmp"] if results["ecmp"] else 0.
+
+os.makedirs(args.log_dir, exist_ok=True)
+with open(os.path.join(args.log_dir, "multipath-throughput.json"), "w") as fileobj:
+    json.dump(results, fileobj, indent=4)
+
+print("ECMP: %.1f Mbps, weighted: %.1f Mbps (x%.2f)"
+      % (results["ecmp"], results["weighted"], results["improvement"]))
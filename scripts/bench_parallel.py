@@ -0,0 +1,93 @@
+import argparse
+import datetime
+import json
+import os
+import time
+
+import ipmininet
+from mininet.log import LEVELS, lg
+
+from srnmininet.measurement import ping_rtts
+from srnmininet.orchestrator import Orchestrator
+from srnmininet.square_axa import SquareAxA
+from srnmininet.srnnet import SRNNet
+
+
+# Argument parsing
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run a grid of SRN experiments serially"
+                                                 " and in parallel isolated instances")
+    parser.add_argument('--log', choices=LEVELS.keys(), default='info',
+                        help='The level of details in the logs.')
+    parser.add_argument('--log-dir', help='Logging directory root',
+                        default='/tmp/logs-%s' % datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    parser.add_argument('--src-dir', help='Source directory root of SR components',
+                        default='srn')
+    parser.add_argument('--square-sizes', help='The sizes of the grids of routers', type=int, nargs='+',
+                        default=[3, 4, 5])
+    parser.add_argument('--repetitions', help='The number of runs of each grid size', type=int, default=2)
+    parser.add_argument('--cpus-per-job', help='The number of cores reserved for each experiment', type=int,
+                        default=2)
+    parser.add_argument('--memory-per-job', help='The memory reserved for each experiment', default='2G')
+    parser.add_argument('--skip-serial', help='Only run the experiments in parallel', action="store_true")
+    return parser.parse_args()
+
+
+def experiment(instance, square_size):
+    """Start a SRN, measure the RTT between its client and its server and stop it"""
+    topo_args = {"schema_tables": full_schema["tables"], "cwd": os.path.join(instance.path, "logs"),
+                 "square_size": square_size}
+    net = SRNNet(topo=SquareAxA(**topo_args), static_routing=True)
+    start = time.time()
+    net.start()
+    try:
+        start_time = time.time() - start
+        out = net["client"].cmd(["ping6", "-c", "5", net["server"].intf().ip6])
+        return {"routers": len(net.routers), "start_time": start_time, "rtt": ping_rtts(out)}
+    finally:
+        net.stop()
+
+
+def run_grid(parallel):
+    orchestrator = Orchestrator(os.path.join(args.log_dir, "parallel" if parallel else "serial"),
+                                cpus=None if parallel else [0, 1])
+    for size in args.square_sizes:
+        for i in range(args.repetitions):
+            orchestrator.add("square%d-%d" % (size, i), experiment, square_size=size,
+                             cpus=args.cpus_per_job if parallel else 1,
+                             memory=args.memory_per_job if parallel else None)
+    start = time.time()
+    results = orchestrator.run()
+    return time.time() - start, results
+
+
+args = parse_args()
+
+with open(os.path.join(args.src_dir, "sr.ovsschema"), "r") as fileobj:
+    full_schema = json.load(fileobj)
+
+lg.setLogLevel(args.log)
+if args.log == 'debug':
+    ipmininet.DEBUG_FLAG = True
+
+# Add SR components to PATH
+os.environ["PATH"] += os.pathsep + os.path.join(os.path.abspath(args.src_dir), "bin")
+
+report = {}
+if not args.skip_serial:
+    # A single core for the jobs runs them one after the other
+    report["serial_time"], report["serial"] = run_grid(False)
+report["parallel_time"], report["parallel"] = run_grid(True)
+
+os.makedirs(args.log_dir, exist_ok=True)
+with open(os.path.join(args.log_dir, "parallel.json"), "w") as fileobj:
+    json.dump(report, fileobj, indent=4)
+
+for mode in ("serial", "parallel"):
+    if mode not in report:
+        continue
+    print("*** %s: %d experiments in %.3f seconds" % (mode, len(report[mode]), report[mode + "_time"]))
+    for name, result in report[mode].items():
+        print("%-16s %-8s %s" % (name, result["status"], json.dumps(result["result"]) if result["result"]
+                                 else result["error"]))
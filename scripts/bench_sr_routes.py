@@ -0,0 +1,91 @@
+import argparse
+import datetime
+import ipaddress
+import json
+import os
+import random
+
+import ipmininet
+from ipmininet.clean import cleanup
+from mininet.log import LEVELS, lg
+
+from srnmininet.square_axa import SquareAxA
+from srnmininet.srnnet import SRNNet
+
+
+# Argument parsing
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the installation rate of SRv6 encapsulation routes"
+                                                 " on the hosts of a SRN")
+    parser.add_argument('--log', choices=LEVELS.keys(), default='info',
+                        help='The level of details in the logs.')
+    parser.add_argument('--log-dir', help='Logging directory root',
+                        default='/tmp/logs-%s' % datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    parser.add_argument('--src-dir', help='Source directory root of SR components',
+                        default='srn')
+    parser.add_argument('--square-size', help='The size of the grid of routers', type=int, default=4)
+    parser.add_argument('--routes', help='The number of additional destinations per host', type=int, default=10000)
+    parser.add_argument('--segments', help='The number of segments of each route', type=int, default=3)
+    parser.add_argument('--no-netlink', help='Use the ip commands instead of netlink', action="store_true")
+    return parser.parse_args()
+
+
+def bench_sr_routes():
+    cleanup()
+    size = args.square_size
+    topo_args = {"schema_tables": full_schema["tables"],
+                 "cwd": args.log_dir,
+                 "square_size": size,
+                 "access_router_idx": [row * size for row in range(size)]}
+    net = SRNNet(topo=SquareAxA(**topo_args), static_routing=True, use_netlink=not args.no_netlink)
+    try:
+        net.start()
+        loopbacks = [r.intf("lo").ip6 for r in net.routers]
+        clients = [h for h in net.hosts if h.name.startswith("client")]
+        rng = random.Random(0)
+        network = ipaddress.ip_network("2042:ffff::/64")
+
+        results = {}
+        for client in clients:
+            # Many-to-many traffic between the clients and synthetic destinations
+            mapping = {other.defaultIntf().ip6: rng.sample(loopbacks, min(args.segments, len(loopbacks)))
+                       for other in clients if other.name != client.name}
+            for i in range(args.routes):
+                mapping[str(network[i + 1])] = rng.sample(loopbacks, min(args.segments, len(loopbacks)))
+
+            install = client.install_sr_routes(mapping)
+            replace = client.install_sr_routes({dst: list(reversed(segs)) for dst, segs in mapping.items()},
+                                               replace=True)
+            remove = client.remove_sr_routes()
+            results[client.name] = {"routes": len(mapping),
+                                    "install_rate": install["rate"], "install_failed": len(install["failed"]),
+                                    "replace_rate": replace["rate"], "replace_failed": len(replace["failed"]),
+                                    "remove_rate": remove["rate"], "remove_failed": len(remove["failed"])}
+            lg.info("*** %s: %s\n" % (client.name, json.dumps(results[client.name])))
+        return results
+    finally:
+        net.stop()
+
+
+args = parse_args()
+
+with open(os.path.join(args.src_dir, "sr.ovsschema"), "r") as fileobj:
+    full_schema = json.load(fileobj)
+
+lg.setLogLevel(args.log)
+if args.log == 'debug':
+    ipmininet.DEBUG_FLAG = True
+
+# Add SR components to PATH
+os.environ["PATH"] += os.pathsep + os.path.join(os.path.abspath(args.src_dir), "bin")
+
+results = bench_sr_routes()
+
+os.makedirs(args.log_dir, exist_ok=True)
+with open(os.path.join(args.log_dir, "sr-routes.json"), "w") as fileobj:
+    json.dump(results, fileobj, indent=4)
+
+for name, result in results.items():
+    print("%s: %d routes, install %.0f routes/s, replace %.0f routes/s, remove %.0f routes/s"
+          % (name, result["routes"], result["install_rate"], result["replace_rate"], result["remove_rate"]))
@@ -0,0 +1,94 @@
+import argparse
+import datetime
+import json
+import os
+
+import ipmininet
+from ipmininet.clean import cleanup
+from mininet.log import LEVELS, lg
+
+from srnmininet.albilene import Albilene
+from srnmininet.dataplane import BEHAVIOURS, SRv6DataPlaneBench
+from srnmininet.square_axa import SquareAxA
+from srnmininet.srnnet import SRNNet
+
+TOPOLOGIES = {"square": SquareAxA, "albilene": Albilene}
+
+
+# Argument parsing
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the forwarding rate, the CPU cost and the latency"
+                                                 " of the SRv6 behaviours against plain IPv6 forwarding")
+    parser.add_argument('--log', choices=LEVELS.keys(), default='info',
+                        help='The level of details in the logs.')
+    parser.add_argument('--log-dir', help='Logging directory root',
+                        default='/tmp/logs-%s' % datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    parser.add_argument('--src-dir', help='Source directory root of SR components',
+                        default='srn')
+    parser.add_argument('--topo', help='The topology', choices=TOPOLOGIES.keys(), default='square')
+    parser.add_argument('--square-size', help='The size of the grid of routers', type=int, default=4)
+    parser.add_argument('--behaviours', help='The SRv6 behaviours of the transit routers', nargs='+',
+                        choices=BEHAVIOURS, default=list(BEHAVIOURS))
+    parser.add_argument('--modes', help='The seg6 modes of the ingress', nargs='+', choices=["encap", "inline"],
+                        default=["encap", "inline"])
+    parser.add_argument('--lengths', help='The numbers of transit routers running a behaviour', type=int,
+                        nargs='+', default=[1, 2, 4])
+    parser.add_argument('--size', help='The UDP payload size', type=int, default=64)
+    parser.add_argument('--senders', help='The number of traffic generator processes', type=int, default=2)
+    parser.add_argument('--duration', help='The duration of the flood of each scenario (in seconds)', type=float,
+                        default=5.)
+    parser.add_argument('--probes', help='The number of latency probes of each scenario', type=int, default=1000)
+    return parser.parse_args()
+
+
+def bench_dataplane():
+    cleanup()
+    topo_args = {"schema_tables": full_schema["tables"], "cwd": args.log_dir,
+                 "link_delay": "0ms", "link_bandwidth": 0}
+    if args.topo == "square":
+        topo_args["square_size"] = args.square_size
+    net = SRNNet(topo=TOPOLOGIES[args.topo](**topo_args), static_routing=True)
+    try:
+        net.start()
+        bench = SRv6DataPlaneBench(net, "client", "server", size=args.size, senders=args.senders,
+                                   duration=args.duration, probes=args.probes)
+        lg.info("*** Path: %s\n" % " ".join(r.name for r in bench.path))
+        return {"path": [r.name for r in bench.path],
+                "results": bench.run(behaviours=args.behaviours, modes=args.modes, lengths=args.lengths)}
+    finally:
+        net.stop()
+
+
+args = parse_args()
+
+with open(os.path.join(args.src_dir, "sr.ovsschema"), "r") as fileobj:
+    full_schema = json.load(fileobj)
+
+lg.setLogLevel(args.log)
+if args.log == 'debug':
+    ipmininet.DEBUG_FLAG = True
+
+# Add SR components to PATH
+os.environ["PATH"] += os.pathsep + os.path.join(os.path.abspath(args.src_dir), "bin")
+
+report = bench_dataplane()
+
+os.makedirs(args.log_dir, exist_ok=True)
+with open(os.path.join(args.log_dir, "srv6-dataplane.json"), "w") as fileobj:
+    json.dump(report, fileobj, indent=4)
+
+
+def fmt(value, pattern):
+    return pattern % value if value is not None else "-"
+
+
+print("%-14s %-7s %8s %12s %8s %14s %12s %14s" % ("behaviour", "mode", "segments", "packets/s", "loss",
+                                                   "+cpu/pkt (ns)", "latency (us)", "+latency (us)"))
+for result in report["results"]:
+    added = result["added"]
+    print("%-14s %-7s %8d %12.0f %7.2f%% %14s %12s %14s"
+          % (result["behaviour"], result["mode"] or "", result["segments"], result["throughput"]["pps"],
+             100 * result["throughput"]["loss"],
+             fmt(added["cpu_per_packet"] * 1e9 if added["cpu_per_packet"] is not None else None, "%.0f"),
+             fmt(result["latency"]["p50"], "%.1f"), fmt(added["latency"], "%.1f")))
@@ -0,0 +1,87 @@
+import argparse
+import datetime
+import json
+import os
+import time
+
+import ipmininet
+from ipmininet.clean import cleanup as ipmininet_cleanup
+from mininet.log import LEVELS, lg
+
+from srnmininet.square_axa import SquareAxA
+from srnmininet.srnnet import SRNNet
+from srnmininet.teardown import cleanup
+
+
+# Argument parsing
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the time to stop a SRN node by node and with"
+                                                 " the batched teardown, and the time to clean up a crashed run")
+    parser.add_argument('--log', choices=LEVELS.keys(), default='info',
+                        help='The level of details in the logs.')
+    parser.add_argument('--log-dir', help='Logging directory root',
+                        default='/tmp/logs-%s' % datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    parser.add_argument('--src-dir', help='Source directory root of SR components',
+                        default='srn')
+    parser.add_argument('--square-size', help='The size of the grid of routers', type=int, default=10)
+    return parser.parse_args()
+
+
+def build_net(fast_teardown):
+    topo_args = {"schema_tables": full_schema["tables"],
+                 "cwd": os.path.join(args.log_dir, "fast" if fast_teardown else "serial"),
+                 "square_size": args.square_size}
+    return SRNNet(topo=SquareAxA(**topo_args), static_routing=True, fast_teardown=fast_teardown)
+
+
+def bench_stop(fast_teardown):
+    cleanup(level=args.log)
+    net = build_net(fast_teardown)
+    start = time.time()
+    net.start()
+    start_time = time.time() - start
+
+    start = time.time()
+    net.stop()
+    result = {"routers": len(net.routers), "start_time": start_time, "stop_time": time.time() - start}
+    result.update({"stop_%s_time" % step: duration for step, duration in net.teardown_durations.items()})
+    lg.info("*** %s\n" % json.dumps(result))
+    return result
+
+
+def bench_crash_cleanup(clean):
+    cleanup(level=args.log)
+    net = build_net(True)
+    net.start()
+    # The network is abandoned as if the experiment had crashed
+    start = time.time()
+    clean()
+    return time.time() - start
+
+
+args = parse_args()
+
+with open(os.path.join(args.src_dir, "sr.ovsschema"), "r") as fileobj:
+    full_schema = json.load(fileobj)
+
+lg.setLogLevel(args.log)
+if args.log == 'debug':
+    ipmininet.DEBUG_FLAG = True
+
+# Add SR components to PATH
+os.environ["PATH"] += os.pathsep + os.path.join(os.path.abspath(args.src_dir), "bin")
+
+results = {"serial": bench_stop(False), "fast": bench_stop(True),
+           "crash_cleanup_time": {"ipmininet": bench_crash_cleanup(lambda: ipmininet_cleanup(level=args.log)),
+                                  "srnmininet": bench_crash_cleanup(lambda: cleanup(level=args.log))}}
+
+os.makedirs(args.log_dir, exist_ok=True)
+with open(os.path.join(args.log_dir, "teardown.json"), "w") as fileobj:
+    json.dump(results, fileobj, indent=4)
+
+print("%-32s %16s %16s" % ("", "serial", "fast"))
+for key in ("routers", "start_time", "stop_time"):
+    print("%-32s %16.4f %16.4f" % (key, results["serial"][key], results["fast"][key]))
+for name, duration in results["crash_cleanup_time"].items():
+    print("%-32s %16.4f" % ("crash cleanup (%s)" % name, duration))
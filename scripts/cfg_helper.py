@@ -8,6 +8,7 @@ from ipmininet.cli import IPCLI
 
 from srnmininet.square_axa import SquareAxA
 from srnmininet.comp import CompTopo
+from srnmininet.spec import SpecTopo
 from srnmininet.srnnet import SRNNet
 
 topo_classes = [SquareAxA, CompTopo]
@@ -21,8 +22,11 @@ components = ["sr-ctrl", "sr-routed", "sr-dnsproxy", "sr-nsd"]
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--topo', choices=TOPOS.keys(),
-                        default=TOPOS.keys()[0],
+                        default=list(TOPOS.keys())[0],
                         help='The topology that you want to start.')
+    parser.add_argument('--topo-spec', help='A YAML, JSON or JSON Lines specification file of the topology'
+                                            ' (replaces --topo)',
+                        default='')
     parser.add_argument('--log', choices=LEVELS.keys(), default='info',
                         help='The level of details in the logs.')
     parser.add_argument('--topo-args', help='Additional arguments to give'
@@ -79,7 +83,11 @@ with open(os.path.join(args.src_dir, "sr.ovsschema"), "r") as fileobj:
     topo_args["schema_tables"] = full_schema["tables"]
 
 # Start network
-net = SRNNet(topo=TOPOS[args.topo](**topo_args), **net_args)
+if args.topo_spec:
+    topo = SpecTopo(args.topo_spec, **topo_args)
+else:
+    topo = TOPOS[args.topo](**topo_args)
+net = SRNNet(topo=topo, **net_args)
 try:
     net.start()
     IPCLI(net)
@@ -5,15 +5,18 @@ import os
 import time
 
 import ipmininet
-import psutil
 from ipmininet.clean import cleanup
 from ipmininet.cli import IPCLI
 from ipmininet.utils import realIntfList
 from mininet.log import LEVELS, lg
 
 from srnmininet.albilene import Albilene
+from srnmininet.capture import SRv6Capture
 from srnmininet.comp import CompTopo
 from srnmininet.config.config import SRDNSProxy, SRRouted
+from srnmininet.faults import FaultTimeline
+from srnmininet.measurement import Measurements, Recorder, ping_rtts
+from srnmininet.spec import SpecTopo
 from srnmininet.srnnet import SRNNet
 from srnmininet.utils import daemon_in_node
 
@@ -30,21 +33,35 @@ def parse_args():
                         default='/tmp/logs-%s' % datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
     parser.add_argument('--src-dir', help='Source directory root of SR components',
                         default='srn')
+    parser.add_argument('--topo-spec', help='A YAML, JSON or JSON Lines specification file of the topology'
+                                            ' used instead of CompTopo', default='')
+    parser.add_argument('--cost-model', help='The link cost model of static routes', default='igp')
+    parser.add_argument('--client', help='The name of the host sending DNS requests', default='comp2')
+    parser.add_argument('--server', help='The name of the host targeted by the DNS requests', default='comp6')
+    parser.add_argument('--cli', help='Open the CLI before each DNS latency measurement', action="store_true")
     return parser.parse_args()
 
 
-def test_dns_latency(link_delay):
+def test_dns_latency(link_delays):
+    """Measure the DNS latency for each link delay, reusing the same network between experiments"""
     cleanup()
-    log_dir = args.log_dir + "-%s" % link_delay
+    log_dir = args.log_dir
     topo_args = {"schema_tables": full_schema["tables"],
                  "cwd": log_dir,
-                 "link_delay": link_delay}
-    net = SRNNet(topo=CompTopo(**topo_args), static_routing=True)
+                 "link_delay": link_delays[0]}
+    if args.topo_spec:
+        topo = SpecTopo(args.topo_spec, **topo_args)
+    else:
+        topo = CompTopo(**topo_args)
+    net = SRNNet(topo=topo, static_routing=True, cost_model=args.cost_model)
+    recorder = Recorder(os.path.join(log_dir, "measurements"))
     try:
+        start = time.time()
         net.start()
+        lg.info("*** Cold start in %.3f seconds\n" % (time.time() - start))
 
-        client = net["comp2"]
-        server = net["comp6"]
+        client = net[args.client]
+        server = net[args.server]
         dns_proxy_ip6 = None
         for node in net.routers:
             if daemon_in_node(node, SRDNSProxy) is not None:
@@ -53,15 +70,29 @@ def test_dns_latency(link_delay):
         if dns_proxy_ip6 is None:
             raise Exception("Cannot find a global address for a node with SRDNSProxy")
 
-        time.sleep(10)
-        cmd = [sr_testdns, "sr", "10", server.name + ".test.sr", dns_proxy_ip6]
-        print(cmd)
-        IPCLI(net)
-        out = client.cmd(cmd)
-        with open(os.path.join(log_dir, "sr-testdns-%s-rtt.log" % link_delay), "w") as fileobj:
-            fileobj.write(str(out))
+        for i, link_delay in enumerate(link_delays):
+            if i > 0:
+                net.reset(link_params={intf: {"delay": link_delay} for intf in net.shaped_intfs()})
+
+            time.sleep(10)
+            cmd = [sr_testdns, "sr", "10", server.name + ".test.sr", dns_proxy_ip6]
+            print(cmd)
+            if args.cli:
+                IPCLI(net)
+            start = time.time()
+            out = client.cmd(cmd)
+            recorder.record("testdns_duration", time.time() - start, node=client, link_delay=link_delay)
+            with open(os.path.join(log_dir, "sr-testdns-%s-rtt.log" % link_delay), "w") as fileobj:
+                fileobj.write(str(out))
+
+            out = client.cmd(["ping6", "-c", "10", server.defaultIntf().ip6])
+            recorder.extend("rtt", ping_rtts(out), node=client, link_delay=link_delay)
     finally:
         net.stop()
+        recorder.close()
+
+    for (link_delay,), stats in Measurements(recorder.path).summary("rtt", by=("link_delay",)).items():
+        lg.info("*** RTT with link delay %s: %s\n" % (link_delay, json.dumps(stats)))
 
 
 def map_pings_to_segments(source_node, destination_node, access_router):
@@ -74,46 +105,24 @@ def map_pings_to_segments(source_node, destination_node, access_router):
         raise Exception("Cannot find a global address for the server")
 
     routed = daemon_in_node(access_router, SRRouted)
-    cmd = ["ip", "-6", "route", "show", "table", routed.localsid_name]
-    out = access_router.cmd(cmd)
-    lines = out.split("\n")
-    if len(lines) == 0:
+    bsids = routed.binding_sids()
+    if len(bsids) == 0:
         raise Exception("Cannot find an encap rule in the %s of %s" % (routed.localsid_name, access_router.name))
-    bsid = lines[0].split(" ")[0]
-    print(lines[0])
+    bsid, segments = next(iter(bsids.items()))
+    lg.debug("Binding SID %s for segments %s\n" % (bsid, segments))
 
-    cmd = ["ip", "-6", "route", "add", dest_node_ip6, "encap", "seg6", "mode", "inline", "segs", bsid,
-           "dev", realIntfList(source_node)[0].name]
-    print(" ".join(cmd))
-    out = source_node.cmd(cmd)
-    print(out)
+    report = source_node.install_sr_routes({dest_node_ip6: bsid})
+    for route, error in report["failed"]:
+        lg.error("Cannot install %s on %s: %s\n" % (route, source_node.name, error))
 
     return dest_node_ip6
 
 
-def wait_access_router_start(node):
-    cmd = ["pgrep", "sr-routed"]
-    out = node.cmd(cmd)
-    pids = out.split("\n")
-    pids = [int(pid[:-1]) for pid in pids if len(pid) > 0]
-    if len(pids) == 0:
-        raise Exception("Cannot find sr-routed daemon")
-
-    for pid in pids:
-        p = psutil.Process(pid)
-        old_percentage = 100.0
-        while True:
-            percentage = p.cpu_percent(1)
-            if percentage < 20.0 and old_percentage < 20.0:
-                break
-            old_percentage = percentage
-            time.sleep(1)
-
-
 def test_flapping_link():
     cleanup()
     topo_args = {"schema_tables": full_schema["tables"], "cwd": args.log_dir}
     net = SRNNet(topo=Albilene(**topo_args))
+    recorder = Recorder(os.path.join(args.log_dir, "measurements"))
     try:
         net.start()
 
@@ -128,8 +137,8 @@ def test_flapping_link():
         if dns_proxy_ip6 is None:
             raise Exception("Cannot find a global address for a node with SRDNSProxy")
 
-        # Wait for IGP convergence
-        wait_access_router_start(client)
+        # SRNNet.start() waited for the IGP convergence
+        lg.info("*** IGP convergence times: %s\n" % json.dumps(net.convergence_times))
 
         time.sleep(10)
         cmd = [sr_testdns, "-d", "8", "sr", "1", server.name + ".test.sr", dns_proxy_ip6]
@@ -152,40 +161,35 @@ def test_flapping_link():
         map_pings_to_segments(server, client, net["F"])
 
         print("*** Route was inserted")
-        IPCLI(net)
 
         print("** Using 'ping6 %s' to test the discovered path **" % server_ip6)
-        cmd = ["ping6", "-c", "5", server_ip6]
-        out = client.cmd(cmd)
+        # The packets are counted on each router that they cross
+        with SRv6Capture(net, [intf for r in net.routers for intf in realIntfList(r)]) as capture:
+            cmd = ["ping6", "-c", "5", server_ip6]
+            out = client.cmd(cmd)
         print(out)
-
-        # Make a link fail
-        cmd = ["ip", "link", "set", "B-eth0", "down"]
-        out = net["B"].cmd(cmd)
-        print(out)
-        print("*** The link A-B failed")
-        IPCLI(net)
-
-        print("** Using 'ping6 %s' to test after failure **" % server_ip6)
-        cmd = ["ping6", "-c", "5", server_ip6]
-        out = client.cmd(cmd)
-        print(out)
-
-        # Bring the link back up
-        cmd = ["ip", "link", "set", "B-eth0", "up"]
-        net["B"].cmd(cmd)
-        cmd = ["ip", "-6", "addr", "add", next(net["B"].intf("B-eth0").ip6s(exclude_lls=True)), "dev", "B-eth0"]
-        net["B"].cmd(cmd)
-        print("*** The link A-B is back up")
-        IPCLI(net)
-
-        print("** Using 'ping6 %s' to test the path when back up **" % server_ip6)
-        cmd = ["ping6", "-c", "5", server_ip6]
-        out = client.cmd(cmd)
+        recorder.extend("rtt", ping_rtts(out), node=client, phase="initial")
+        for segments in capture.report()["segment_lists"]:
+            print("*** Segment list %s: %s" % (segments["segments"], json.dumps(segments)))
+
+        # The link A-B fails for 3 seconds and then flaps for 4 seconds while the path is probed
+        timeline = FaultTimeline(net, recorder=recorder)
+        timeline.link_down(1000, "B-eth0")
+        timeline.link_up(4000, "B-eth0")
+        failures = timeline.flaps("B-eth0", mean_up=800, mean_down=200, duration=4000, start=6000, seed=0)
+        print("** Using 'ping6 %s' during %d failures of the link A-B **" % (server_ip6, failures + 1))
+        ping = client.popen(["ping6", "-i", "0.05", "-c", "220", server_ip6], universal_newlines=True)
+        timeline.run()
+        out, _ = ping.communicate()
         print(out)
+        recorder.extend("rtt", ping_rtts(out), node=client, phase="failures")
+        for result in timeline.results:
+            lg.debug("%s %s at %.3f ms (lag %.3f ms)\n" % (result["event"], result["intf"] or result["node"],
+                                                            result["offset"], result["lag"]))
 
     finally:
         net.stop()
+        recorder.close()
 
 
 args = parse_args()
@@ -202,8 +206,7 @@ sr_testdns = os.path.join(os.path.abspath(args.src_dir), "bin", "sr-testdns")
 os.environ["PATH"] += os.pathsep + os.path.join(os.path.abspath(args.src_dir), "bin")
 
 # Give the database description to the topology
-test_dns_latency("1ms")
-test_dns_latency("5ms")
+test_dns_latency(["1ms", "5ms"])
 # TODO Plot
 
 # Flapping link
@@ -35,6 +35,9 @@ setup(
         'mako',
         'mininet'
     ],
+    extras_require={
+        'yaml': ['pyyaml']
+    },
     tests_require=[],
     setup_requires=[],
     url='https://bitbucket.org/jadinm/srnmininet'
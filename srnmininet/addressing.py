@@ -0,0 +1,114 @@
+import ipaddress
+
+from ipmininet.utils import L3Router, otherIntf, realIntfList
+
+
+class IntfAddresses:
+    """The parsed IPv6 addresses of an interface"""
+
+    __slots__ = ("intf", "ip6", "address", "addresses", "globals", "link_locals", "prefixes")
+
+    def __init__(self, intf):
+        self.intf = intf
+        ip6s = list(intf.ip6s(exclude_lls=False, exclude_lbs=False))
+        # The default address of the interface, as returned by intf.ip6
+        self.ip6 = ip6s[0].ip.compressed if ip6s else None
+        self.address = ip6s[0].ip if ip6s else None
+        # Every address except the link-local ones (with ::1 on the loopback interface)
+        self.addresses = [ip6 for ip6 in ip6s if not ip6.is_link_local]
+        self.globals = [ip6 for ip6 in self.addresses if not ip6.is_loopback]
+        self.link_locals = [ip6 for ip6 in ip6s if ip6.is_link_local]
+        self.prefixes = list(dict.fromkeys(ip6.network for ip6 in self.globals))
+
+
+class AddressIndex:
+    """Index of the IPv6 addresses and prefixes of every interface of a network.
+
+       It is built once the addresses are allocated so that the route computation,
+       the rows of the controller databases and the configuration of the daemons do not
+       walk the interfaces and parse their addresses again for every router and every destination.
+       Prefixes are looked up with a longest prefix match on one dict per prefix length."""
+
+    def __init__(self, net):
+        """:param net: The network whose addresses are allocated"""
+        self.net = net
+        self.intfs = {}  # {interface: IntfAddresses}
+        self.owners = {}  # {IPv6Address: interface}
+        self.prefixes = {}  # {IPv6Network: [interfaces]}
+        self._by_length = {}  # {prefix length: {network address as int: IPv6Network}}
+        self._lengths = []
+        self._host_prefixes = {}  # {node name: [IPv6Network]}
+        self.refresh()
+
+    def refresh(self):
+        """Parse the addresses of all the interfaces again (e.g., to get their link-local addresses
+           once the interfaces are up)"""
+        self.intfs.clear()
+        self.owners.clear()
+        self.prefixes.clear()
+        self._by_length.clear()
+        self._host_prefixes.clear()
+        for node in self.net.values():
+            for intf in node.intfList():
+                if hasattr(intf, "ip6s"):
+                    self._add(intf)
+        self._lengths = sorted(self._by_length, reverse=True)
+
+    def _add(self, intf):
+        addresses = self.intfs[intf] = IntfAddresses(intf)
+        for ip6 in addresses.globals:
+            self.owners.setdefault(ip6.ip, intf)
+        for prefix in addresses.prefixes:
+            self.prefixes.setdefault(prefix, []).append(intf)
+            self._by_length.setdefault(prefix.prefixlen, {})[int(prefix.network_address)] = prefix
+
+    def __getitem__(self, intf):
+        return self.intfs[intf]
+
+    def loopbacks(self, node):
+        """Return the global addresses of the loopback interface of a node"""
+        return self.intfs[node.intf("lo")].globals
+
+    def node_addresses(self, node):
+        """Return the non link-local addresses of the interfaces of a node, including the ones
+           of its loopback interface"""
+        return [ip6 for intf in realIntfList(node) + [node.intf("lo")] for ip6 in self.intfs[intf].addresses]
+
+    def host_prefixes(self, node):
+        """Return the prefixes of the interfaces of a router that are not connected to another router"""
+        prefixes = self._host_prefixes.get(node.name)
+        if prefixes is None:
+            prefixes = self._host_prefixes[node.name] = \
+                [prefix for intf in realIntfList(node) if not L3Router.is_l3router_intf(otherIntf(intf))
+                 for prefix in self.intfs[intf].prefixes]
+        return prefixes
+
+    def owner(self, address):
+        """Return the interface with a given address or None"""
+        return self.owners.get(ipaddress.ip_address(address))
+
+    def lookup(self, address):
+        """Return the longest prefix containing an address or None"""
+        value = int(ipaddress.ip_address(address))
+        for length in self._lengths:
+            prefix = self._by_length[length].get(value >> (128 - length) << (128 - length))
+            if prefix is not None:
+                return prefix
+        return None
+
+    def lan(self, address):
+        """Return the interfaces of the LAN whose prefix is the longest one containing an address"""
+        prefix = self.lookup(address)
+        return self.prefixes[prefix] if prefix is not None else []
+
+    def broadcast_domain(self, address):
+        """Return the broadcast domain of the LAN containing an address or None"""
+        for intf in self.lan(address):
+            if intf.broadcast_domain is not None:
+                return intf.broadcast_domain
+        return None
+
+
+def address_index(node):
+    """Return the address index of the network of a node or None if it was not built yet"""
+    return getattr(node, "address_index", None)
@@ -0,0 +1,292 @@
+import ctypes
+import ipaddress
+import os
+import selectors
+import socket
+import struct
+import threading
+
+from mininet.log import lg
+
+from .netlink import namespace_socket
+from .resources import parse_cpus
+
+ETH_P_IPV6 = 0x86DD
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+SO_ATTACH_FILTER = 26
+SO_RCVBUFFORCE = 33
+PACKET_OUTGOING = 4
+
+IPPROTO_ROUTING = 43
+IPPROTO_IPV6 = 41
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+SRH_TYPE = 4
+
+IPV6_HEADER_LEN = 40
+SRH_HEADER_LEN = 8
+SEGMENT_LEN = 16
+
+# Classic BPF instructions (see linux/filter.h)
+BPF_LD_W_ABS = 0x20
+BPF_LD_B_ABS = 0x30
+BPF_JEQ_K = 0x15
+BPF_RET_K = 0x06
+# Offset of the packet type in the ancillary data of the packet (SKF_AD_OFF + SKF_AD_PKTTYPE)
+BPF_PKTTYPE = 0xfffff004
+
+TPACKET_STATS = struct.Struct("II")
+PORTS = struct.Struct("!HH")
+
+
+def srh_filter(snaplen):
+    """Return the classic BPF program keeping the first snaplen bytes of the received IPv6 packets
+       whose first extension header is a segment routing header (routing header type 4).
+       The program runs on packets without link-layer header (SOCK_DGRAM packet sockets)."""
+    return [(BPF_LD_W_ABS, 0, 0, BPF_PKTTYPE),
+            (BPF_JEQ_K, 5, 0, PACKET_OUTGOING),  # Packets sent by the node are seen on the peer interface
+            (BPF_LD_B_ABS, 0, 0, 6),  # Next header of the IPv6 header
+            (BPF_JEQ_K, 0, 3, IPPROTO_ROUTING),
+            (BPF_LD_B_ABS, 0, 0, IPV6_HEADER_LEN + 2),  # Routing type
+            (BPF_JEQ_K, 0, 1, SRH_TYPE),
+            (BPF_RET_K, 0, 0, snaplen),
+            (BPF_RET_K, 0, 0, 0)]
+
+
+def attach_filter(sock, program):
+    """Attach a classic BPF program to a socket
+
+    :return: the buffer of the program (it must be kept alive as long as the socket)"""
+    code = b"".join(struct.pack("HBBI", *instruction) for instruction in program)
+    buf = ctypes.create_string_buffer(code)
+    fprog = struct.pack("HP", len(program), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+    return buf
+
+
+def parse_srh(packet):
+    """Decode the segment routing header of an IPv6 packet without copying the packet
+
+    :param packet: A memoryview of the packet (starting at the IPv6 header)
+    :return: the tuple (flow, segments, segments left) or None if the packet is truncated.
+             The flow is (source, destination, protocol, source port, destination port) of the inner packet
+             in encapsulation mode and of the packet itself in inline mode, where the destination
+             is the last segment. Addresses and the segment list are packed bytes."""
+    length = len(packet)
+    if length < IPV6_HEADER_LEN + SRH_HEADER_LEN:
+        return None
+    start = IPV6_HEADER_LEN
+    next_header = packet[start]
+    srh_len = SRH_HEADER_LEN + packet[start + 1] * 8
+    segments_left = packet[start + 3]
+    last_entry = packet[start + 4]
+    end = start + SRH_HEADER_LEN + (last_entry + 1) * SEGMENT_LEN
+    if end > length or end > start + srh_len:
+        return None
+    segments = packet[start + SRH_HEADER_LEN:end].tobytes()
+
+    payload = start + srh_len
+    if next_header == IPPROTO_IPV6:
+        # Encapsulation mode: the flow is the one of the inner packet
+        if payload + IPV6_HEADER_LEN > length:
+            return None
+        src = packet[payload + 8:payload + 24].tobytes()
+        dst = packet[payload + 24:payload + 40].tobytes()
+        next_header = packet[payload + 6]
+        payload += IPV6_HEADER_LEN
+    else:
+        # Inline mode: the original destination is the last segment (the first of the list)
+        src = packet[8:24].tobytes()
+        dst = segments[:SEGMENT_LEN]
+    sport = dport = 0
+    if next_header in (IPPROTO_TCP, IPPROTO_UDP) and payload + PORTS.size <= length:
+        sport, dport = PORTS.unpack_from(packet, payload)
+    return (src, dst, next_header, sport, dport), segments, segments_left
+
+
+def segment_list(segments):
+    """Return the addresses of a packed segment list in the order in which they are visited"""
+    return [str(ipaddress.IPv6Address(segments[i:i + SEGMENT_LEN]))
+            for i in range(len(segments) - SEGMENT_LEN, -1, -SEGMENT_LEN)]
+
+
+class SRv6Capture:
+    """Capture the SRv6 packets received on interfaces of the network and count them
+       per flow and per segment list.
+
+       A packet socket is opened in the namespace of each interface with a BPF filter
+       that only keeps the first snaplen bytes of the packets with a segment routing header,
+       so that the other packets are dropped by the kernel. A single thread reads the packets
+       of all the interfaces into the slots of a preallocated ring buffer and decodes them in place.
+       Packets that do not fit in the reception buffer of a socket are dropped by the kernel and counted."""
+
+    def __init__(self, net, intfs, snaplen=256, ring_size=4096, rcvbuf=1 << 22, cpus=None):
+        """:param net: The started network
+           :param intfs: The interfaces (or their names) to capture on
+           :param snaplen: The number of bytes kept for each packet (enough for the headers
+                           with 9 segments in encapsulation mode by default)
+           :param ring_size: The number of packets kept in the ring buffer
+           :param rcvbuf: The size of the reception buffer of each socket
+           :param cpus: The CPUs on which the capture thread runs (see resources.parse_cpus())"""
+        self.net = net
+        names = {i.name: i for node in net.values() for i in node.intfList()}
+        self.intfs = []
+        for intf in intfs:
+            if isinstance(intf, str):
+                if intf not in names:
+                    raise Exception("Cannot find the interface %s" % intf)
+                intf = names[intf]
+            self.intfs.append(intf)
+        self.snaplen = snaplen
+        self.ring_size = ring_size
+        self.rcvbuf = rcvbuf
+        self.cpus = parse_cpus(cpus)
+
+        self.ring = memoryview(bytearray(ring_size * snaplen))
+        self.ring_lengths = [0] * ring_size
+        self.ring_intfs = [None] * ring_size
+        self.ring_index = 0
+
+        self.flows = {}  # {flow: [packets, bytes]}
+        self.segment_lists = {}  # {segments: [packets, bytes]}
+        self.segments_left = {}  # {(segments, segments left): packets}
+        self.packets = {intf.name: 0 for intf in self.intfs}
+        self.truncated = 0
+        self.drops = {intf.name: 0 for intf in self.intfs}
+
+        self._sockets = {}
+        self._filters = []
+        self._selector = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _open(self, intf):
+        sock = namespace_socket(intf.node.pid, socket.htons(ETH_P_IPV6), family=socket.AF_PACKET,
+                                sock_type=socket.SOCK_DGRAM)
+        try:
+            self._filters.append(attach_filter(sock, srh_filter(self.snaplen)))
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, self.rcvbuf)
+            except OSError:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+            sock.bind((intf.name, ETH_P_IPV6))
+            sock.setblocking(False)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def start(self):
+        self._stop.clear()
+        self._selector = selectors.DefaultSelector()
+        for intf in self.intfs:
+            sock = self._sockets[intf.name] = self._open(intf)
+            self._selector.register(sock, selectors.EVENT_READ, intf.name)
+        self._thread = threading.Thread(target=self.run, name="srv6-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the capture after reading the packets already received"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        for name, sock in self._sockets.items():
+            self._read_drops(name, sock)
+            sock.close()
+        self._sockets = {}
+        self._filters = []
+        self._selector.close()
+        self._selector = None
+        dropped = sum(self.drops.values())
+        if dropped:
+            lg.warn("*** %d SRv6 packets were dropped by the capture\n" % dropped)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _read_drops(self, name, sock):
+        # The statistics of the socket are reset when they are read
+        _, drops = TPACKET_STATS.unpack(sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, TPACKET_STATS.size))
+        self.drops[name] += drops
+
+    def _drain(self, name, sock):
+        ring, snaplen, ring_size = self.ring, self.snaplen, self.ring_size
+        flows, segment_lists, segments_left = self.flows, self.segment_lists, self.segments_left
+        count = 0
+        while True:
+            slot = self.ring_index * snaplen
+            try:
+                # With MSG_TRUNC, the length of the whole packet is returned
+                length = sock.recv_into(ring[slot:slot + snaplen], snaplen, socket.MSG_TRUNC)
+            except (BlockingIOError, InterruptedError):
+                break
+            captured = min(length, snaplen)
+            self.ring_lengths[self.ring_index] = captured
+            self.ring_intfs[self.ring_index] = name
+            self.ring_index = (self.ring_index + 1) % ring_size
+            count += 1
+
+            decoded = parse_srh(ring[slot:slot + captured])
+            if decoded is None:
+                self.truncated += 1
+                continue
+            flow, segments, left = decoded
+            counters = flows.get(flow)
+            if counters is None:
+                counters = flows[flow] = [0, 0]
+            counters[0] += 1
+            counters[1] += length
+            counters = segment_lists.get(segments)
+            if counters is None:
+                counters = segment_lists[segments] = [0, 0]
+            counters[0] += 1
+            counters[1] += length
+            key = (segments, left)
+            segments_left[key] = segments_left.get(key, 0) + 1
+        self.packets[name] += count
+
+    def run(self):
+        if self.cpus:
+            # Only the capture thread is pinned
+            os.sched_setaffinity(0, self.cpus)
+        while not self._stop.is_set():
+            for key, _ in self._selector.select(timeout=.1):
+                self._drain(key.data, key.fileobj)
+        for name, sock in self._sockets.items():
+            self._drain(name, sock)
+
+    def recent(self):
+        """Return the packets of the ring buffer, from the oldest to the newest,
+           as tuples (interface name, decoded SRH as returned by parse_srh())"""
+        packets = []
+        for i in range(self.ring_size):
+            index = (self.ring_index + i) % self.ring_size
+            if self.ring_intfs[index] is None:
+                continue
+            slot = index * self.snaplen
+            packets.append((self.ring_intfs[index],
+                            parse_srh(self.ring[slot:slot + self.ring_lengths[index]])))
+        return packets
+
+    def report(self):
+        """Return the counters with readable addresses as a dict
+           {'packets', 'drops', 'truncated', 'flows', 'segment_lists'}"""
+        flows = []
+        for (src, dst, proto, sport, dport), (packets, size) in self.flows.items():
+            flows.append({"src": str(ipaddress.IPv6Address(src)), "dst": str(ipaddress.IPv6Address(dst)),
+                          "proto": proto, "sport": sport, "dport": dport, "packets": packets, "bytes": size})
+        segment_lists = []
+        for segments, (packets, size) in self.segment_lists.items():
+            left = {sl: count for (s, sl), count in self.segments_left.items() if s == segments}
+            segment_lists.append({"segments": segment_list(segments), "packets": packets, "bytes": size,
+                                  "segments_left": left})
+        return {"packets": dict(self.packets), "drops": dict(self.drops), "truncated": self.truncated,
+                "flows": sorted(flows, key=lambda flow: -flow["packets"]),
+                "segment_lists": sorted(segment_lists, key=lambda s: -s["packets"])}
@@ -1,4 +1,5 @@
+from .config import SRNOSPF6, SRCtrl, SRCtrlDomain, OVSDB, SRRouted, SRNDaemon, SRDNSProxy, SRNNamed, SRNZone, \
+    ResourceLimitedDaemon
 
-from .config import SRNOSPF6, SRCtrl, SRCtrlDomain, OVSDB, SRRouted
-
-__all__ = ['SRNOSPF6', 'SRCtrl', 'SRRouted', 'SRCtrlDomain', 'OVSDB']
+__all__ = ['SRNOSPF6', 'SRCtrl', 'SRRouted', 'SRCtrlDomain', 'OVSDB', 'SRNDaemon', 'SRDNSProxy', 'SRNNamed',
+           'SRNZone', 'ResourceLimitedDaemon']
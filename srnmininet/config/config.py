@@ -1,3 +1,4 @@
+import abc
 import heapq
 import json
 import os
@@ -5,14 +6,17 @@ import re
 import time
 
 from ipmininet.host import IPHost
-from ipmininet.host.config import Named, DNSZone
+from ipmininet.host.config import Named, DNSZone, SOARecord
 from ipmininet.iptopo import Overlay
 from ipmininet.router.config import OSPF6, Zebra
 from ipmininet.router.config.base import Daemon, RouterDaemon
-from ipmininet.utils import realIntfList
+from ipmininet.utils import L3Router, realIntfList
 from mako.lookup import TemplateLookup
 from mininet.log import lg
 
+from srnmininet.addressing import address_index
+from srnmininet.netlink import NetlinkError, node_netlink
+from srnmininet.resources import cgroup_path, create_cgroup, remove_cgroup, wrap_command
 from srnmininet.srntopo import SRNTopo
 
 __TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'templates')
@@ -21,28 +25,207 @@ srn_template_lookup = TemplateLookup(directories=[__TEMPLATES_DIR])
 
 class SRCtrlDomain(Overlay):
 
-    def __init__(self, access_routers, sr_controller, schema_tables, hosts=()):  # TODO Add marker for access router
-
-        super().__init__(nodes=access_routers, nprops={"sr_controller": sr_controller, "schema_tables": schema_tables})
-        self.zone = DNSZone(name="test.sr", dns_master=sr_controller, nodes=self.nodes + list(hosts))
-        if sr_controller not in self.nodes:
-            self.add_node(sr_controller)
+    def __init__(self, access_routers, sr_controller, schema_tables, hosts=(), partition=None,
+                 subzones=False):  # TODO Add marker for access router
+        """:param access_routers: The access routers of the domain
+           :param sr_controller: The name (or list of names) of routers that will run a SRN controller
+           :param schema_tables: The ovsdb table descriptions
+           :param hosts: The hosts to register in the DNS zone of the domain
+           :param partition: A dict {access router: controller name} assigning access routers to a controller.
+                             By default, each access router uses its closest controller.
+           :param subzones: Whether the hosts are registered in a sub-zone of their access router
+                            (i.e., <host>.<access router>.test.sr) instead of the zone of the domain"""
+        self.sr_controllers = [sr_controller] if isinstance(sr_controller, str) else list(sr_controller)
+        self.partition = dict(partition) if partition else {}
+        if len(self.sr_controllers) == 1:
+            self.partition = {n: self.sr_controllers[0] for n in access_routers}
+        self.access_routers = list(access_routers)
+        self.hosts = list(hosts)
+        self.subzones = []
+
+        super().__init__(nodes=access_routers, nprops={"sr_controllers": self.sr_controllers,
+                                                       "schema_tables": schema_tables})
+        self.zone = SRNZone(name="test.sr", dns_master=self.sr_controllers[0], dns_slaves=self.sr_controllers[1:],
+                            nodes=self.nodes, hosts=() if subzones else self.hosts)
+        self.use_subzones = subzones
+        for controller in self.sr_controllers:
+            if controller not in self.nodes:
+                self.add_node(controller)
 
         for n in access_routers:
             self.set_node_property(n, "access_router", True)
-            self.set_node_property(n, "sr_controller", sr_controller)
-        self.set_node_property(sr_controller, "schema_tables", schema_tables)
-        self.set_node_property(sr_controller, "controller", True)
+            self.set_node_property(n, "sr_controller", self.partition.get(n))
+        for controller in self.sr_controllers:
+            self.set_node_property(controller, "sr_controller", controller)
+            self.set_node_property(controller, "schema_tables", schema_tables)
+            self.set_node_property(controller, "controller", True)
+
+    def hosts_per_access_router(self, topo):
+        """Return the dict {access router: [hosts]} where each host is attached to the access router,
+           possibly through switches"""
+        access_routers = set(self.access_routers)
+        neighbors = {}
+        for node1, node2 in topo.links():
+            neighbors.setdefault(node1, []).append(node2)
+            neighbors.setdefault(node2, []).append(node1)
+
+        hosts = {}
+        for host in self.hosts:
+            visited = {host}
+            to_visit = list(neighbors.get(host, []))
+            while to_visit:
+                n = to_visit.pop(0)
+                if n in visited:
+                    continue
+                visited.add(n)
+                if n in access_routers:
+                    hosts.setdefault(n, []).append(host)
+                    break
+                if topo.isSwitch(n):
+                    to_visit.extend(neighbors.get(n, []))
+            else:
+                lg.error("Cannot find the access router of %s\n" % host)
+        return hosts
 
     def check_consistency(self, topo: 'SRNTopo') -> bool:
+        for n, controller in self.partition.items():
+            if controller not in self.sr_controllers:
+                lg.error("Access router %s is assigned to %s which is not a controller of the domain\n"
+                         % (n, controller))
+                return False
         return super().check_consistency(topo) and self.zone.check_consistency(topo)
 
     def apply(self, topo: 'SRNTopo'):
+        if self.use_subzones:
+            for access_router, hosts in self.hosts_per_access_router(topo).items():
+                master = self.partition.get(access_router) or self.sr_controllers[0]
+                zone = SRNZone(name="%s.%s" % (access_router, self.zone.name), dns_master=master,
+                               dns_slaves=[c for c in self.sr_controllers if c != master], hosts=hosts)
+                self.subzones.append(zone)
+            self.zone.delegated_zones.extend(self.subzones)
+            for zone in self.subzones:
+                zone.apply(topo)
         self.zone.apply(topo)
         super().apply(topo)
 
 
-class OVSDB(RouterDaemon):
+class SerialSOARecord(SOARecord):
+    """A SOA record whose serial can be increased to notify the slaves of changes"""
+
+    def __init__(self, *args, serial=1, **kwargs):
+        self.serial = serial
+        super().__init__(*args, **kwargs)
+
+    @property
+    def rdata(self):
+        return super().rdata.replace("\n1 ; serial\n", "\n%d ; serial\n" % self.serial, 1)
+
+
+class SRNZone(DNSZone):
+    """A DNS zone whose host records are not stored as DNSRecord objects
+       but generated while the zone file is written by SRNNamed"""
+
+    def __init__(self, name, dns_master, hosts=(), **kwargs):
+        """:param hosts: The names of the hosts for which one AAAA (or A) record
+                         is written for each of their addresses"""
+        super().__init__(name, dns_master, **kwargs)
+        self.hosts = list(hosts)
+        soa = self.soa_record
+        self.soa_record = SerialSOARecord(self.name, refresh_time=soa.refresh_time, retry_time=soa.retry_time,
+                                          expire_time=soa.expire_time, min_ttl=soa.ttl)
+
+    def host_records(self, nodes, ttl=60):
+        """Yield the (name, ttl, type, address) of the host records
+
+        :param nodes: The dict {name: node} of the nodes of the network"""
+        for name in self.hosts:
+            node = nodes.get(name)
+            if node is None:
+                lg.error("Cannot find the host %s of DNS zone %s\n" % (name, self.name))
+                continue
+            for itf in realIntfList(node):
+                for ip in itf.ips():
+                    yield name, ttl, "A", ip.ip.compressed
+                for ip6 in itf.ip6s(exclude_lls=True):
+                    yield name, ttl, "AAAA", ip6.ip.compressed
+
+
+def network_nodes(start):
+    """Return the dict {name: node} of every node reachable from start"""
+    nodes = {start.name: start}
+    to_visit = [start]
+    while to_visit:
+        node = to_visit.pop()
+        for itf in realIntfList(node):
+            for peer in itf.broadcast_domain.interfaces:
+                if peer.node.name not in nodes:
+                    nodes[peer.node.name] = peer.node
+                    if L3Router.is_l3router_intf(peer):
+                        to_visit.append(peer.node)
+    return nodes
+
+
+def write_zone_file(fileobj, zone, records, host_records=()):
+    """Write a zone file without building the list of its records
+
+    :param fileobj: The file object
+    :param zone: The zone (or any object with a soa_record)
+    :param records: The DNSRecord objects
+    :param host_records: An iterable of (name, ttl, type, data) written as they are produced"""
+    if zone.soa_record:
+        fileobj.write("$TTL %d\n@\tIN\tSOA\t%s\n\n" % (zone.soa_record.ttl, zone.soa_record.rdata))
+    for record in records:
+        fileobj.write("%s   %d\tIN\t%s\t%s\n" % (record.domain_name, record.ttl, record.rtype, record.rdata))
+    fileobj.writelines("%s   %d\tIN\t%s\t%s\n" % record for record in host_records)
+
+
+class ResourceLimitedDaemon(metaclass=abc.ABCMeta):
+    """Mixin for the daemons whose processes can be pinned to CPUs, limited by a cgroup v2 and reniced.
+       The daemons define command_line and the startup line launches it with these settings.
+       Default settings can be given per daemon name in the 'daemon_resources' parameter of the router,
+       e.g., {"sr-ctrl": {"cpus": [2], "memory_max": "512M"}}."""
+
+    def set_defaults(self, defaults):
+        """:param cpus: the CPUs on which the daemon runs (e.g., [0, 1] or "0-1"), all of them by default
+           :param cpu_quota: the maximum number of CPUs used by the daemon (e.g., 0.5 for half a core)
+           :param memory_max: the maximum memory of the daemon in bytes (or with a K, M or G suffix)
+           :param nice: the nice level of the daemon"""
+        defaults.cpus = None
+        defaults.cpu_quota = None
+        defaults.memory_max = None
+        defaults.nice = None
+        for key, value in self._node.get("daemon_resources", {}).get(self.NAME, {}).items():
+            defaults[key] = value
+        super().set_defaults(defaults)
+
+    @property
+    @abc.abstractmethod
+    def command_line(self):
+        """Return the command of the daemon process"""
+
+    @property
+    def cgroup(self):
+        """The path of the cgroup of the daemon or None if its resources are not limited"""
+        if self.options.cpu_quota is None and self.options.memory_max is None:
+            return None
+        return cgroup_path("%s.%s" % (self._node.name, self.NAME))
+
+    @property
+    def startup_line(self):
+        return wrap_command(self.command_line, cpus=self.options.cpus, nice=self.options.nice, cgroup=self.cgroup)
+
+    def write(self, cfg):
+        super().write(cfg)
+        if self.cgroup is not None:
+            create_cgroup(self.cgroup, cpu_quota=self.options.cpu_quota, memory_max=self.options.memory_max)
+
+    def cleanup(self):
+        if self.cgroup is not None:
+            remove_cgroup(self.cgroup)
+        super().cleanup()
+
+
+class OVSDB(ResourceLimitedDaemon, RouterDaemon):
     NAME = 'ovsdb-server'
     KILL_PATTERNS = (NAME,)
     PRIO = 0
@@ -54,7 +237,7 @@ class OVSDB(RouterDaemon):
                          **kwargs)
 
     @property
-    def startup_line(self):
+    def command_line(self):
         return '{name} {database} --remote={remotes} --pidfile={pid} --log-file={log} --unixctl={ctl}' \
             .format(name=self.NAME,
                     database=os.path.join(self._node.cwd, self.options.database),
@@ -89,9 +272,13 @@ class OVSDB(RouterDaemon):
            :param version: the version of the ovsdb table descriptions"""
         defaults.ovsdb_client = "ovsdb-client"
         defaults.database = "SR_test"
-        defaults.remotes = ["ptcp:6640:[%s]" % ip6.ip.compressed
-                            for itf in realIntfList(self._node) + [self._node.intf('lo')]
-                            for ip6 in itf.ip6s(exclude_lls=True, exclude_lbs=False)]
+        index = address_index(self._node)
+        if index is not None:
+            addresses = index.node_addresses(self._node)
+        else:
+            addresses = [ip6 for itf in realIntfList(self._node) + [self._node.intf('lo')]
+                         for ip6 in itf.ip6s(exclude_lls=True, exclude_lbs=False)]
+        defaults.remotes = ["ptcp:6640:[%s]" % ip6.ip.compressed for ip6 in addresses]
         defaults.schema_tables = self._node.schema_tables if self._node.schema_tables else {}
         defaults.version = "0.0.1"
         super().set_defaults(defaults)
@@ -151,6 +338,76 @@ class OVSDB(RouterDaemon):
         print(cmd)  # TODO Remove
         return self._node.cmd(cmd)
 
+    def insert_entries(self, rows):
+        """Insert several rows in a single transaction
+
+        :param rows: the list of (table name, row content) to insert"""
+        return self.transact([{"op": "insert", "table": table, "row": row} for table, row in rows])
+
+    def transact(self, operations):
+        """Run a list of OVSDB operations (see RFC 7047) in a single transaction
+
+        :param operations: the list of operations
+        :return: the list of results of the operations or None if the output cannot be parsed"""
+        query = json.dumps([self.options.database] + list(operations))
+        # Run in a separate process (instead of the shell of the node) so that it can be used by other threads
+        out, err, _ = self._node.pexec([self.options.ovsdb_client, "transact",
+                                        next(self._remote_server_to_client()), query])
+        try:
+            return json.loads(out)
+        except ValueError:
+            lg.error("Cannot parse the result of the OVSDB transaction on %s: %s %s\n" % (self._node.name, out, err))
+            return None
+
+    def row_counts(self, tables=None):
+        """Count the rows in the given tables
+
+        :param tables: the table names (all the tables of the schema by default)
+        :return: the dict {table name: row count}"""
+        tables = list(self.options.schema_tables.keys()) if tables is None else list(tables)
+        # Without any column, the server only sends an empty object per row
+        results = self.transact([{"op": "select", "table": table, "where": [], "columns": []}
+                                 for table in tables])
+        if results is None:
+            return {}
+        return {table: len(result.get("rows", [])) for table, result in zip(tables, results)}
+
+    @property
+    def database_path(self):
+        return os.path.join(self._node.cwd, self.options.database)
+
+    def appctl(self, *args):
+        """Run a command of ovs-appctl on the unixctl socket of the server
+
+        :return: the tuple (stdout, stderr, return code)"""
+        return self._node.pexec(["ovs-appctl", "-t", os.path.abspath(self._file('ctl'))] + list(args))
+
+    def compact(self):
+        """Compact the database file while the server is running
+
+        :return: whether the compaction succeeded"""
+        out, err, code = self.appctl("ovsdb-server/compact", self.options.database)
+        if code:
+            lg.error("Cannot compact the database of %s: %s %s\n" % (self._node.name, out, err))
+        return code == 0
+
+    def memory_usage(self):
+        """Return the memory usage reported by the server (e.g., {'cells': 1234, 'monitors': 2})"""
+        out, _, code = self.appctl("memory/show")
+        if code:
+            return {}
+        return {key: int(value) for key, value in re.findall(r"([\w-]+):(\d+)", out)}
+
+    def reset_tables(self, rows, tables=None):
+        """Delete every row of the tables and insert the given rows in the same transaction
+
+        :param rows: the list of (table name, row content) to insert
+        :param tables: the table names to empty (all the tables of the schema by default)"""
+        tables = list(self.options.schema_tables.keys()) if tables is None else list(tables)
+        operations = [{"op": "delete", "table": table, "where": []} for table in tables]
+        operations.extend({"op": "insert", "table": table, "row": row} for table, row in rows)
+        return self.transact(operations)
+
 
 class SRNOSPF6(OSPF6):
     """
@@ -239,10 +496,10 @@ class ZlogDaemon(Daemon):
         return super().render(cfg, **kwargs)
 
 
-class SRNDaemon(ZlogDaemon):
+class SRNDaemon(ResourceLimitedDaemon, ZlogDaemon):
 
     @property
-    def startup_line(self):
+    def command_line(self):
         return '{name} {cfg}' \
             .format(name=self.NAME,
                     cfg=self.cfg_filename)
@@ -250,7 +507,7 @@ class SRNDaemon(ZlogDaemon):
     def build(self):
         cfg = super().build()
 
-        sr_controller_ip, ovsdb = find_controller(self._node, self._node.sr_controller)
+        sr_controller_ip, ovsdb = find_controller(self._node, self._node.sr_controller or self._node.sr_controllers)
         self.options.sr_controller_ip = sr_controller_ip
         cfg.ovsdb_server = ovsdb.remote_server_to_client(sr_controller_ip)
         cfg.ovsdb_database = ovsdb.options.database
@@ -281,6 +538,41 @@ class SRNNamed(Named):
         super().set_defaults(defaults)
         defaults.dns_server_port = 2000
 
+    def master_zones(self):
+        """Return the SRNZones of which this node is the master"""
+        return [zone for zone in self._node.get('dns_zones', [])
+                if isinstance(zone, SRNZone) and zone.dns_master == self._node.name]
+
+    def write(self, cfg):
+        super().write(cfg)
+        # The host records of the SRN zones are streamed to the zone files
+        zones = self.master_zones()
+        if zones:
+            nodes = network_nodes(self._node)
+            for zone in zones:
+                self.write_zone(zone, nodes)
+
+    def write_zone(self, zone, nodes):
+        with open(self.zone_filename(zone.name), "w") as fileobj:
+            write_zone_file(fileobj, zone, zone.records, zone.host_records(nodes))
+
+    def update_zone(self, zone, added=(), removed=()):
+        """Change the hosts of a zone while named is running.
+           The zone file is rewritten with a new serial and named reloads it (the slaves are notified).
+
+        :param zone: The SRNZone of which this node is the master
+        :param added: The names of the hosts to add
+        :param removed: The names of the hosts to remove"""
+        removed = set(removed)
+        hosts = [h for h in zone.hosts if h not in removed]
+        known = set(hosts)
+        hosts.extend(h for h in added if h not in known)
+        zone.hosts = hosts
+        zone.soa_record.serial += 1
+        self.write_zone(zone, network_nodes(self._node))
+        # SIGHUP makes named reload the zones whose file changed
+        self._node.pexec(["pkill", "-HUP", "-f", self.cfg_filename])
+
 
 class SRDNSProxy(SRNDaemon):
     NAME = 'sr-dnsproxy'
@@ -318,6 +610,11 @@ class SRDNSProxy(SRNDaemon):
 
         super().set_defaults(defaults)
 
+    @property
+    def listen_ports(self):
+        """The ports on which the daemon is ready to answer"""
+        return [self.options.proxy_listen_port]
+
 
 class SRCtrl(SRNDaemon):
     NAME = 'sr-ctrl'
@@ -384,6 +681,9 @@ class SRRouted(SRNDaemon):
         return "%d\t%s\n" % (self.localsid_idx, self.localsid_name)
 
     def add_localsid_table(self):
+        if self.localsid_idx > 0:
+            # Already created (the configuration is built again when the daemon is reconfigured)
+            return self.localsid_idx
 
         # Create name and index of the node local SID table
 
@@ -419,29 +719,93 @@ class SRRouted(SRNDaemon):
 
             # Add a rule so that traffic directed to loopback prefix is transferred to the localsid table
 
-            for ip6 in self._node.intf("lo").ip6s(exclude_lls=True, exclude_lbs=True):
-                cmd = ["ip", "-6", "rule", "add", "to", ip6.network.with_prefixlen, "lookup", self.localsid_name]
-                self._node.cmd(cmd)
+            nl = node_netlink(self._node)
+            if nl is not None:
+                for rule, error in zip(self.localsid_rules(), nl.route.add_rules(self.localsid_rules())):
+                    if error is not None:
+                        lg.error("Cannot add rule to %s lookup %s: %s\n" % (rule["dst"], self.localsid_name, error))
+            else:
+                for rule in self.localsid_rules():
+                    cmd = ["ip", "-6", "rule", "add", "to", rule["dst"], "lookup", self.localsid_name]
+                    self._node.cmd(cmd)
 
         return self.localsid_idx
 
-    def cleanup(self):
+    def localsid_rules(self):
+        """Return the rules that send the traffic directed to the loopback prefixes to the local SID table"""
+        index = address_index(self._node)
+        ip6s = index.loopbacks(self._node) if index is not None \
+            else self._node.intf("lo").ip6s(exclude_lls=True, exclude_lbs=True)
+        return [{"dst": ip6.network.with_prefixlen, "table": self.localsid_idx} for ip6 in ip6s]
 
+    def flush_localsid_table(self):
+        """Remove every route of the local SID table, the routes that cannot be removed are logged
+
+        :return: the number of removed routes (None if the ip commands are used)"""
         if self.localsid_idx > 0:
-            # Flush all the table routes
+            nl = node_netlink(self._node)
+            if nl is not None:
+                return nl.route.flush_table(self.localsid_idx)
             cmd = ["ip", "-6", "route", "flush", "table", self.localsid_name]
             try:
-                self._node.cmd(cmd)
-            except Exception:
-                lg.debug("Cannot flush routing table %s", self.localsid_name)
+                _, err, code = self._node.pexec(cmd)
+                if code:
+                    lg.error("%s: Cannot flush routing table %s: %s\n" % (self._node.name, self.localsid_name, err))
+            except Exception as e:
+                lg.error("%s: Cannot flush routing table %s: %s\n" % (self._node.name, self.localsid_name, e))
+        return 0
+
+    def localsid_routes(self):
+        """Return the routes currently installed in the local SID table as dicts (see RTNetlink)"""
+        if self.localsid_idx <= 0:
+            return []
+        nl = node_netlink(self._node)
+        if nl is not None:
+            return nl.route.dump_routes(table=self.localsid_idx)
+
+        out = self._node.cmd(["ip", "-6", "route", "show", "table", self.localsid_name])
+        routes = []
+        for line in out.split("\n"):
+            if not line.strip():
+                continue
+            dst = line.split()[0]
+            routes.append({"dst": dst if "/" in dst else dst + "/128", "table": self.localsid_idx, "line": line})
+        return routes
+
+    def binding_sids(self):
+        """Return the dict {binding SID: segment list} of the SRv6 policies in the local SID table"""
+        bsids = {}
+        for route in self.localsid_routes():
+            bsid = route["dst"].split("/")[0]
+            if "encap" in route:
+                bsids[bsid] = route["encap"]["segs"]
+            elif "line" in route:
+                # Only the routes with a seg6 encapsulation are SRv6 policies (not the seg6local ones)
+                match = re.search(r"encap seg6 .*segs \d+ \[ ([^\]]*) \]", route["line"])
+                if match:
+                    bsids[bsid] = match.group(1).split()
+        return bsids
+
+    def cleanup(self):
+
+        if self.localsid_idx > 0:
+            # Flush all the table routes
+            self.flush_localsid_table()
 
             # Remove the rules pointing to the table
-            for ip6 in self._node.intf("lo").ip6s(exclude_lls=True, exclude_lbs=True):
-                cmd = ["ip", "-6", "rule", "del", "to", ip6.network.with_prefixlen, "lookup", self.localsid_name]
+            nl = node_netlink(self._node)
+            if nl is not None:
                 try:
-                    self._node.cmd(cmd)
-                except Exception:
+                    nl.route.delete_rules(self.localsid_rules())
+                except (OSError, NetlinkError):
                     pass
+            else:
+                for rule in self.localsid_rules():
+                    cmd = ["ip", "-6", "rule", "del", "to", rule["dst"], "lookup", self.localsid_name]
+                    try:
+                        self._node.cmd(cmd)
+                    except Exception:
+                        pass
 
             # Clean the entry in the config file
             with open("/etc/iproute2/rt_tables") as fileobj:
@@ -457,8 +821,14 @@ def ovsdb_daemon(node):
     return node.nconfig.daemon(OVSDB.NAME)
 
 
-def find_controller(base, sr_controller):
-    if base.name == sr_controller:
+def find_controller(base, sr_controllers):
+    """Find the closest router running a SRN controller
+
+    :param base: the node looking for a controller
+    :param sr_controllers: the name (or list of names) of the candidate controllers
+    :return: the tuple (controller address, OVSDB daemon of the controller)"""
+    sr_controllers = [sr_controllers] if isinstance(sr_controllers, str) else list(sr_controllers)
+    if base.name in sr_controllers:
         return (base.intf("lo").ip6 or u"::1"), ovsdb_daemon(base)
 
     if isinstance(base, IPHost):
@@ -481,8 +851,10 @@ def find_controller(base, sr_controller):
         for peer_intf in intf.broadcast_domain.routers:
             if peer_intf == intf:
                 continue
-            if peer_intf.node.name == sr_controller:
-                ip6s = peer_intf.node.intf("lo").ip6s(exclude_lls=True, exclude_lbs=True)
+            if peer_intf.node.name in sr_controllers:
+                index = address_index(peer_intf.node)
+                ip6s = index.loopbacks(peer_intf.node) if index is not None \
+                    else peer_intf.node.intf("lo").ip6s(exclude_lls=True, exclude_lbs=True)
                 for ip6 in ip6s:
                     return ip6.ip, ovsdb_daemon(peer_intf.node)
                 return peer_intf.ip6, ovsdb_daemon(peer_intf.node)
@@ -0,0 +1,244 @@
+import ipaddress
+import re
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ipmininet.utils import L3Router, realIntfList
+from mininet.log import lg
+
+from .config import SRNOSPF6
+from .netlink import NetlinkError, namespace_socket, node_netlink
+from .utils import daemon_in_node
+
+# Telnet port of the vty of ospf6d
+OSPF6_VTY_PORT = 2606
+
+TELNET_IAC = 255
+TELNET_SB = 250
+TELNET_SE = 240
+
+NEIGHBOR_LINE = re.compile(r"^\s*(\d+\.\d+\.\d+\.\d+)\s+\d+\s+\S+\s+([\w-]+)/(\S+)\s+\S+\s+(\S+)\[(\S+)\]")
+ROUTER_LSA_LINE = re.compile(r"^\s*Rtr\s+\S+\s+(\d+\.\d+\.\d+\.\d+)")
+
+
+def strip_telnet(data):
+    """Remove the telnet negotiations from the received bytes"""
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        if data[i] != TELNET_IAC:
+            out.append(data[i])
+            i += 1
+        elif i + 1 < len(data) and data[i + 1] == TELNET_SB:
+            end = data.find(bytes([TELNET_IAC, TELNET_SE]), i + 2)
+            i = len(data) if end < 0 else end + 2
+        elif i + 1 < len(data) and data[i + 1] == TELNET_IAC:
+            out.append(TELNET_IAC)
+            i += 2
+        else:
+            i += 3
+    return bytes(out)
+
+
+class VtyClient:
+    """A client of the vty of a Quagga daemon, connected from the network namespace of its node
+       (the unix sockets of vtysh are shared by all the namespaces)"""
+
+    def __init__(self, node, port=OSPF6_VTY_PORT, password=None, timeout=2.):
+        """:param node: The node running the daemon
+           :param port: The telnet port of the vty
+           :param password: The vty password (the password of the router by default)
+           :param timeout: The maximum time (in seconds) to wait for an answer"""
+        self.prompts = (("%s> " % node.name).encode(), ("%s# " % node.name).encode())
+        self.sock = namespace_socket(node.pid, 0, family=socket.AF_INET, sock_type=socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(("127.0.0.1", port))
+            self._read_until((b"Password: ",))
+            self.sock.sendall(("%s\n" % (password if password is not None else node.password)).encode())
+            self._read_until(self.prompts)
+            self.command("terminal length 0")
+        except Exception:
+            self.sock.close()
+            raise
+
+    def _read_until(self, endings):
+        data = b""
+        while not data.endswith(endings):
+            chunk = self.sock.recv(1 << 16)
+            if not chunk:
+                raise OSError("The vty closed the connection")
+            data = strip_telnet(data + chunk)
+        return data
+
+    def command(self, cmd):
+        """Run a command and return its output"""
+        self.sock.sendall(("%s\n" % cmd).encode())
+        lines = self._read_until(self.prompts).decode(errors="replace").splitlines()
+        return "\n".join(lines[1:-1])  # Without the echoed command and the prompt
+
+    def close(self):
+        self.sock.close()
+
+
+def parse_neighbors(output):
+    """Return the neighbors in the output of 'show ipv6 ospf6 neighbor'
+       as dicts {'router_id', 'state', 'role', 'intf', 'intf_state'}"""
+    neighbors = []
+    for line in output.splitlines():
+        match = NEIGHBOR_LINE.match(line)
+        if match is not None:
+            neighbors.append(dict(zip(("router_id", "state", "role", "intf", "intf_state"), match.groups())))
+    return neighbors
+
+
+def parse_router_lsas(output):
+    """Return the set of the advertising routers of the router LSAs in the output of
+       'show ipv6 ospf6 database router'"""
+    return {match.group(1) for match in map(ROUTER_LSA_LINE.match, output.splitlines()) if match is not None}
+
+
+def ospf6_router_id(router):
+    daemon = daemon_in_node(router, SRNOSPF6)
+    if daemon is None:
+        return None
+    return str(daemon.options.routerid if daemon.options.routerid else router.nconfig.routerid)
+
+
+class OSPF6Gate:
+    """Wait until the IGP of a network running SRNOSPF6 has converged.
+
+       A router is ready when its expected adjacencies are Full (or 2-Way between two DROther routers),
+       when its LSDB holds the router LSA of every OSPF6 router of the topology and when its kernel FIB
+       has a route towards every loopback address. All the routers that are not ready yet are checked
+       in parallel at each round. The wait only fails if no router makes progress
+       for stall_timeout seconds, so that large topologies are not under-waited."""
+
+    def __init__(self, net, interval=.2, stall_timeout=30., workers=64, port=OSPF6_VTY_PORT):
+        """:param net: The started network
+           :param interval: The minimum time (in seconds) between two rounds of checks
+           :param stall_timeout: The maximum time (in seconds) without progress of any router
+           :param workers: The maximum number of routers checked simultaneously
+           :param port: The telnet port of the vty of ospf6d"""
+        self.net = net
+        self.interval = interval
+        self.stall_timeout = stall_timeout
+        self.workers = workers
+        self.port = port
+        self.routers = [r for r in net.routers if ospf6_router_id(r) is not None]
+        self.router_ids = {r.name: ospf6_router_id(r) for r in self.routers}
+        self.adjacencies = {r.name: self.expected_adjacencies(r) for r in self.routers}
+        self.loopbacks = {r.name: [ip6.ip for ip6 in net.address_index.loopbacks(r)] for r in self.routers}
+        self._clients = {}
+
+    def expected_adjacencies(self, router):
+        """Return the set of (interface name, neighbor router id) expected on a router"""
+        adjacencies = set()
+        for intf in realIntfList(router):
+            if intf.get("igp_passive", False) or intf.broadcast_domain is None:
+                continue
+            for peer in intf.broadcast_domain:
+                if peer.node.name != router.name and L3Router.is_l3router_intf(peer) \
+                        and peer.node.name in self.router_ids:
+                    adjacencies.add((intf.name, self.router_ids[peer.node.name]))
+        return adjacencies
+
+    def _vty(self, router):
+        client = self._clients.get(router.name)
+        if client is None:
+            client = self._clients[router.name] = VtyClient(router, port=self.port)
+        return client
+
+    def fib_prefixes(self, router):
+        """Return the IPv6 prefixes of the main routing table of a router (without default routes)"""
+        nl = node_netlink(router)
+        if nl is not None:
+            try:
+                destinations = [route["dst"] for route in nl.route.dump_routes(table=254)]
+            except (OSError, NetlinkError) as e:
+                lg.debug("%s: Cannot dump the routes (%s)\n" % (router.name, e))
+                destinations = []
+        else:
+            out, _, _ = router.pexec(["ip", "-6", "route", "show"])
+            destinations = [line.split()[0] for line in out.splitlines() if line.strip()]
+        prefixes = []
+        for dst in destinations:
+            try:
+                prefix = ipaddress.ip_network(dst, strict=False)
+            except ValueError:
+                continue
+            if prefix.prefixlen > 0:
+                prefixes.append(prefix)
+        return prefixes
+
+    def check(self, router):
+        """Return what is missing on a router: the dict {'adjacencies', 'lsdb', 'fib'}
+           or None if the vty of ospf6d cannot be reached"""
+        try:
+            vty = self._vty(router)
+            neighbors = parse_neighbors(vty.command("show ipv6 ospf6 neighbor"))
+            lsdb = parse_router_lsas(vty.command("show ipv6 ospf6 database router"))
+        except OSError as e:
+            lg.debug("%s: ospf6d is not reachable (%s)\n" % (router.name, e))
+            client = self._clients.pop(router.name, None)
+            if client is not None:
+                client.close()
+            return None
+
+        established = {(n["intf"], n["router_id"]) for n in neighbors
+                       if n["state"] == "Full" or (n["state"] == "2-Way" and n["role"] == "DROther"
+                                                   and n["intf_state"] == "DROther")}
+        prefixes = self.fib_prefixes(router)
+        missing_loopbacks = []
+        for r in self.routers:
+            if r.name == router.name:
+                continue
+            for address in self.loopbacks[r.name]:
+                if not any(address in prefix for prefix in prefixes):
+                    missing_loopbacks.append(str(address))
+        return {"adjacencies": sorted(self.adjacencies[router.name] - established),
+                "lsdb": sorted(set(self.router_ids.values()) - lsdb),
+                "fib": missing_loopbacks}
+
+    def wait(self, start=None):
+        """Block until every router is ready
+
+        :param start: The time.monotonic() reference of the convergence times (the call of wait() by default)
+        :return: the dict {router name: convergence time in seconds}"""
+        start = time.monotonic() if start is None else start
+        pending = list(self.routers)
+        status = {}
+        times = {}
+        last_progress = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(pending)))) as executor:
+                while pending:
+                    round_start = time.monotonic()
+                    results = list(executor.map(self.check, pending))
+                    now = time.monotonic()
+                    still_pending = []
+                    for router, missing in zip(pending, results):
+                        if missing is not None and not any(missing.values()):
+                            times[router.name] = now - start
+                            last_progress = now
+                            continue
+                        if missing != status.get(router.name):
+                            last_progress = now
+                        status[router.name] = missing
+                        still_pending.append(router)
+                    pending = still_pending
+                    if not pending:
+                        break
+                    if now - last_progress > self.stall_timeout:
+                        for router in pending:
+                            lg.error("%s has not converged: %s\n" % (router.name, status[router.name]
+                                                                      or "ospf6d is not reachable"))
+                        raise Exception("The IGP did not converge: no progress in %d seconds for %d routers"
+                                        % (self.stall_timeout, len(pending)))
+                    time.sleep(max(0., self.interval - (now - round_start)))
+        finally:
+            for client in self._clients.values():
+                client.close()
+            self._clients = {}
+        return times
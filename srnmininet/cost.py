@@ -0,0 +1,109 @@
+import re
+
+from ipmininet.utils import otherIntf, realIntfList
+from mininet.node import Switch
+
+# Range of the interface costs (OSPFv3 uses 16-bit interface costs)
+MIN_COST = 1
+MAX_COST = 65535
+
+# Delay costs are expressed in tens of microseconds
+DELAY_UNIT_MS = 0.01
+# Bandwidth (in Mbps) of a link whose inverse bandwidth cost is 1
+REFERENCE_BW = 10000
+
+
+def clamp(cost):
+    return int(min(MAX_COST, max(MIN_COST, round(cost))))
+
+
+def parse_delay(delay):
+    """Return the delay in milliseconds of a traffic control delay (e.g., '1ms', '500us' or '1s').
+       This is the parser of the link delays for both the cost models and the rows of the controller databases."""
+    if not delay:
+        return 0.
+    if isinstance(delay, (int, float)):
+        return float(delay)
+    match = re.match(r"^\s*([\d.]+)\s*(us|ms|s)?\s*$", delay)
+    if match is None:
+        raise Exception("Cannot parse the delay '%s'" % delay)
+    value = float(match.group(1))
+    unit = match.group(2) or "us"  # Unit of netem
+    return value / 1000. if unit == "us" else value * 1000. if unit == "s" else value
+
+
+def link_properties(intf):
+    """Return the propagation delay (in milliseconds) and the bottleneck bandwidth (in Mbps, 0 for unlimited)
+       from an interface to the farthest interface of its broadcast domain, crossing the intermediate switches"""
+    max_delay = 0.
+    min_bw = 0
+    visited = set()
+    to_visit = [(intf, 0.)]
+    while to_visit:
+        i, delay = to_visit.pop()
+        if i.name in visited:
+            continue
+        visited.add(i.name)
+        delay += parse_delay(i.params.get("delay"))
+        bw = i.params.get("bw")
+        if bw and (not min_bw or bw < min_bw):
+            min_bw = bw
+        peer = otherIntf(i)
+        if peer is None:
+            continue
+        if isinstance(peer.node, Switch):
+            visited.add(peer.name)
+            for s_i in realIntfList(peer.node):
+                to_visit.append((s_i, delay))
+        else:
+            max_delay = max(max_delay, delay)
+    return max_delay, min_bw
+
+
+def igp_cost(intf):
+    """The IGP metric of the interface"""
+    return intf.igp_metric
+
+
+def delay_cost(intf):
+    """The propagation delay of the link (in tens of microseconds)"""
+    return clamp(link_properties(intf)[0] / DELAY_UNIT_MS)
+
+
+def bandwidth_cost(intf):
+    """The inverse of the bandwidth of the link, relative to REFERENCE_BW"""
+    bw = link_properties(intf)[1]
+    return clamp(REFERENCE_BW / bw) if bw else MIN_COST
+
+
+COST_MODELS = {"igp": igp_cost, "delay": delay_cost, "bandwidth": bandwidth_cost}
+
+
+def weighted_cost(weights):
+    """Return a cost model combining several models
+
+    :param weights: The dict {model name or function: weight}"""
+    models = [(get_cost_model(model), weight) for model, weight in weights.items()]
+
+    def cost(intf):
+        return clamp(sum(weight * model(intf) for model, weight in models))
+
+    return cost
+
+
+def get_cost_model(model):
+    """Return the function computing the cost of an interface
+
+    :param model: The name of the model (see COST_MODELS), a dict {model: weight}
+                  for a weighted combination of models or a function taking an interface
+                  and returning its cost"""
+    if model is None:
+        return igp_cost
+    if isinstance(model, dict):
+        return weighted_cost(model)
+    if callable(model):
+        return model
+    try:
+        return COST_MODELS[model]
+    except KeyError:
+        raise Exception("Unknown cost model '%s' (available: %s)" % (model, ", ".join(COST_MODELS)))
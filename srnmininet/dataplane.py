@@ -0,0 +1,360 @@
+import errno
+import ipaddress
+import os
+import socket
+import struct
+import threading
+import time
+
+from mininet.log import lg
+
+from .netlink import ip_route_args, namespace_socket, node_netlink
+from .srpath import SRGraph
+
+# Behaviours of the transit routers that the benchmark can chain.
+# The binding SIDs use End.B6.Encaps: with End.B6 (SRH insertion), the kernel puts the binding SID itself
+# at the end of the inserted segment list so the packet cannot leave the policy towards its destination.
+BEHAVIOURS = ("End", "End.X", "End.B6.Encaps")
+# Function parts of the SIDs of a router in its locator
+FUNCTIONS = {"End": 1, "End.X": 2, "End.DT6": 3, "End.B6.Encaps": 4}
+
+PROBE = struct.Struct("!Qq")  # Sequence number and sending time (CLOCK_MONOTONIC is shared by the namespaces)
+SINK_RCVBUF = 4096
+
+
+def busy_cpu_time():
+    """Return the CPU time (in seconds) spent by all the cores outside of the idle and iowait states"""
+    with open("/proc/stat") as fileobj:
+        values = [int(v) for v in fileobj.readline().split()[1:]]
+    # user, nice, system, irq, softirq and steal
+    busy = values[0] + values[1] + values[2] + values[5] + values[6] + (values[7] if len(values) > 7 else 0)
+    return busy / float(os.sysconf("SC_CLK_TCK"))
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100. * (len(values) - 1))))]
+
+
+def apply_routes(node, routes, delete=False):
+    """Install (or remove) routes on a node, in bulk through netlink if available
+
+    :return: the list of (route, error) that failed"""
+    nl = node_netlink(node)
+    if nl is not None:
+        errors = nl.route.delete_routes(routes) if delete else nl.route.add_routes(routes, replace=True)
+        return [(route, error) for route, error in zip(routes, errors) if error is not None]
+    failed = []
+    for route in routes:
+        out, err, code = node.pexec(["ip", "-6", "route", "del" if delete else "replace"] + ip_route_args(route))
+        if code:
+            failed.append((route, err.strip()))
+    return failed
+
+
+def _flood(pid, address, port, size, duration):
+    """Send UDP packets as fast as possible during duration seconds (in a forked process)"""
+    sock = namespace_socket(pid, 0, family=socket.AF_INET6, sock_type=socket.SOCK_DGRAM)
+    sock.connect((address, port))
+    payload = b"\0" * size
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for _ in range(256):
+            try:
+                sock.send(payload)
+            except OSError as e:
+                if e.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                    raise
+
+
+class SRv6DataPlaneBench:
+    """Measure the forwarding performance of the SRv6 behaviours of the kernel along a path of the network.
+
+       The SIDs of each router of the path are taken in its own locator of sid_block and routed along
+       the path with static routes. A scenario installs the encapsulation route towards the destination
+       host on the ingress router (inline or encap mode) and the local SIDs of the chosen behaviour
+       on the first transit routers. In encap mode, the last segment is an End.DT6 SID of the egress router.
+       With End.B6.Encaps, the ingress only pushes the binding SID of the first transit router
+       whose policy contains the SIDs of the following ones.
+
+       The throughput is measured with UDP flood processes on the source host and the packet counters
+       of the interfaces. The CPU time is the one of all the cores during the flood, divided by the number of
+       received packets, so that it includes the generator. The one-way latency is measured with paced probes
+       timestamped at the sender. Both are compared to plain IPv6 forwarding (the 'ipv6' scenario)."""
+
+    def __init__(self, net, src, dst, sid_block="fc00:5e6::/32", port=9000, size=64, senders=1,
+                 duration=5., probes=1000, probe_rate=1000):
+        """:param net: The started network (with its controller rows, see SRNNet.ovsdb_rows)
+           :param src: The source host (or its name)
+           :param dst: The destination host (or its name)
+           :param sid_block: The prefix of the locators, each router of the path gets a /64
+           :param port: The UDP port of the flood (port + 1 for the probes)
+           :param size: The UDP payload size
+           :param senders: The number of flood processes
+           :param duration: The duration (in seconds) of the flood of each scenario
+           :param probes: The number of latency probes of each scenario
+           :param probe_rate: The number of latency probes per second"""
+        self.net = net
+        self.src = net[src] if isinstance(src, str) else src
+        self.dst = net[dst] if isinstance(dst, str) else dst
+        self.sid_block = ipaddress.ip_network(sid_block)
+        self.port = port
+        self.size = size
+        self.senders = senders
+        self.duration = duration
+        self.probes = probes
+        self.probe_rate = probe_rate
+
+        index = net.address_index
+        self.dst_address = index[self.dst.defaultIntf()].ip6
+        ingress = self._access_router(self.src)
+        egress = self._access_router(self.dst)
+        if not net.ovsdb_rows:
+            raise Exception("The path is computed from the controller rows but the network has no controller")
+        graph = SRGraph.from_rows(net.ovsdb_rows)
+        arcs = graph.shortest_path(ingress.name, egress.name, weight="metric")
+        if arcs is None:
+            raise Exception("No path between %s and %s" % (ingress.name, egress.name))
+        self.path = [net[graph.names[i]] for i in graph.nodes(arcs, graph.index[ingress.name])]
+        self.transit = self.path[1:-1]
+        # Address and interface of the next router of the path for each router of the path
+        self.next_hops = {}
+        for router, arc in zip(self.path, arcs):
+            gateway = graph.dst_addr[arc]
+            intfs = [intf for intf in index.lan(gateway) if intf.node == router]
+            if not intfs:
+                raise Exception("Cannot find the interface of %s towards %s" % (router.name, gateway))
+            self.next_hops[router.name] = (gateway, intfs[0].name)
+        intfs = [intf for intf in index.lan(self.dst_address) if intf.node == egress]
+        self.next_hops[egress.name] = (None, intfs[0].name if intfs else egress.defaultIntf().name)
+        self.results = []
+        self._locator_routes = None
+
+    def _access_router(self, host):
+        for intf in self.net.address_index.lan(self.net.address_index[host.defaultIntf()].ip6):
+            if intf.node != host and intf.node in self.net.routers:
+                return intf.node
+        raise Exception("Cannot find the access router of %s" % host.name)
+
+    def locator(self, router):
+        i = self.path.index(router)
+        return ipaddress.ip_network((int(self.sid_block.network_address) + (i << 64), 64))
+
+    def sid(self, router, behaviour):
+        return str(self.locator(router).network_address + FUNCTIONS[behaviour])
+
+    def _sid_route(self, router, behaviour, segs=None):
+        gateway, oif = self.next_hops[router.name]
+        local = {"action": behaviour}
+        if behaviour == "End.X":
+            local["nh6"] = gateway
+        elif behaviour == "End.DT6":
+            local["table"] = 254
+        elif segs:
+            local["segs"] = segs
+        return {"dst": "%s/128" % self.sid(router, behaviour), "oif": oif, "seg6local": local}
+
+    def install_locators(self):
+        """Route the locators of the routers of the path along the path"""
+        self._locator_routes = {}
+        for i, router in enumerate(self.path[:-1]):
+            gateway, oif = self.next_hops[router.name]
+            routes = [{"dst": self.locator(other).with_prefixlen, "gateway": gateway, "oif": oif}
+                      for other in self.path[i + 1:]]
+            failed = apply_routes(router, routes)
+            if failed:
+                raise Exception("Cannot route the locators on %s: %s" % (router.name, failed[0][1]))
+            self._locator_routes[router] = routes
+
+    def remove_locators(self):
+        for router, routes in (self._locator_routes or {}).items():
+            apply_routes(router, routes, delete=True)
+        self._locator_routes = None
+
+    def scenario_routes(self, behaviour, mode, length):
+        """Return the routes of a scenario as a dict {router: [routes]} and its segment list
+
+        :param behaviour: 'ipv6' (no SRv6), 'End.DT6' (encapsulation and decapsulation only) or
+                          one of BEHAVIOURS
+        :param mode: The seg6 mode of the ingress ('inline' or 'encap')
+        :param length: The number of transit routers running the behaviour"""
+        routes = {}
+        if behaviour == "ipv6":
+            return routes, []
+        egress = self.path[-1]
+        tail = []
+        if mode == "encap":
+            tail = [self.sid(egress, "End.DT6")]
+            routes[egress] = [self._sid_route(egress, "End.DT6")]
+        elif behaviour == "End.DT6":
+            raise Exception("End.DT6 decapsulates and needs the encap mode")
+
+        chained = self.transit[:length]
+        if behaviour == "End.DT6":
+            segs = tail
+        elif behaviour in ("End", "End.X"):
+            segs = [self.sid(r, behaviour) for r in chained] + tail
+            for r in chained:
+                routes.setdefault(r, []).append(self._sid_route(r, behaviour))
+        elif behaviour == "End.B6.Encaps":
+            # The policy of the binding SID steers the packet through the following transit routers
+            # and its outer header is removed by the egress
+            policy = [self.sid(r, "End") for r in chained[1:]] + [self.sid(egress, "End.DT6")]
+            routes.setdefault(chained[0], []).append(self._sid_route(chained[0], behaviour, segs=policy))
+            for r in chained[1:]:
+                routes.setdefault(r, []).append(self._sid_route(r, "End"))
+            if mode != "encap":
+                routes[egress] = [self._sid_route(egress, "End.DT6")]
+            segs = [self.sid(chained[0], behaviour)] + tail
+        else:
+            raise Exception("Unknown SRv6 behaviour %s (available: %s)" % (behaviour, ", ".join(BEHAVIOURS)))
+
+        ingress = self.path[0]
+        gateway, oif = self.next_hops[ingress.name]
+        routes.setdefault(ingress, []).append({"dst": "%s/128" % self.dst_address, "gateway": gateway, "oif": oif,
+                                               "encap": {"mode": mode, "segs": segs}})
+        return routes, segs
+
+    def _link_packets(self, node, intf):
+        nl = node_netlink(node)
+        if nl is not None:
+            return nl.route.link_packets()[intf]
+        out = node.cmd(["cat", "/sys/class/net/%s/statistics/rx_packets" % intf,
+                        "/sys/class/net/%s/statistics/tx_packets" % intf])
+        rx, tx = out.split()
+        return int(rx), int(tx)
+
+    def throughput(self):
+        """Flood the destination and return the dict {'sent', 'received', 'pps', 'loss', 'cpu_per_packet'}"""
+        src_intf = self.src.defaultIntf().name
+        dst_intf = self.dst.defaultIntf().name
+        # Packets are dropped by the full buffer of this socket instead of triggering ICMP errors
+        sink = namespace_socket(self.dst.pid, 0, family=socket.AF_INET6, sock_type=socket.SOCK_DGRAM)
+        sink.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SINK_RCVBUF)
+        sink.bind(("::", self.port))
+        try:
+            _, sent_before = self._link_packets(self.src, src_intf)
+            received_before, _ = self._link_packets(self.dst, dst_intf)
+            cpu_before = busy_cpu_time()
+            start = time.monotonic()
+            pids = []
+            for _ in range(self.senders):
+                pid = os.fork()
+                if pid == 0:
+                    status = 0
+                    try:
+                        _flood(self.src.pid, self.dst_address, self.port, self.size, self.duration)
+                    except BaseException:
+                        status = 1
+                    finally:
+                        os._exit(status)
+                pids.append(pid)
+            for pid in pids:
+                os.waitpid(pid, 0)
+            time.sleep(.1)  # Packets in flight
+            elapsed = time.monotonic() - start
+            cpu = busy_cpu_time() - cpu_before
+            _, sent_after = self._link_packets(self.src, src_intf)
+            received_after, _ = self._link_packets(self.dst, dst_intf)
+        finally:
+            sink.close()
+        sent = sent_after - sent_before
+        received = received_after - received_before
+        return {"sent": sent, "received": received, "pps": received / elapsed,
+                "loss": 1 - received / float(sent) if sent else 0.,
+                "cpu_per_packet": cpu / received if received else None}
+
+    def latency(self):
+        """Send paced probes and return the dict with the one-way latency percentiles (in microseconds)
+           and the number of lost probes"""
+        receiver = namespace_socket(self.dst.pid, 0, family=socket.AF_INET6, sock_type=socket.SOCK_DGRAM)
+        receiver.bind(("::", self.port + 1))
+        receiver.settimeout(.5)
+        sender = namespace_socket(self.src.pid, 0, family=socket.AF_INET6, sock_type=socket.SOCK_DGRAM)
+        sender.connect((self.dst_address, self.port + 1))
+        latencies = []
+
+        def receive():
+            buf = bytearray(max(self.size, PROBE.size))
+            while len(latencies) < self.probes:
+                try:
+                    receiver.recv_into(buf)
+                except socket.timeout:
+                    return
+                latencies.append((time.monotonic_ns() - PROBE.unpack_from(buf)[1]) / 1000.)
+
+        thread = threading.Thread(target=receive, daemon=True)
+        thread.start()
+        padding = b"\0" * max(0, self.size - PROBE.size)
+        interval = 1. / self.probe_rate
+        next_send = time.monotonic()
+        try:
+            for seq in range(self.probes):
+                while time.monotonic() < next_send:
+                    pass
+                sender.send(PROBE.pack(seq, time.monotonic_ns()) + padding)
+                next_send += interval
+            thread.join()
+        finally:
+            sender.close()
+            receiver.close()
+        return {"lost": self.probes - len(latencies), "mean": sum(latencies) / len(latencies) if latencies else None,
+                "p50": percentile(latencies, 50), "p90": percentile(latencies, 90), "p99": percentile(latencies, 99)}
+
+    def run_scenario(self, behaviour, mode=None, length=0):
+        """Install the routes of a scenario, measure it and remove them
+
+        :return: the dict with the scenario, its throughput and its latency"""
+        routes, segs = self.scenario_routes(behaviour, mode, length)
+        try:
+            for router, router_routes in routes.items():
+                failed = apply_routes(router, router_routes)
+                if failed:
+                    raise Exception("Cannot install the routes of %s on %s: %s"
+                                    % (behaviour, router.name, failed[0][1]))
+            result = {"behaviour": behaviour, "mode": mode, "length": length, "segments": len(segs),
+                      "throughput": self.throughput(), "latency": self.latency()}
+        finally:
+            for router, router_routes in routes.items():
+                apply_routes(router, router_routes, delete=True)
+        lg.info("*** %s %s (%d segments): %.0f packets/s, one-way latency %s us\n"
+                % (behaviour, mode or "", len(segs), result["throughput"]["pps"], result["latency"]["p50"]))
+        self.results.append(result)
+        return result
+
+    def run(self, behaviours=BEHAVIOURS, modes=("encap", "inline"), lengths=(1, 2, 4)):
+        """Measure plain IPv6 forwarding, the encapsulation with End.DT6 and every behaviour
+           for each mode and each number of transit routers running it (capped to the transit routers of the path)
+
+        :return: the list of results, each one compared to plain IPv6 forwarding in its 'added' dict"""
+        lengths = sorted(set(min(length, len(self.transit)) for length in lengths if length > 0))
+        if not self.transit:
+            lg.warn("*** The path between %s and %s has no transit router\n" % (self.src.name, self.dst.name))
+            lengths = []
+        self.results = []
+        self.install_locators()
+        try:
+            baseline = self.run_scenario("ipv6")
+            if "encap" in modes:
+                self.run_scenario("End.DT6", "encap")
+            for mode in modes:
+                for behaviour in behaviours:
+                    for length in lengths:
+                        self.run_scenario(behaviour, mode, length)
+        finally:
+            self.remove_locators()
+
+        for result in self.results:
+            throughput = result["throughput"]
+            base_cpu = baseline["throughput"]["cpu_per_packet"]
+            base_latency = baseline["latency"]["p50"]
+            result["added"] = {
+                "pps_ratio": throughput["pps"] / baseline["throughput"]["pps"]
+                if baseline["throughput"]["pps"] else None,
+                "cpu_per_packet": throughput["cpu_per_packet"] - base_cpu
+                if throughput["cpu_per_packet"] is not None and base_cpu is not None else None,
+                "latency": result["latency"]["p50"] - base_latency
+                if result["latency"]["p50"] is not None and base_latency is not None else None}
+        return self.results
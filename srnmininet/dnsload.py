@@ -0,0 +1,333 @@
+"""An open-loop DNS load generator for the SRN DNS proxies.
+
+The client part runs inside the namespace of a host (see 'python -m srnmininet.dnsload --help')
+and sends AAAA queries for <host>.test.sr to a sr-dnsproxy at a fixed (constant) or
+random (poisson) rate. The driver part (DNSLoad) launches one client on each host of
+a SRNNet and aggregates their results."""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import socket
+import struct
+import sys
+import time
+
+CONSTANT = "constant"
+POISSON = "poisson"
+MODES = (CONSTANT, POISSON)
+
+QTYPE_AAAA = 28
+QCLASS_IN = 1
+DNS_HEADER = struct.Struct("!HHHHHH")
+RR_FIXED = struct.Struct("!HHIH")
+QUERY_FIXED = struct.Struct("!HH")
+
+
+class LatencyHistogram:
+    """Log-linear histogram of latencies in microseconds.
+       Each power of two is split in 2^SUB_BITS buckets,
+       so that every recorded value is known with a relative error below 2^-SUB_BITS."""
+    SUB_BITS = 5
+
+    def __init__(self, buckets=None):
+        self.buckets = dict(buckets) if buckets else {}
+        self.count = sum(self.buckets.values())
+
+    def record(self, value_us):
+        value_us = int(value_us)
+        shift = value_us.bit_length() - self.SUB_BITS - 1
+        bucket = value_us if shift <= 0 else ((shift << self.SUB_BITS) + (value_us >> shift))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+
+    @classmethod
+    def bucket_value(cls, bucket):
+        """Return the lowest value of a bucket"""
+        if bucket < (2 << cls.SUB_BITS):
+            return bucket
+        shift = (bucket >> cls.SUB_BITS) - 1
+        return (bucket - (shift << cls.SUB_BITS)) << shift
+
+    def merge(self, other):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+
+    def percentile(self, p):
+        """Return the p-th percentile (0 <= p <= 100) of the recorded latencies"""
+        if self.count == 0:
+            return None
+        rank = p / 100. * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return self.bucket_value(bucket)
+        return self.bucket_value(max(self.buckets))
+
+    def to_dict(self):
+        return {str(bucket): count for bucket, count in self.buckets.items()}
+
+    @classmethod
+    def from_dict(cls, content):
+        return cls({int(bucket): count for bucket, count in content.items()})
+
+
+def encode_name(name):
+    labels = [label.encode() for label in name.rstrip(".").split(".")]
+    return b"".join(struct.pack("!B", len(label)) + label for label in labels) + b"\x00"
+
+
+def skip_name(data, offset):
+    """Return the offset right after the (possibly compressed) domain name starting at offset"""
+    while True:
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xc0 == 0xc0:
+            return offset + 2
+        offset += length + 1
+
+
+def parse_aaaa_answers(data):
+    """Return the IPv6 addresses of the AAAA records in the answer section of a DNS reply"""
+    _, _, qdcount, ancount, _, _ = DNS_HEADER.unpack_from(data)
+    offset = DNS_HEADER.size
+    for _ in range(qdcount):
+        offset = skip_name(data, offset) + QUERY_FIXED.size
+    addresses = []
+    for _ in range(ancount):
+        offset = skip_name(data, offset)
+        rtype, _, _, rdlength = RR_FIXED.unpack_from(data, offset)
+        offset += RR_FIXED.size
+        if rtype == QTYPE_AAAA and rdlength == 16:
+            addresses.append(socket.inet_ntop(socket.AF_INET6, bytes(data[offset:offset + 16])))
+        offset += rdlength
+    return addresses
+
+
+class DNSLoadProtocol(asyncio.DatagramProtocol):
+    """A UDP socket towards the DNS proxy with its own space of query ids"""
+
+    def __init__(self, client):
+        self.client = client
+        self.transport = None
+        self.pending = {}  # {query id: (send time, name)}
+        self.ids = itertools.cycle(range(1 << 16))
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def send(self, name, query):
+        query_id = next(self.ids)
+        if query_id in self.pending:
+            return False  # Every id is in use on this socket
+        self.pending[query_id] = (time.monotonic(), name)
+        self.transport.sendto(struct.pack("!H", query_id) + query)
+        return True
+
+    def datagram_received(self, data, addr):
+        now = time.monotonic()
+        if len(data) < DNS_HEADER.size:
+            return
+        query_id, flags = struct.unpack_from("!HH", data)
+        sent = self.pending.pop(query_id, None)
+        if sent is None:
+            return  # Late answer of a query that already timed out
+        self.client.answered(now - sent[0], flags & 0xf, data)
+
+    def expire(self, deadline):
+        expired = [query_id for query_id, (sent, _) in self.pending.items() if sent < deadline]
+        for query_id in expired:
+            del self.pending[query_id]
+        return len(expired)
+
+
+class DNSLoadClient:
+    """Send AAAA queries to a DNS proxy at a given rate and record the answers"""
+
+    def __init__(self, server, port, names, qps, duration, mode=CONSTANT, timeout=1., sockets=4, seed=None):
+        """:param server: The address of the DNS proxy
+           :param port: The listening port of the DNS proxy
+           :param names: The domain names to query (round robin)
+           :param qps: The target number of queries per second
+           :param duration: The duration (in seconds) of the load
+           :param mode: CONSTANT for fixed inter-query times and POISSON for exponentially distributed ones
+           :param timeout: The number of seconds after which an unanswered query is counted as a timeout
+           :param sockets: The number of sockets on which queries are spread
+           :param seed: The seed of the random inter-query times"""
+        if mode not in MODES:
+            raise ValueError("Unknown load mode %s" % mode)
+        self.server = server
+        self.port = int(port)
+        self.queries = [(name, self.build_query(name)) for name in names]
+        self.qps = float(qps)
+        self.duration = float(duration)
+        self.mode = mode
+        self.timeout = float(timeout)
+        self.n_sockets = sockets
+        self.random = random.Random(seed)
+
+        self.histogram = LatencyHistogram()
+        self.sent = 0
+        self.dropped = 0  # Queries that could not be sent because all the query ids were pending
+        self.timeouts = 0
+        self.errors = {}  # {rcode: count}
+        self.bsids = {}  # {address: count}
+        self.max_lag = 0.  # Maximum difference between the scheduled and the actual sending times
+
+    @staticmethod
+    def build_query(name):
+        """Build the DNS query without its id"""
+        return struct.pack("!HHHHH", 0x0100, 1, 0, 0, 0) + encode_name(name) + QUERY_FIXED.pack(QTYPE_AAAA, QCLASS_IN)
+
+    def answered(self, latency, rcode, data):
+        self.histogram.record(latency * 1000000)
+        if rcode != 0:
+            self.errors[rcode] = self.errors.get(rcode, 0) + 1
+            return
+        try:
+            for address in parse_aaaa_answers(data):
+                self.bsids[address] = self.bsids.get(address, 0) + 1
+        except (IndexError, struct.error):
+            self.errors[-1] = self.errors.get(-1, 0) + 1
+
+    def next_interval(self):
+        if self.mode == POISSON:
+            return self.random.expovariate(self.qps)
+        return 1. / self.qps
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        protocols = []
+        for _ in range(self.n_sockets):
+            _, protocol = await loop.create_datagram_endpoint(lambda: DNSLoadProtocol(self),
+                                                              remote_addr=(self.server, self.port),
+                                                              family=socket.AF_INET6)
+            protocols.append(protocol)
+
+        start = time.monotonic()
+        scheduled = start
+        queries = itertools.cycle(self.queries)
+        sockets = itertools.cycle(protocols)
+        last_expire = start
+        while scheduled - start < self.duration:
+            now = time.monotonic()
+            if scheduled > now:
+                await asyncio.sleep(scheduled - now)
+                now = time.monotonic()
+            # Open loop: send every query that should have been sent by now
+            while scheduled <= now and scheduled - start < self.duration:
+                name, query = next(queries)
+                if next(sockets).send(name, query):
+                    self.sent += 1
+                else:
+                    self.dropped += 1
+                self.max_lag = max(self.max_lag, now - scheduled)
+                scheduled += self.next_interval()
+            if now - last_expire > self.timeout / 4:
+                self.timeouts += sum(p.expire(now - self.timeout) for p in protocols)
+                last_expire = now
+
+        # Wait for the last answers
+        await asyncio.sleep(self.timeout)
+        self.timeouts += sum(p.expire(float("inf")) for p in protocols)
+        for p in protocols:
+            p.transport.close()
+        return self.results(time.monotonic() - start - self.timeout)
+
+    def results(self, elapsed):
+        return {"server": self.server, "mode": self.mode, "qps": self.qps, "elapsed": elapsed,
+                "sent": self.sent, "answered": self.histogram.count, "dropped": self.dropped,
+                "timeouts": self.timeouts, "errors": self.errors, "bsids": self.bsids, "max_lag": self.max_lag,
+                "histogram": self.histogram.to_dict()}
+
+
+class DNSLoad:
+    """Run DNS load clients on several hosts of a network at once"""
+
+    def __init__(self, net, hosts=None, zone="test.sr"):
+        """:param net: The SRNNet
+           :param hosts: The hosts sending queries (all the hosts by default)
+           :param zone: The DNS zone of the SRN domain"""
+        self.net = net
+        self.hosts = list(hosts) if hosts is not None else list(net.hosts)
+        self.zone = zone
+
+    @staticmethod
+    def find_proxy(host):
+        """Return the (address, port) of the DNS proxy on the access router of the host"""
+        # Importing here to be able to run the client without the emulation dependencies
+        from .config import SRDNSProxy
+        from .utils import daemon_in_node
+
+        router = host.defaultIntf().broadcast_domain.routers[0].node
+        proxy = daemon_in_node(router, SRDNSProxy)
+        if proxy is None:
+            raise Exception("Cannot find a SRDNSProxy on the access router of %s" % host.name)
+        return router.intf("lo").ip6, proxy.options.proxy_listen_port
+
+    def run(self, qps, duration, mode=CONSTANT, names=None, timeout=1., sockets=4):
+        """Launch the load on every host and wait for the results
+
+        :param qps: The number of queries per second of each host
+        :param duration: The duration of the load
+        :param mode: CONSTANT or POISSON
+        :param names: The domain names to query (every other host of the zone by default)
+        :param timeout: The query timeout
+        :param sockets: The number of sockets per host
+        :return: the dict {host name: results} and the aggregated results"""
+        processes = {}
+        for host in self.hosts:
+            server, port = self.find_proxy(host)
+            host_names = names if names is not None else \
+                ["%s.%s" % (h.name, self.zone) for h in self.net.hosts if h.name != host.name]
+            cmd = [sys.executable, "-m", "srnmininet.dnsload", "--server", server, "--port", str(port),
+                   "--qps", str(qps), "--duration", str(duration), "--mode", mode, "--timeout", str(timeout),
+                   "--sockets", str(sockets), "--names"] + host_names
+            processes[host.name] = host.popen(cmd)
+
+        results = {}
+        for name, p in processes.items():
+            out, err = p.communicate()
+            if p.returncode:
+                raise Exception("DNS load failed on %s: %s" % (name, err))
+            results[name] = json.loads(out)
+        return results, self.aggregate(results.values())
+
+    @staticmethod
+    def aggregate(results):
+        histogram = LatencyHistogram()
+        total = {"sent": 0, "answered": 0, "dropped": 0, "timeouts": 0, "bsids": {}}
+        for result in results:
+            histogram.merge(LatencyHistogram.from_dict(result["histogram"]))
+            for key in ("sent", "answered", "dropped", "timeouts"):
+                total[key] += result[key]
+            for bsid, count in result["bsids"].items():
+                total["bsids"][bsid] = total["bsids"].get(bsid, 0) + count
+        total["latency_us"] = {p: histogram.percentile(p) for p in (50, 90, 99, 99.9, 100)}
+        total["histogram"] = histogram.to_dict()
+        return total
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Open-loop AAAA query generator for sr-dnsproxy")
+    parser.add_argument('--server', required=True, help='The address of the DNS proxy')
+    parser.add_argument('--port', type=int, default=53, help='The port of the DNS proxy')
+    parser.add_argument('--names', nargs='+', required=True, help='The domain names to query')
+    parser.add_argument('--qps', type=float, default=100., help='The number of queries per second')
+    parser.add_argument('--duration', type=float, default=10., help='The duration of the load in seconds')
+    parser.add_argument('--mode', choices=MODES, default=CONSTANT, help='The distribution of inter-query times')
+    parser.add_argument('--timeout', type=float, default=1., help='The query timeout in seconds')
+    parser.add_argument('--sockets', type=int, default=4, help='The number of sockets to use')
+    parser.add_argument('--seed', type=int, default=None, help='The seed of the poisson process')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    client = DNSLoadClient(args.server, args.port, args.names, args.qps, args.duration, mode=args.mode,
+                           timeout=args.timeout, sockets=args.sockets, seed=args.seed)
+    json.dump(asyncio.run(client.run()), sys.stdout)
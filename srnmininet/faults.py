@@ -0,0 +1,374 @@
+import functools
+import random
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mininet.log import lg
+
+# Time (in seconds) before an event during which the event loop spins instead of sleeping
+SPIN_TIME = .0005
+
+# Event types
+LINK_DOWN = "link_down"
+LINK_UP = "link_up"
+DELAY = "delay"
+BANDWIDTH = "bandwidth"
+CRASH = "crash"
+RESTART = "restart"
+KILL_DAEMON = "kill_daemon"
+
+
+class NamespaceChannel:
+    """A batch process of 'ip' or 'tc' kept open in the network namespace of a node.
+       Each command is a line written on its standard input, so that no process is
+       forked when an event is executed. Errors do not stop the process and are
+       reported when the channel is closed."""
+
+    def __init__(self, node, program):
+        self.node = node
+        self.program = program
+        self.errors = tempfile.TemporaryFile(mode="w+")
+        self._lock = threading.Lock()
+        self.process = node.popen([program, "-force", "-batch", "-"], stdin=subprocess.PIPE,
+                                  stdout=subprocess.DEVNULL, stderr=self.errors)
+
+    def send(self, lines):
+        with self._lock:
+            self.process.stdin.write("".join(line + "\n" for line in lines).encode())
+            self.process.stdin.flush()
+
+    def close(self):
+        """Wait for the pending commands and return the error messages"""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+        self.errors.seek(0)
+        errors = [line.strip() for line in self.errors if line.strip()]
+        self.errors.close()
+        return errors
+
+
+class FaultTimeline:
+    """Inject a timeline of faults in a running network.
+
+       Events are given with an offset (in milliseconds) from the start of the timeline, one by one
+       or drawn from stochastic flap processes. Before running, every event is compiled into
+       'ip' or 'tc' commands for the batch channels of its namespace (see NamespaceChannel),
+       or into a blocking action (node restart, daemon kill or full reconfiguration of an interface)
+       executed, in order, by a worker thread of its node.
+       A single event loop on the monotonic clock then sleeps until each event
+       and spins for its last SPIN_TIME seconds, so that hundreds of events per second
+       are executed within a fraction of a millisecond of their offset.
+
+       The execution time of every event is recorded (see run()). For channel commands, it is the
+       time at which the command was handed to the already running 'ip' or 'tc' process.
+       While a blocking action of a node is running, the next events of this node go through
+       its worker thread too, so that the events of a node are always executed in order."""
+
+    def __init__(self, net, recorder=None):
+        """:param net: The started network
+           :param recorder: The measurement Recorder in which the lag of the events is written (optional)"""
+        self.net = net
+        self.recorder = recorder
+        self.events = []  # List of (offset in ms, sequence number, type, node, interface, parameters)
+        self.results = []
+        self._intfs = None
+
+    def _intf(self, intf):
+        if not isinstance(intf, str):
+            return intf
+        if self._intfs is None:
+            self._intfs = {i.name: i for node in self.net.values() for i in node.intfList()}
+        if intf not in self._intfs:
+            raise Exception("Cannot find the interface %s" % intf)
+        return self._intfs[intf]
+
+    def _node(self, node):
+        return self.net[node] if isinstance(node, str) else node
+
+    def add(self, offset, event, target, **params):
+        """Schedule an event
+
+        :param offset: The time (in milliseconds) of the event from the start of the timeline
+        :param event: The type of event (e.g., LINK_DOWN or DELAY)
+        :param target: The interface (link events) or the node (other events), or its name
+        :param params: The parameters of the event"""
+        if event in (LINK_DOWN, LINK_UP, DELAY, BANDWIDTH):
+            intf = self._intf(target)
+            node = intf.node
+        elif event in (CRASH, RESTART, KILL_DAEMON):
+            intf = None
+            node = self._node(target)
+        else:
+            raise Exception("Unknown fault event %s" % event)
+        self.events.append((float(offset), len(self.events), event, node, intf, params))
+        return self
+
+    def link_down(self, offset, intf):
+        """Bring an interface down (a veth peer loses its carrier)"""
+        return self.add(offset, LINK_DOWN, intf)
+
+    def link_up(self, offset, intf):
+        """Bring an interface up and restore its global IPv6 addresses, removed by the kernel
+           when it went down. The static routes through the interface are not restored."""
+        return self.add(offset, LINK_UP, intf)
+
+    def set_delay(self, offset, intf, delay, jitter=None, loss=None):
+        """Change the netem parameters of an interface
+
+        :param delay: The new delay (e.g., '10ms')
+        :param jitter: The new jitter (unchanged by default)
+        :param loss: The new loss percentage (unchanged by default)"""
+        params = {"delay": delay}
+        if jitter is not None:
+            params["jitter"] = jitter
+        if loss is not None:
+            params["loss"] = loss
+        return self.add(offset, DELAY, intf, **params)
+
+    def set_bandwidth(self, offset, intf, bw):
+        """Change the bandwidth (in Mbps) of an interface"""
+        return self.add(offset, BANDWIDTH, intf, bw=bw)
+
+    def crash(self, offset, node):
+        """Kill every daemon of a node without letting them clean up and bring its interfaces down"""
+        return self.add(offset, CRASH, node)
+
+    def restart(self, offset, node):
+        """Bring the interfaces of a crashed node back up and start its daemons again"""
+        return self.add(offset, RESTART, node)
+
+    def kill_daemon(self, offset, node, daemon, sig=signal.SIGKILL):
+        """Send a signal to the processes of a daemon of a node
+
+        :param daemon: The name of the daemon (e.g., 'sr-routed')
+        :param sig: The signal sent"""
+        return self.add(offset, KILL_DAEMON, node, daemon=daemon, sig=sig)
+
+    def flaps(self, intf, mean_up, mean_down, duration, start=0., seed=None):
+        """Make a link flap with exponentially distributed up and down periods
+
+        :param intf: The interface (or its name) brought down and up
+        :param mean_up: The mean time (in milliseconds) during which the link is up
+        :param mean_down: The mean time (in milliseconds) during which the link is down
+        :param duration: The duration (in milliseconds) of the flap process
+        :param start: The offset (in milliseconds) of the flap process
+        :param seed: The seed of the random generator (for reproducible timelines)
+        :return: the number of link failures scheduled"""
+        rng = random.Random(seed)
+        offset = start + rng.expovariate(1. / mean_up)
+        failures = 0
+        while offset < start + duration:
+            self.link_down(offset, intf)
+            failures += 1
+            # The link is always brought back up at the end of the process
+            offset = min(offset + rng.expovariate(1. / mean_down), start + duration)
+            self.link_up(offset, intf)
+            offset += rng.expovariate(1. / mean_up)
+        return failures
+
+    # Compilation of the events
+
+    @staticmethod
+    def _netem_parent(params):
+        if params.get("bw") is None:
+            return "root"
+        if params.get("use_hfsc") or params.get("use_tbf"):
+            return None
+        return "parent 6:" if params.get("enable_ecn") or params.get("enable_red") else "parent 5:1"
+
+    @staticmethod
+    def _netem_args(params):
+        args = []
+        if params.get("delay") is not None:
+            args.append("delay %s" % params["delay"])
+            if params.get("jitter") is not None:
+                args.append(str(params["jitter"]))
+        if params.get("loss"):
+            args.append("loss %.5f" % params["loss"])
+        if params.get("max_queue_size") is not None:
+            args.append("limit %d" % params["max_queue_size"])
+        return " ".join(args)
+
+    def _compile_tc(self, intf, params, update):
+        """Return the tc commands changing the parameters of an interface in place
+           or None if the queuing disciplines of the interface must be rebuilt"""
+        new_params = dict(params)
+        new_params.update(update)
+        if "bw" in update:
+            if update["bw"] is None or params.get("bw") is None or self._netem_parent(params) is None:
+                return None
+            return ["class change dev %s parent 5:0 classid 5:1 htb rate %fMbit burst 15k" % (intf.name,
+                                                                                              update["bw"])]
+        parent = self._netem_parent(new_params)
+        netem_args = self._netem_args(new_params)
+        if parent is None or not netem_args:
+            return None
+        # Replace creates the netem qdisc if the interface did not have one
+        return ["qdisc replace dev %s %s handle 10: netem %s" % (intf.name, parent, netem_args)]
+
+    def _compile(self):
+        """Return the list of (offset, event, node, interface, params, program, lines, action)
+           where either lines are sent to the channel of the program or action is called"""
+        tc_params = {}
+        compiled = []
+        for offset, _, event, node, intf, params in sorted(self.events):
+            program, lines, action = None, None, None
+            if event == LINK_DOWN:
+                program, lines = "ip", ["link set dev %s down" % intf.name]
+            elif event == LINK_UP:
+                program, lines = "ip", ["link set dev %s up" % intf.name] \
+                    + ["addr replace %s dev %s" % (ip6.with_prefixlen, intf.name)
+                       for ip6 in intf.ip6s(exclude_lls=True)]
+            elif event in (DELAY, BANDWIDTH):
+                current = tc_params.setdefault(intf, intf.tc_params)
+                lines = self._compile_tc(intf, current, params)
+                if lines is not None:
+                    program = "tc"
+                else:
+                    action = (lambda i, p: lambda: i.reconfigure(**p))(intf, dict(params))
+                current.update(params)
+            elif event == CRASH:
+                action = (lambda n: lambda: self._crash(n))(node)
+            elif event == RESTART:
+                action = (lambda n: lambda: self._restart(n))(node)
+            elif event == KILL_DAEMON:
+                action = (lambda n, p: lambda: self._kill_daemon(n, **p))(node, params)
+            compiled.append((offset, event, node, intf, params, program, lines, action))
+        return compiled
+
+    # Blocking actions
+
+    @staticmethod
+    def _signal_daemon(node, daemon, sig):
+        for p in node.daemon_processes(daemon):
+            try:
+                p.send_signal(sig)
+            except Exception as e:  # The process may have exited in-between
+                lg.debug("%s: Cannot signal %s (%s)\n" % (node.name, daemon.NAME, e))
+
+    def _kill_daemon(self, node, daemon, sig=signal.SIGKILL):
+        daemons = [d for d in node.nconfig.daemons if d.NAME == daemon]
+        if not daemons:
+            raise Exception("Cannot find the daemon %s on %s" % (daemon, node.name))
+        for d in daemons:
+            self._signal_daemon(node, d, sig)
+
+    def _crash(self, node):
+        for d in node.nconfig.daemons:
+            self._signal_daemon(node, d, signal.SIGKILL)
+        self._channel(node, "ip").send(["link set dev %s down" % intf.name for intf in node.intfList()
+                                        if intf.name != "lo"])
+
+    def _restart(self, node):
+        lines = []
+        for intf in node.intfList():
+            if intf.name != "lo":
+                lines.append("link set dev %s up" % intf.name)
+                lines.extend("addr replace %s dev %s" % (ip6.with_prefixlen, intf.name)
+                             for ip6 in intf.ip6s(exclude_lls=True))
+        self._channel(node, "ip").send(lines)
+        for d in node.nconfig.daemons:
+            node.start_daemon(d)
+
+    # Event loop
+
+    def _channel(self, node, program):
+        channel = self._channels.get((node.name, program))
+        if channel is None:
+            channel = self._channels[(node.name, program)] = NamespaceChannel(node, program)
+        return channel
+
+    def _worker(self, node):
+        worker = self._workers.get(node.name)
+        if worker is None:
+            # Actions of a node run one after the other in the order of the timeline
+            worker = self._workers[node.name] = ThreadPoolExecutor(max_workers=1)
+        return worker
+
+    def _send(self, node, program, lines, intf, params):
+        self._channel(node, program).send(lines)
+        if program == "tc":
+            intf.update_tc_params(**params)
+
+    def _timed(self, action, result, planned):
+        """Run an event and record the time of its actual execution"""
+        executed = time.monotonic()
+        result["executed"] = self._wall_start + (executed - self._start)
+        result["lag"] = (executed - planned) * 1000.
+        try:
+            action()
+        finally:
+            result["completed"] = self._wall_start + (time.monotonic() - self._start)
+
+    def run(self):
+        """Execute all the events and wait until they are completed
+
+        :return: the list of the executed events as dicts {'offset', 'event', 'node', 'intf', 'params',
+                 'planned', 'executed', 'completed', 'lag', 'error'} where 'planned', 'executed'
+                 and 'completed' are timestamps (as time.time()) and 'lag' is the delay (in milliseconds)
+                 between the planned and the actual execution, measured when the event starts
+                 (e.g., after the blocking actions of its node that were still running)"""
+        compiled = self._compile()
+        self._channels = {}
+        self._workers = {}
+        results = []
+        futures = []
+        try:
+            # Open all the channels before starting the clock
+            for _, _, node, _, _, program, _, _ in compiled:
+                if program is not None:
+                    self._channel(node, program)
+
+            pending = {}  # {node name: last future of its worker}
+            self._start = start = time.monotonic()
+            self._wall_start = wall_start = time.time()
+            for offset, event, node, intf, params, program, lines, action in compiled:
+                planned = start + offset / 1000.
+                remaining = planned - time.monotonic()
+                if remaining > SPIN_TIME:
+                    time.sleep(remaining - SPIN_TIME)
+                while time.monotonic() < planned:
+                    pass
+
+                result = {"offset": offset, "event": event, "node": node.name,
+                          "intf": intf.name if intf is not None else None, "params": params,
+                          "planned": wall_start + offset / 1000., "error": None}
+                if program is not None:
+                    action = functools.partial(self._send, node, program, lines, intf, params)
+                busy = node.name in pending and not pending[node.name].done()
+                if program is not None and not busy:
+                    self._timed(action, result, planned)
+                else:
+                    future = pending[node.name] = self._worker(node).submit(self._timed, action, result, planned)
+                    futures.append((future, result))
+                results.append(result)
+
+            for future, result in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    result["error"] = str(e)
+                    lg.error("Fault %s on %s failed: %s\n" % (result["event"], result["node"], e))
+        finally:
+            for worker in self._workers.values():
+                worker.shutdown()
+            for (name, program), channel in self._channels.items():
+                for error in channel.close():
+                    lg.error("%s: %s: %s\n" % (name, program, error))
+
+        if self.recorder is not None:
+            for result in results:
+                self.recorder.record("fault_lag", result["lag"], node=result["node"],
+                                     timestamp=result["executed"], event=result["event"])
+        self.results = results
+        if results:
+            lg.info("*** %d faults injected (maximum lag %.3f ms)\n"
+                    % (len(results), max(result["lag"] for result in results)))
+        return results
@@ -1,7 +1,12 @@
 from ipmininet.link import IPIntf
 
+from .sysctl import sysctl_manager
+
 
 class SRNIntf(IPIntf):
+    # The parameters of the interface that are enforced by traffic control
+    TC_PARAMS = ("bw", "delay", "jitter", "loss", "max_queue_size", "use_hfsc", "use_tbf", "latency_ms",
+                 "enable_ecn", "enable_red")
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -10,10 +15,35 @@ class SRNIntf(IPIntf):
 
     def config(self, *args, **kwargs):
         r = super().config(*args, **kwargs)
-        self.cmd("sysctl net.ipv4.conf.all.rp_filter=0")
-        self.cmd("sysctl net.ipv4.conf.default.rp_filter=0")
-        self.cmd("sysctl net.ipv4.conf.lo.rp_filter=0")
-        self.cmd("sysctl net.ipv4.conf.{}.rp_filter=0".format(self.name))
+        # Applied with the other sysctls of the node when it starts
+        sysctls = sysctl_manager(self.node)
+        for intf in ("all", "default", "lo", self.name):
+            sysctls.set_intf(intf, "ipv4", "rp_filter", 0)
+        return r
+
+    @property
+    def tc_params(self):
+        """Return the traffic control parameters currently applied to this interface"""
+        return {key: self.params[key] for key in self.TC_PARAMS if key in self.params}
+
+    def update_tc_params(self, **params):
+        """Record new traffic control parameters of this interface without applying them
+           (e.g., when they were applied by tc commands)
+
+        :param params: the traffic control parameters to update (e.g., delay or bw)
+        :return: all the traffic control parameters of the interface"""
+        tc_params = self.tc_params
+        tc_params.update(params)
+        self.params.update(tc_params)
+        self.delay = tc_params.get("delay") or "0ms"
+        self.bw = tc_params.get("bw") or 0
+        return tc_params
+
+    def reconfigure(self, **params):
+        """Change the traffic control parameters of this interface
+
+        :param params: the traffic control parameters to update (e.g., delay or bw)"""
+        self.config(**self.update_tc_params(**params))
 
     def __lt__(self, other):
         return self.name < other.name
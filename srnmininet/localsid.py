@@ -0,0 +1,230 @@
+import errno
+import ipaddress
+import random
+import time
+
+import psutil
+from ipmininet.utils import L3Router, otherIntf, realIntfList
+from mininet.log import lg
+
+from .config import SRRouted
+from .netlink import node_netlink
+from .utils import daemon_in_node
+
+# Offset of the synthetic binding SIDs in the loopback prefix, far from the ones of sr-routed
+BSID_OFFSET = 1 << 40
+# Prefix of the synthetic binding SIDs of the routers without loopback address
+BSID_PREFIX = "fc00:b51d::/48"
+CHUNK_SIZE = 65536
+
+
+def kernel_memory():
+    """Return the memory (in bytes) of the kernel slab caches and per-CPU allocations"""
+    values = {}
+    with open("/proc/meminfo") as fileobj:
+        for line in fileobj:
+            name, value = line.split(":", 1)
+            values[name] = int(value.split()[0]) * 1024
+    return values.get("Slab", 0) + values.get("Percpu", 0)
+
+
+class LocalSIDScaling:
+    """Measure how the local SID table of an access router scales with the number of binding SIDs.
+
+       The table is filled in steps with synthetic binding SIDs taken in the loopback prefix of the router,
+       so that they are reached through the rule of the table as the ones of sr-routed. If the router has
+       no loopback address, they are taken in a dedicated prefix sent to the table by an extra rule.
+       Each binding SID encapsulates the traffic with a segment list made of addresses of other routers
+       (their loopback addresses if any).
+       At each step, the installation rate, the kernel memory, the route lookup time and the state
+       of sr-routed are measured. The lookup time is the one of input route lookups through the rules
+       (as for a packet received from a host) towards random binding SIDs, minus the one of lookups towards
+       the addresses of the other routers, which only hit the main table. Each lookup is a netlink request,
+       so both times include its round trip, which the difference cancels."""
+
+    def __init__(self, net, router=None, segments=2, lookups=10000, sample_time=1., restart_daemon=False, seed=0,
+                 bsid_prefix=BSID_PREFIX):
+        """:param net: The started network
+           :param router: The access router (or its name) running sr-routed (the first one by default)
+           :param segments: The number of segments of each synthetic binding SID
+           :param lookups: The number of route lookups measured at each step
+           :param sample_time: The time (in seconds) during which the CPU usage of sr-routed is sampled
+           :param restart_daemon: Whether sr-routed is restarted at each step to measure its start time
+           :param seed: The seed of the random segment lists and lookups
+           :param bsid_prefix: The prefix of the binding SIDs if the router has no loopback address"""
+        self.net = net
+        if router is None:
+            routers = [r for r in net.routers if daemon_in_node(r, SRRouted) is not None]
+            if not routers:
+                raise Exception("No router runs %s" % SRRouted.NAME)
+            router = routers[0]
+        self.router = net[router] if isinstance(router, str) else router
+        self.daemon = daemon_in_node(self.router, SRRouted)
+        if self.daemon is None or self.daemon.localsid_idx <= 0:
+            raise Exception("%s has no local SID table" % self.router.name)
+        self.nl = node_netlink(self.router)
+        if self.nl is None:
+            raise Exception("%s does not use netlink, which is needed to fill its local SID table in bulk"
+                            % self.router.name)
+        self.segments = segments
+        self.lookups = lookups
+        self.sample_time = sample_time
+        self.restart_daemon = restart_daemon
+        self.rng = random.Random(seed)
+
+        index = net.address_index
+        loopbacks = index.loopbacks(self.router)
+        self.prefix = loopbacks[0].network if loopbacks else ipaddress.ip_network(bsid_prefix)
+        # The rule sending the binding SIDs to the table, if they are not in a prefix of sr-routed
+        self.rule = None if loopbacks else {"dst": self.prefix.with_prefixlen, "table": self.daemon.localsid_idx}
+        self.others = []
+        for r in net.routers:
+            if r != self.router:
+                addresses = index.loopbacks(r) or [ip6 for intf in realIntfList(r) for ip6 in index[intf].globals]
+                self.others.extend(str(ip6.ip) for ip6 in addresses[:1])
+        if not self.others:
+            raise Exception("No other router to build the segment lists")
+        # The interface of the routes of sr-routed (see SRRouted.build())
+        self.oif = realIntfList(self.router)[0].name
+        # The lookups are the ones of packets received from a host (or from a router without host)
+        intfs = realIntfList(self.router)
+        host_intfs = [intf for intf in intfs if not L3Router.is_l3router_intf(otherIntf(intf))]
+        self.iif = (host_intfs or intfs)[0].name
+        self.installed = 0
+        self.results = []
+
+    def bsid(self, i):
+        if BSID_OFFSET + i >= self.prefix.num_addresses:
+            raise Exception("The loopback prefix %s of %s is too small for %d binding SIDs"
+                            % (self.prefix, self.router.name, i + 1))
+        return str(self.prefix.network_address + BSID_OFFSET + i)
+
+    def _routes(self, first, last):
+        return [{"dst": "%s/128" % self.bsid(i), "table": self.daemon.localsid_idx, "oif": self.oif,
+                 "encap": {"mode": "encap", "segs": self.rng.sample(self.others, min(self.segments,
+                                                                                       len(self.others)))}}
+                for i in range(first, last)]
+
+    def fill(self, count):
+        """Add synthetic binding SIDs until the table holds count of them
+
+        :return: the dict with the number of added routes, the failures, the duration and the rate"""
+        added = failed = 0
+        start = time.time()
+        for first in range(self.installed, count, CHUNK_SIZE):
+            routes = self._routes(first, min(count, first + CHUNK_SIZE))
+            errors = self.nl.route.add_routes(routes)
+            failed += len([e for e in errors if e is not None])
+            added += len(routes)
+        duration = time.time() - start
+        if failed:
+            lg.error("*** %d binding SIDs could not be installed on %s\n" % (failed, self.router.name))
+        self.installed = max(self.installed, count)
+        return {"added": added, "failed": failed, "duration": duration,
+                "rate": added / duration if duration > 0 else 0.}
+
+    def clear(self):
+        """Remove the synthetic binding SIDs
+
+        :return: the dict with the number of removed routes, the failures, the duration and the rate"""
+        start = time.time()
+        failed = 0
+        for first in range(0, self.installed, CHUNK_SIZE):
+            last = min(self.installed, first + CHUNK_SIZE)
+            errors = self.nl.route.delete_routes([{"dst": "%s/128" % self.bsid(i), "table": self.daemon.localsid_idx}
+                                                  for i in range(first, last)])
+            # The binding SIDs already flushed (e.g., by a restart of sr-routed) are not failures
+            failed += len([e for e in errors if e is not None and e.code != errno.ESRCH])
+        duration = time.time() - start
+        if failed:
+            lg.error("*** %d binding SIDs could not be removed from %s\n" % (failed, self.router.name))
+        removed = self.installed - failed
+        self.installed = 0
+        return {"removed": removed, "failed": failed, "duration": duration,
+                "rate": removed / duration if duration > 0 else 0.}
+
+    def _timed_lookups(self, addresses):
+        start = time.perf_counter()
+        tables = self.nl.route.lookup_tables(addresses, iif=self.iif)
+        return (time.perf_counter() - start) / len(addresses), tables
+
+    def lookup_latency(self):
+        """Return the dict with the mean time (in seconds) of a lookup request towards a binding SID ('bsid'),
+           of a lookup request in the main table ('main'), of the lookup in the local SID table alone ('added',
+           the difference) and the number of binding SIDs not found in the local SID table"""
+        bsids = [self.bsid(self.rng.randrange(self.installed)) for _ in range(self.lookups)] if self.installed else []
+        baseline = [self.others[i % len(self.others)] for i in range(self.lookups)]
+        base_time, _ = self._timed_lookups(baseline)
+        if not bsids:
+            return {"bsid": None, "main": base_time, "added": None, "missed": 0}
+        bsid_time, tables = self._timed_lookups(bsids)
+        return {"bsid": bsid_time, "main": base_time, "added": bsid_time - base_time,
+                "missed": len([t for t in tables if t != self.daemon.localsid_idx])}
+
+    def daemon_state(self):
+        """Return the dict with the state of sr-routed: whether it runs, its memory, its CPU usage,
+           the time to dump the table and, if enabled, its restart time and the binding SIDs kept after it"""
+        processes = self.router.daemon_processes(self.daemon)
+        state = {"alive": bool(processes), "rss": None, "cpu": None}
+        if processes:
+            try:
+                before = sum(sum(p.cpu_times()[:2]) for p in processes)
+                time.sleep(self.sample_time)
+                state["cpu"] = (sum(sum(p.cpu_times()[:2]) for p in processes) - before) / self.sample_time
+                state["rss"] = sum(p.memory_info().rss for p in processes)
+            except psutil.NoSuchProcess:
+                state["alive"] = False
+
+        start = time.time()
+        entries = len(self.daemon.localsid_routes())
+        state["dump_time"] = time.time() - start
+        state["entries"] = entries
+
+        if self.restart_daemon:
+            start = time.time()
+            self.router.restart_daemon(self.daemon)
+            state["restart_time"] = time.time() - start
+            remaining = set(route["dst"].split("/")[0] for route in self.daemon.localsid_routes())
+            state["kept"] = len([i for i in range(self.installed) if self.bsid(i) in remaining])
+            if state["kept"] < self.installed:
+                # The table was flushed by sr-routed, the next step fills it again from scratch
+                self.clear()
+        return state
+
+    def step(self, count):
+        """Fill the table up to count binding SIDs and measure it"""
+        memory = kernel_memory()
+        install = self.fill(count)
+        memory = kernel_memory() - memory
+        result = {"bsids": count, "install": install,
+                  "kernel_memory": memory, "memory_per_bsid": memory / install["added"] if install["added"] else None,
+                  "lookup": self.lookup_latency(), "daemon": self.daemon_state()}
+        lg.info("*** %s: %d binding SIDs, %.0f routes/s, lookup +%s us, sr-routed %s\n"
+                % (self.router.name, count, install["rate"],
+                   "%.2f" % (result["lookup"]["added"] * 1e6) if result["lookup"]["added"] is not None else "-",
+                   "alive" if result["daemon"]["alive"] else "dead"))
+        self.results.append(result)
+        return result
+
+    def run(self, counts=(1000, 10000, 100000, 1000000)):
+        """Measure the table for increasing numbers of binding SIDs and remove them
+
+        :return: the dict {'router', 'baseline', 'steps', 'clear'}"""
+        self.results = []
+        counts = sorted(set(counts))
+        report = {"router": self.router.name, "baseline": {"lookup": self.lookup_latency(),
+                                                          "daemon": self.daemon_state()}}
+        if self.rule is not None:
+            error = self.nl.route.add_rules([self.rule])[0]
+            if error is not None and error.code != errno.EEXIST:
+                raise Exception("Cannot send %s to the local SID table of %s: %s"
+                                % (self.rule["dst"], self.router.name, error))
+        try:
+            for count in counts:
+                self.step(count)
+        finally:
+            report["clear"] = self.clear()
+            if self.rule is not None:
+                self.nl.route.delete_rules([self.rule])
+        report["steps"] = self.results
+        return report
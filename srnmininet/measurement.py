@@ -0,0 +1,238 @@
+import array
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+# Columns of the recorder with their array typecode and their numpy type
+COLUMNS = (("timestamp", "d", "<f8"), ("node", "i", "<i4"), ("metric", "i", "<i4"),
+           ("value", "d", "<f8"), ("tags", "i", "<i4"))
+HEADER = "header.json"
+PING_RTT = re.compile(r"time[=<]([\d.]+) ?ms")
+
+
+def column_file(path, column):
+    return os.path.join(path, "%s.bin" % column)
+
+
+class Recorder:
+    """Record typed samples (timestamp, node, metric, value, tags) of any probe.
+
+       Samples are buffered in array-backed columns and appended to one binary file
+       per column each time chunk_size samples are buffered, so that long runs use a constant memory.
+       Node names, metric names and tag sets are stored as integer codes whose dictionaries
+       are kept in a JSON header. The directory is read back by Measurements."""
+
+    def __init__(self, path, chunk_size=65536):
+        """:param path: The directory of the measurements (created if needed, appended to if it exists)
+           :param chunk_size: The number of samples buffered before being written"""
+        self.path = path
+        self.chunk_size = chunk_size
+        self.columns = {name: array.array(typecode) for name, typecode, _ in COLUMNS}
+        self.flushed = 0
+        self._lock = threading.Lock()
+
+        self.nodes = []
+        self.metrics = []
+        self.tag_sets = []
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, HEADER)):
+            with open(os.path.join(path, HEADER)) as fileobj:
+                header = json.load(fileobj)
+            self.nodes = header["nodes"]
+            self.metrics = header["metrics"]
+            self.tag_sets = header["tags"]
+            self.flushed = header["count"]
+        for name, _, dtype in COLUMNS:
+            # Drop the samples written after the last header update (e.g., by a crashed run)
+            if os.path.exists(column_file(path, name)):
+                os.truncate(column_file(path, name), self.flushed * np.dtype(dtype).itemsize)
+        self._codes = {"node": {name: i for i, name in enumerate(self.nodes)},
+                       "metric": {name: i for i, name in enumerate(self.metrics)},
+                       "tags": {self._tags_key(tags): i for i, tags in enumerate(self.tag_sets)}}
+
+    @staticmethod
+    def _tags_key(tags):
+        return tuple(sorted((str(key), str(value)) for key, value in tags.items()))
+
+    def _code(self, kind, key, value, values):
+        codes = self._codes[kind]
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(values)
+            values.append(value)
+        return code
+
+    def record(self, metric, value, node=None, timestamp=None, **tags):
+        """Record a sample
+
+        :param metric: The name of the measured metric (e.g., 'rtt')
+        :param value: The measured value
+        :param node: The name of the node (or the node) where the value was measured
+        :param timestamp: The time of the measurement (the current time by default)
+        :param tags: The parameters of the experiment (e.g., link_delay='1ms')"""
+        self.extend(metric, [value], node=node, timestamps=None if timestamp is None else [timestamp], **tags)
+
+    def extend(self, metric, values, node=None, timestamps=None, **tags):
+        """Record several samples of the same metric, node and tags
+
+        :param values: The measured values
+        :param timestamps: The times of the measurements (the current time for all of them by default)"""
+        node = getattr(node, "name", node)
+        node = "" if node is None else str(node)
+        tags = {str(key): str(value) for key, value in tags.items()}
+        with self._lock:
+            start = len(self.columns["value"])
+            self.columns["value"].frombytes(np.asarray(values, dtype=np.float64).tobytes())
+            count = len(self.columns["value"]) - start
+            if timestamps is None:
+                self.columns["timestamp"].extend([time.time()] * count)
+            else:
+                self.columns["timestamp"].frombytes(np.asarray(timestamps, dtype=np.float64).tobytes())
+            self.columns["node"].extend([self._code("node", node, node, self.nodes)] * count)
+            self.columns["metric"].extend([self._code("metric", metric, metric, self.metrics)] * count)
+            self.columns["tags"].extend([self._code("tags", self._tags_key(tags), tags, self.tag_sets)] * count)
+            if len(self.columns["value"]) >= self.chunk_size:
+                self._flush()
+
+    def _flush(self):
+        count = len(self.columns["value"])
+        if count:
+            for name, _, dtype in COLUMNS:
+                with open(column_file(self.path, name), "ab") as fileobj:
+                    np.frombuffer(self.columns[name], dtype=self.columns[name].typecode).astype(dtype) \
+                        .tofile(fileobj)
+                self.columns[name] = array.array(self.columns[name].typecode)
+            self.flushed += count
+        header = {"columns": [[name, dtype] for name, _, dtype in COLUMNS], "count": self.flushed,
+                  "nodes": self.nodes, "metrics": self.metrics, "tags": self.tag_sets}
+        with open(os.path.join(self.path, HEADER + ".tmp"), "w") as fileobj:
+            json.dump(header, fileobj)
+        os.replace(os.path.join(self.path, HEADER + ".tmp"), os.path.join(self.path, HEADER))
+
+    def flush(self):
+        """Write the buffered samples"""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.flushed + len(self.columns["value"])
+
+
+class Measurements:
+    """The samples written by a Recorder, memory-mapped in numpy arrays"""
+
+    def __init__(self, path):
+        """:param path: The directory of the measurements"""
+        with open(os.path.join(path, HEADER)) as fileobj:
+            header = json.load(fileobj)
+        self.nodes = header["nodes"]
+        self.metrics = header["metrics"]
+        self.tag_sets = header["tags"]
+        self.count = header["count"]  # Samples written after the last header update are ignored
+        self.columns = {}
+        for name, dtype in header["columns"]:
+            if self.count == 0:
+                self.columns[name] = np.empty(0, dtype=dtype)
+            else:
+                self.columns[name] = np.memmap(column_file(path, name), dtype=dtype, mode="r", shape=(self.count,))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def codes(self, key):
+        """Return the integer code of a node or of a tag for every sample and the labels of the codes"""
+        if key == "node":
+            return self.columns["node"], list(self.nodes)
+        if key == "metric":
+            return self.columns["metric"], list(self.metrics)
+        labels = sorted({tags.get(key, "") for tags in self.tag_sets})
+        index = {label: i for i, label in enumerate(labels)}
+        lookup = np.array([index[tags.get(key, "")] for tags in self.tag_sets], dtype=np.intp)
+        return lookup[self.columns["tags"]], labels
+
+    def select(self, metric=None, node=None, since=None, until=None, **tags):
+        """Return the boolean mask of the samples matching every given criterion"""
+        mask = np.ones(self.count, dtype=bool)
+        if metric is not None:
+            if metric not in self.metrics:
+                return np.zeros(self.count, dtype=bool)
+            mask &= self.columns["metric"] == self.metrics.index(metric)
+        if node is not None:
+            node = getattr(node, "name", node)
+            if node not in self.nodes:
+                return np.zeros(self.count, dtype=bool)
+            mask &= self.columns["node"] == self.nodes.index(node)
+        if since is not None:
+            mask &= self.columns["timestamp"] >= since
+        if until is not None:
+            mask &= self.columns["timestamp"] < until
+        if tags:
+            matching = np.array([all(t.get(key) == str(value) for key, value in tags.items())
+                                 for t in self.tag_sets] + [False], dtype=bool)
+            mask &= matching[self.columns["tags"]]
+        return mask
+
+    def values(self, metric=None, node=None, **criteria):
+        return np.asarray(self.columns["value"][self.select(metric=metric, node=node, **criteria)])
+
+    def summary(self, metric, by=(), percentiles=(50, 90, 99), **criteria):
+        """Summarize the values of a metric for each parameter point
+
+        :param metric: The name of the metric
+        :param by: The keys of the parameter points ('node' or tag names)
+        :param percentiles: The percentiles to compute (linear interpolation as numpy.percentile)
+        :param criteria: Other selection criteria (see select())
+        :return: the dict {tuple of the values of the keys: {'count', 'mean', 'min', 'max', 'p<percentile>'}}"""
+        mask = self.select(metric=metric, **criteria)
+        values = np.asarray(self.columns["value"][mask])
+        if values.size == 0:
+            return {}
+        if by:
+            codes, labels = zip(*[self.codes(key) for key in by])
+            point_ids = np.ravel_multi_index([np.asarray(c)[mask] for c in codes],
+                                             [max(1, len(label)) for label in labels])
+            point_ids, groups = np.unique(point_ids, return_inverse=True)
+            groups = groups.reshape(-1)
+            points = [tuple(label[i] for label, i in zip(labels, index))
+                      for index in zip(*np.unravel_index(point_ids, [max(1, len(label)) for label in labels]))]
+        else:
+            points, groups = [()], np.zeros(values.size, dtype=np.intp)
+
+        # Sort the values of each group to compute all the percentiles at once
+        order = np.lexsort((values, groups))
+        values = values[order]
+        counts = np.bincount(groups, minlength=len(points))
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        stats = {"count": counts,
+                 "mean": np.add.reduceat(values, starts) / counts,
+                 "min": values[starts],
+                 "max": values[starts + counts - 1]}
+        for q in percentiles:
+            position = starts + (counts - 1) * q / 100.
+            low = np.floor(position).astype(np.intp)
+            high = np.minimum(low + 1, starts + counts - 1)
+            stats["p%g" % q] = values[low] + (values[high] - values[low]) * (position - low)
+
+        return {point: {name: stat[i].item() for name, stat in stats.items()}
+                for i, point in enumerate(points)}
+
+
+def ping_rtts(output):
+    """Return the list of round-trip times (in milliseconds) in the output of ping or ping6"""
+    return [float(rtt) for rtt in PING_RTT.findall(output)]
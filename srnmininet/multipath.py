@@ -0,0 +1,113 @@
+import functools
+import math
+
+from ipmininet.utils import L3Router, realIntfList
+
+# Range of the weights of the nexthops of a multipath route in the Linux kernel
+MIN_WEIGHT = 1
+MAX_WEIGHT = 256
+
+UNLIMITED = float("inf")
+
+
+def scale_weights(capacities, max_weight=MAX_WEIGHT):
+    """Scale the capacities of the branches of a multipath route into nexthop weights.
+       Weights are proportional to the capacities and stay in [MIN_WEIGHT, max_weight].
+       Unlimited branches are weighted as the largest limited one
+       (and all the weights are equal if no branch is limited).
+
+    :param capacities: The list of capacities (UNLIMITED if unknown)
+    :return: The list of weights"""
+    finite = [c for c in capacities if c != UNLIMITED and c > 0]
+    if not finite:
+        return [MIN_WEIGHT] * len(capacities)
+    largest = max(finite)
+    weights = [max(MIN_WEIGHT, int(round(min(c, largest) * max_weight / largest))) for c in capacities]
+
+    # Keep the smallest weights possible so that equal capacities lead to plain ECMP routes
+    divisor = functools.reduce(math.gcd, weights)
+    return [w // divisor for w in weights]
+
+
+def intf_capacity(intf):
+    bw = getattr(intf, "bw", 0)
+    return bw if bw else UNLIMITED
+
+
+class WeightedMultipath:
+    """Compute loop-free multipath routes whose nexthops are weighted
+       by the bottleneck bandwidth of their branch.
+
+       A branch of a router towards a destination is a neighboring router on the shortest path
+       or, with a tolerance, on a path whose cost is at most (1 + tolerance) times the shortest one.
+       Only neighbors strictly closer to the destination are used so that the routes are loop-free.
+       The capacity of a branch is the minimum between the bandwidth of the outgoing interface
+       and the capacity of the neighbor towards the destination (i.e., the sum of the capacities of its branches).
+    """
+
+    def __init__(self, paths, tolerance=0.):
+        """:param paths: The dict {router name: (lans, loopbacks)} as returned by find_closest_paths()
+           :param tolerance: The maximum relative cost increase of the paths used in addition to the shortest ones"""
+        self.paths = paths
+        self.tolerance = tolerance
+        self._branches = {}
+        self._capacities = {}
+
+    def distance(self, node, dest):
+        """Return the cost of the shortest path from the node to the destination
+           (a frozenset of LAN interfaces or the name of a router), or None if unreachable"""
+        if dest == node.name:
+            return 0
+        lans, loopbacks = self.paths[node.name]
+        routes = loopbacks.get(dest) if isinstance(dest, str) else lans.get(dest)
+        return routes[0][0] if routes else None
+
+    @staticmethod
+    def is_attached(node, dest):
+        if isinstance(dest, str):
+            return dest == node.name
+        return any(intf.node.name == node.name for intf in dest)
+
+    def branches(self, node, dest):
+        """Return the list of (cost, outgoing interface, neighbor interface) to reach the destination from the node"""
+        key = (node.name, dest)
+        if key in self._branches:
+            return self._branches[key]
+
+        branches = []
+        distance = self.distance(node, dest)
+        if distance is not None and not self.is_attached(node, dest):
+            for intf in realIntfList(node):
+                for peer_intf in intf.broadcast_domain:
+                    if peer_intf.node.name == node.name or not L3Router.is_l3router_intf(peer_intf) \
+                            or peer_intf.node.name not in self.paths:
+                        continue
+                    peer_distance = self.distance(peer_intf.node, dest)
+                    if peer_distance is None:
+                        continue
+                    cost = intf.igp_metric + peer_distance
+                    if peer_distance < distance and cost <= distance * (1 + self.tolerance):
+                        branches.append((cost, intf, peer_intf))
+        self._branches[key] = branches
+        return branches
+
+    def capacity(self, node, dest):
+        """Return the capacity of the node towards the destination"""
+        if self.is_attached(node, dest):
+            return UNLIMITED
+        key = (node.name, dest)
+        if key not in self._capacities:
+            self._capacities[key] = sum(self.branch_capacity(intf, peer_intf, dest)
+                                        for _, intf, peer_intf in self.branches(node, dest))
+        return self._capacities[key]
+
+    def branch_capacity(self, intf, peer_intf, dest):
+        return min(intf_capacity(intf), self.capacity(peer_intf.node, dest))
+
+    def nexthops(self, node, dest, max_weight=MAX_WEIGHT):
+        """Return the list of (cost, neighbor interface, weight) of the multipath route
+           from the node to the destination"""
+        branches = self.branches(node, dest)
+        weights = scale_weights([self.branch_capacity(intf, peer_intf, dest) for _, intf, peer_intf in branches],
+                                max_weight=max_weight)
+        return [(cost, peer_intf, weight) for (cost, _, peer_intf), weight in zip(branches, weights)]
@@ -0,0 +1,689 @@
+"""A minimal rtnetlink client to manage routes, rules and SRv6 settings of a node
+without spawning 'ip' processes.
+
+Sockets are opened inside the network namespace of the node (through setns on its PID)
+and messages are sent in batches, each of them being acknowledged by the kernel."""
+import ctypes
+import errno
+import ipaddress
+import os
+import socket
+import struct
+import threading
+
+from mininet.log import lg
+
+NETLINK_ROUTE = 0
+NETLINK_GENERIC = 16
+CLONE_NEWNET = 0x40000000
+
+# Message types
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+GENL_ID_CTRL = 16
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+RTM_NEWRULE = 32
+RTM_DELRULE = 33
+RTM_GETQDISC = 38
+RTM_GETTCLASS = 42
+
+# Flags
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+# Route attributes
+RTA_DST = 1
+RTA_IIF = 3
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_MULTIPATH = 9
+RTA_TABLE = 15
+RTA_ENCAP_TYPE = 21
+RTA_ENCAP = 22
+
+RTN_UNSPEC = 0
+RTN_UNICAST = 1
+RTPROT_UNSPEC = 0
+RTPROT_STATIC = 4
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_LINK = 253
+RT_SCOPE_NOWHERE = 255
+RT_TABLE_UNSPEC = 0
+RT_TABLE_MAIN = 254
+
+IFF_UP = 0x1
+IFLA_IFNAME = 3
+IFLA_OPERSTATE = 16
+IFLA_STATS64 = 23
+OPERSTATES = ["UNKNOWN", "NOTPRESENT", "DOWN", "LOWERLAYERDOWN", "TESTING", "DORMANT", "UP"]
+
+IFA_ADDRESS = 1
+IFA_FLAGS = 8
+IFA_F_DADFAILED = 0x08
+IFA_F_TENTATIVE = 0x40
+
+TCA_KIND = 1
+TCA_OPTIONS = 2
+
+FRA_DST = 1
+FRA_PRIORITY = 6
+FRA_TABLE = 15
+FR_ACT_TO_TBL = 1
+
+LWTUNNEL_ENCAP_SEG6 = 5
+SEG6_IPTUNNEL_SRH = 1
+SEG6_MODES = {"inline": 0, "encap": 1, "l2encap": 2}
+LWTUNNEL_ENCAP_SEG6_LOCAL = 7
+SEG6_LOCAL_ACTION = 1
+SEG6_LOCAL_SRH = 2
+SEG6_LOCAL_TABLE = 3
+SEG6_LOCAL_NH6 = 5
+SEG6_LOCAL_ACTIONS = {"End": 1, "End.X": 2, "End.T": 3, "End.DX2": 4, "End.DX6": 5, "End.DX4": 6,
+                      "End.DT6": 7, "End.DT4": 8, "End.B6": 9, "End.B6.Encaps": 10}
+IPPROTO_ROUTING = 43
+SRH_TYPE = 4
+
+# Generic netlink
+CTRL_CMD_GETFAMILY = 3
+CTRL_ATTR_FAMILY_ID = 1
+CTRL_ATTR_FAMILY_NAME = 2
+SEG6_GENL_NAME = "SEG6"
+SEG6_GENL_VERSION = 1
+SEG6_CMD_SET_TUNSRC = 3
+SEG6_ATTR_DST = 1
+
+NLMSGHDR = struct.Struct("=IHHII")
+RTATTR = struct.Struct("=HH")
+RTMSG = struct.Struct("=BBBBBBBBI")
+RTNEXTHOP = struct.Struct("=HBBi")
+IFINFOMSG = struct.Struct("=BxHiII")
+IFADDRMSG = struct.Struct("=BBBBI")
+TCMSG = struct.Struct("=BxxxiIII")
+LINK_STATS64 = struct.Struct("=QQQQ")  # rx_packets, tx_packets, rx_bytes and tx_bytes
+FIB_RULE_HDR = struct.Struct("=BBBBBBBBI")
+GENLMSGHDR = struct.Struct("=BBH")
+NLMSGERR = struct.Struct("=i")
+
+# Number of messages sent before reading their acknowledgements
+BATCH_SIZE = 128
+
+
+class NetlinkError(Exception):
+
+    def __init__(self, code, message=None):
+        self.code = code
+        super().__init__("%s%s" % (os.strerror(code), (" (%s)" % message) if message else ""))
+
+
+def align(length):
+    return (length + 3) & ~3
+
+
+def rtattr(attr_type, payload):
+    data = RTATTR.pack(RTATTR.size + len(payload), attr_type) + payload
+    return data + b"\0" * (align(len(data)) - len(data))
+
+
+def parse_attrs(data, offset=0):
+    """Return the dict {attribute type: payload} of a buffer of attributes"""
+    attrs = {}
+    while offset + RTATTR.size <= len(data):
+        length, attr_type = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attrs[attr_type & 0x3fff] = data[offset + RTATTR.size:offset + length]
+        offset += align(length)
+    return attrs
+
+
+def srh(segments, mode):
+    """Build the IPv6 segment routing header as 'ip -6 route ... encap seg6' does,
+       i.e., with the segments in reverse order and an empty slot for the destination in inline mode"""
+    segments = [ipaddress.ip_address(s).packed for s in segments]
+    if mode == SEG6_MODES["inline"]:
+        segments = [b"\0" * 16] + list(reversed(segments))
+    else:
+        segments = list(reversed(segments))
+    header = struct.pack("=BBBBBBH", 0, 2 * len(segments), SRH_TYPE, len(segments) - 1, len(segments) - 1, 0, 0)
+    return header + b"".join(segments)
+
+
+def parse_srh(data):
+    """Return the list of segments (in the order of traversal) of a segment routing header"""
+    first_segment = data[4]
+    segments = [str(ipaddress.ip_address(bytes(data[8 + 16 * i:24 + 16 * i])))
+                for i in range(first_segment + 1)]
+    return list(reversed(segments))
+
+
+def setns(fd):
+    if hasattr(os, "setns"):
+        os.setns(fd, CLONE_NEWNET)
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.setns(fd, CLONE_NEWNET) != 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+
+
+def namespace_socket(pid, protocol, family=socket.AF_NETLINK, sock_type=socket.SOCK_RAW):
+    """Open a socket (a netlink socket by default) inside the network namespace of a process.
+       The calling thread enters the namespace only for the creation of the socket."""
+    if pid is None:
+        return socket.socket(family, sock_type, protocol)
+    own_ns = os.open("/proc/thread-self/ns/net", os.O_RDONLY)
+    target_ns = os.open("/proc/%d/ns/net" % pid, os.O_RDONLY)
+    try:
+        setns(target_ns)
+        try:
+            return socket.socket(family, sock_type, protocol)
+        finally:
+            setns(own_ns)
+    finally:
+        os.close(target_ns)
+        os.close(own_ns)
+
+
+class NetlinkSocket:
+
+    def __init__(self, pid=None, protocol=NETLINK_ROUTE, rcvbuf=1 << 22):
+        """:param pid: The process whose network namespace is used (the current one by default)
+           :param protocol: The netlink protocol
+           :param rcvbuf: The size of the reception buffer"""
+        self.sock = namespace_socket(pid, protocol)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self.sock.bind((0, 0))
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.sock.close()
+
+    def _message(self, msg_type, flags, payload):
+        self.seq += 1
+        return self.seq, NLMSGHDR.pack(NLMSGHDR.size + len(payload), msg_type, flags, self.seq, 0) + payload
+
+    def _messages(self):
+        """Yield the (type, flags, seq, payload) of the received messages"""
+        while True:
+            data = self.sock.recv(1 << 20)
+            offset = 0
+            while offset + NLMSGHDR.size <= len(data):
+                length, msg_type, flags, seq, _ = NLMSGHDR.unpack_from(data, offset)
+                yield msg_type, flags, seq, memoryview(data)[offset + NLMSGHDR.size:offset + length]
+                offset += align(length)
+
+    def request(self, messages):
+        """Send the messages in batches with an acknowledgement requested for each of them
+
+        :param messages: a list of (message type, flags, payload)
+        :return: the list of errors (None for success) in the same order as the messages"""
+        errors = []
+        with self.lock:
+            for i in range(0, len(messages), BATCH_SIZE):
+                sent = {}
+                data = b""
+                for j, (msg_type, flags, payload) in enumerate(messages[i:i + BATCH_SIZE]):
+                    seq, message = self._message(msg_type, flags | NLM_F_REQUEST | NLM_F_ACK, payload)
+                    sent[seq] = i + j
+                    data += message
+                    errors.append(None)
+                self.sock.sendall(data)
+                for msg_type, _, seq, payload in self._messages():
+                    if msg_type == NLMSG_ERROR and seq in sent:
+                        code = -NLMSGERR.unpack_from(payload)[0]
+                        if code:
+                            errors[sent[seq]] = NetlinkError(code)
+                        del sent[seq]
+                        if not sent:
+                            break
+        return errors
+
+    def dump(self, msg_type, payload):
+        """Send a dump request and return the payloads of the replies"""
+        replies = []
+        with self.lock:
+            seq, message = self._message(msg_type, NLM_F_REQUEST | NLM_F_DUMP, payload)
+            self.sock.sendall(message)
+            for reply_type, _, reply_seq, reply in self._messages():
+                if reply_seq != seq:
+                    continue
+                if reply_type == NLMSG_DONE:
+                    break
+                if reply_type == NLMSG_ERROR:
+                    code = -NLMSGERR.unpack_from(reply)[0]
+                    if code:
+                        raise NetlinkError(code)
+                    break
+                replies.append((reply_type, bytes(reply)))
+        return replies
+
+
+class RTNetlink(NetlinkSocket):
+    """Routes, rules and links of a network namespace.
+       A route is a dict with the following keys (all optional except dst):
+       dst (prefix), gateway, oif (interface name), metric, table (id),
+       nexthops (list of dicts with gateway, oif and weight), encap
+       (dict with the seg6 mode and the list of segs) and seg6local (dict with the SRv6 action
+       and its parameters: nh6, table or the segs of the End.B6 and End.B6.Encaps policies)."""
+
+    def __init__(self, pid=None, **kwargs):
+        super().__init__(pid=pid, protocol=NETLINK_ROUTE, **kwargs)
+        self._links = None
+
+    # Links
+
+    def links(self, refresh=False):
+        """Return the dict {interface name: index}"""
+        if self._links is None or refresh:
+            self._links = {}
+            for _, payload in self.dump(RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+                _, _, index, _, _ = IFINFOMSG.unpack_from(payload)
+                name = parse_attrs(payload, IFINFOMSG.size).get(IFLA_IFNAME)
+                if name is not None:
+                    self._links[bytes(name).rstrip(b"\0").decode()] = index
+        return self._links
+
+    def link_stats(self):
+        """Return the dict {interface name: (received bytes, transmitted bytes)}"""
+        stats = {}
+        for _, payload in self.dump(RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            attrs = parse_attrs(payload, IFINFOMSG.size)
+            name = attrs.get(IFLA_IFNAME)
+            counters = attrs.get(IFLA_STATS64)
+            if name is not None and counters is not None:
+                _, _, rx_bytes, tx_bytes = LINK_STATS64.unpack_from(counters)
+                stats[bytes(name).rstrip(b"\0").decode()] = (rx_bytes, tx_bytes)
+        return stats
+
+    def link_packets(self):
+        """Return the dict {interface name: (received packets, transmitted packets)}"""
+        stats = {}
+        for _, payload in self.dump(RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            attrs = parse_attrs(payload, IFINFOMSG.size)
+            name = attrs.get(IFLA_IFNAME)
+            counters = attrs.get(IFLA_STATS64)
+            if name is not None and counters is not None:
+                rx_packets, tx_packets, _, _ = LINK_STATS64.unpack_from(counters)
+                stats[bytes(name).rstrip(b"\0").decode()] = (rx_packets, tx_packets)
+        return stats
+
+    def link_states(self):
+        """Return the dict {interface name: (whether it is administratively up, operational state)}
+           (as the flags and the state of 'ip link show')"""
+        states = {}
+        for _, payload in self.dump(RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            _, _, _, flags, _ = IFINFOMSG.unpack_from(payload)
+            attrs = parse_attrs(payload, IFINFOMSG.size)
+            name = attrs.get(IFLA_IFNAME)
+            if name is not None:
+                operstate = attrs[IFLA_OPERSTATE][0] if IFLA_OPERSTATE in attrs else 0
+                states[bytes(name).rstrip(b"\0").decode()] = \
+                    (bool(flags & IFF_UP), OPERSTATES[operstate] if operstate < len(OPERSTATES) else str(operstate))
+        return states
+
+    # Traffic control
+
+    def traffic_control(self):
+        """Return the dict {interface name: sorted list of (object, kind, handle, parent, options)}
+           of the queuing disciplines and of the classes of the interfaces (as 'tc qdisc show' and 'tc class show').
+           The options are the hexadecimal dump of their attribute, except for htb qdiscs
+           whose options include a packet counter."""
+        names = {index: name for name, index in self.links(refresh=True).items()}
+        # Classes are only dumped interface by interface
+        requests = [("qdisc", RTM_GETQDISC, 0)] + [("class", RTM_GETTCLASS, index) for index in sorted(names)]
+        objects = {}
+        for obj, msg_type, ifindex in requests:
+            for _, payload in self.dump(msg_type, TCMSG.pack(socket.AF_UNSPEC, ifindex, 0, 0, 0)):
+                _, index, handle, parent, _ = TCMSG.unpack_from(payload)
+                attrs = parse_attrs(payload, TCMSG.size)
+                kind = bytes(attrs.get(TCA_KIND, b"")).rstrip(b"\0").decode()
+                options = "" if obj == "qdisc" and kind == "htb" else bytes(attrs.get(TCA_OPTIONS, b"")).hex()
+                objects.setdefault(names.get(index, str(index)), []).append(
+                    (obj, kind, "%x:%x" % (handle >> 16, handle & 0xffff), "%x:%x" % (parent >> 16, parent & 0xffff),
+                     options))
+        return {name: sorted(entries) for name, entries in objects.items()}
+
+    # Addresses
+
+    def tentative_addresses(self, family=socket.AF_INET6):
+        """Return the list of (address, whether it failed the duplicate address detection)
+           of the addresses whose duplicate address detection is not over (as 'ip addr show tentative')"""
+        addresses = []
+        for _, payload in self.dump(RTM_GETADDR, IFADDRMSG.pack(family, 0, 0, 0, 0)):
+            _, _, flags, _, _ = IFADDRMSG.unpack_from(payload)
+            attrs = parse_attrs(payload, IFADDRMSG.size)
+            if IFA_FLAGS in attrs:
+                flags = struct.unpack("=I", attrs[IFA_FLAGS])[0]
+            if flags & IFA_F_TENTATIVE and IFA_ADDRESS in attrs:
+                addresses.append((str(ipaddress.ip_address(bytes(attrs[IFA_ADDRESS]))),
+                                  bool(flags & IFA_F_DADFAILED)))
+        return addresses
+
+    def link_index(self, name):
+        index = self.links().get(name)
+        if index is None:
+            index = self.links(refresh=True).get(name)
+        if index is None:
+            raise NetlinkError(errno.ENODEV, name)
+        return index
+
+    # Routes
+
+    def _route_payload(self, route, delete=False):
+        dst = ipaddress.ip_network(route["dst"], strict=False)
+        family = socket.AF_INET6 if dst.version == 6 else socket.AF_INET
+        table = int(route.get("table", RT_TABLE_MAIN))
+        attrs = rtattr(RTA_DST, dst.network_address.packed) + rtattr(RTA_TABLE, struct.pack("=I", table))
+        scope = RT_SCOPE_UNIVERSE
+        if route.get("gateway"):
+            attrs += rtattr(RTA_GATEWAY, ipaddress.ip_address(route["gateway"]).packed)
+        elif route.get("oif") and not route.get("nexthops") and family == socket.AF_INET:
+            scope = RT_SCOPE_LINK
+        if route.get("oif"):
+            attrs += rtattr(RTA_OIF, struct.pack("=i", self.link_index(route["oif"])))
+        if route.get("metric") is not None:
+            attrs += rtattr(RTA_PRIORITY, struct.pack("=I", int(route["metric"])))
+        if route.get("nexthops"):
+            nexthops = b""
+            for nh in route["nexthops"]:
+                nh_attrs = rtattr(RTA_GATEWAY, ipaddress.ip_address(nh["gateway"]).packed) \
+                    if nh.get("gateway") else b""
+                ifindex = self.link_index(nh["oif"]) if nh.get("oif") else 0
+                nexthops += RTNEXTHOP.pack(RTNEXTHOP.size + len(nh_attrs), 0, int(nh.get("weight", 1)) - 1,
+                                           ifindex) + nh_attrs
+            attrs += rtattr(RTA_MULTIPATH, nexthops)
+        if route.get("encap"):
+            mode = SEG6_MODES[route["encap"].get("mode", "encap")]
+            encap = rtattr(SEG6_IPTUNNEL_SRH, struct.pack("=i", mode) + srh(route["encap"]["segs"], mode))
+            attrs += rtattr(RTA_ENCAP_TYPE, struct.pack("=H", LWTUNNEL_ENCAP_SEG6)) + rtattr(RTA_ENCAP, encap)
+        elif route.get("seg6local"):
+            local = route["seg6local"]
+            encap = rtattr(SEG6_LOCAL_ACTION, struct.pack("=I", SEG6_LOCAL_ACTIONS[local["action"]]))
+            if local.get("nh6"):
+                encap += rtattr(SEG6_LOCAL_NH6, ipaddress.ip_address(local["nh6"]).packed)
+            if local.get("table") is not None:
+                encap += rtattr(SEG6_LOCAL_TABLE, struct.pack("=I", int(local["table"])))
+            if local.get("segs"):
+                # End.B6 inserts the header in the packet while End.B6.Encaps adds an outer IPv6 header
+                mode = SEG6_MODES["inline" if local["action"] == "End.B6" else "encap"]
+                encap += rtattr(SEG6_LOCAL_SRH, srh(local["segs"], mode))
+            attrs += rtattr(RTA_ENCAP_TYPE, struct.pack("=H", LWTUNNEL_ENCAP_SEG6_LOCAL)) + rtattr(RTA_ENCAP, encap)
+        if delete:
+            # As 'ip route del', match the routes whatever their protocol (e.g., zebra or sr-routed),
+            # scope and type
+            header = RTMSG.pack(family, dst.prefixlen, 0, 0, table if table < 256 else RT_TABLE_UNSPEC,
+                                RTPROT_UNSPEC, RT_SCOPE_NOWHERE, RTN_UNSPEC, 0)
+        else:
+            header = RTMSG.pack(family, dst.prefixlen, 0, 0, table if table < 256 else RT_TABLE_UNSPEC,
+                                RTPROT_STATIC, scope, RTN_UNICAST, 0)
+        return header + attrs
+
+    def _route_requests(self, routes, msg_type, flags):
+        """Build the route messages, the routes that cannot be encoded get an error instead"""
+        messages = []
+        errors = {}
+        for i, route in enumerate(routes):
+            try:
+                messages.append((i, (msg_type, flags, self._route_payload(route, delete=msg_type == RTM_DELROUTE))))
+            except (NetlinkError, ValueError, KeyError) as e:
+                errors[i] = e if isinstance(e, NetlinkError) else NetlinkError(errno.EINVAL, str(e))
+        for i, error in zip([i for i, _ in messages], self.request([m for _, m in messages])):
+            errors[i] = error
+        return [errors[i] for i in range(len(routes))]
+
+    def add_routes(self, routes, replace=False):
+        """Install routes in bulk
+
+        :param routes: the list of routes
+        :param replace: whether existing routes to the same destinations are replaced
+        :return: the list of errors (None for success) in the same order as the routes"""
+        flags = NLM_F_CREATE | (NLM_F_REPLACE if replace else NLM_F_EXCL)
+        return self._route_requests(routes, RTM_NEWROUTE, flags)
+
+    def delete_routes(self, routes):
+        """Remove routes in bulk, whatever the protocol that installed them
+
+        :param routes: the list of routes
+        :return: the list of errors (None for success) in the same order as the routes"""
+        return self._route_requests(routes, RTM_DELROUTE, 0)
+
+    def lookup_tables(self, addresses, iif=None):
+        """Look up the routes towards addresses through the rules (as 'ip route get').
+           With an ingress interface, the kernel runs the input route lookup of a packet received
+           on this interface (as 'ip route get ... iif <iif>'), otherwise the lookup of a locally sent packet.
+
+        :param addresses: the destination addresses
+        :param iif: the name of the ingress interface
+        :return: the list of the tables of the matching routes (None if no route matches)
+                 in the same order as the addresses"""
+        tables = []
+        iif_attr = rtattr(RTA_IIF, struct.pack("=i", self.link_index(iif))) if iif else b""
+        with self.lock:
+            for i in range(0, len(addresses), BATCH_SIZE):
+                sent = {}
+                data = b""
+                for j, address in enumerate(addresses[i:i + BATCH_SIZE]):
+                    address = ipaddress.ip_address(address)
+                    family = socket.AF_INET6 if address.version == 6 else socket.AF_INET
+                    payload = RTMSG.pack(family, address.max_prefixlen, 0, 0, 0, 0, 0, 0, 0) \
+                        + rtattr(RTA_DST, address.packed) + iif_attr
+                    seq, message = self._message(RTM_GETROUTE, NLM_F_REQUEST, payload)
+                    sent[seq] = i + j
+                    data += message
+                    tables.append(None)
+                self.sock.sendall(data)
+                for msg_type, _, seq, payload in self._messages():
+                    if seq not in sent:
+                        continue
+                    if msg_type == RTM_NEWROUTE:
+                        table = RTMSG.unpack_from(payload)[4]
+                        attrs = parse_attrs(payload, RTMSG.size)
+                        tables[sent[seq]] = struct.unpack("=I", attrs[RTA_TABLE])[0] if RTA_TABLE in attrs else table
+                    del sent[seq]
+                    if not sent:
+                        break
+        return tables
+
+    def dump_routes(self, table=None, family=socket.AF_INET6):
+        """Return the routes of a table (or of all tables) as dicts"""
+        routes = []
+        for _, payload in self.dump(RTM_GETROUTE, RTMSG.pack(family, 0, 0, 0, 0, 0, 0, 0, 0)):
+            rt_family, dst_len, _, _, rt_table, protocol, _, rt_type, _ = RTMSG.unpack_from(payload)
+            attrs = parse_attrs(payload, RTMSG.size)
+            rt_table = struct.unpack("=I", attrs[RTA_TABLE])[0] if RTA_TABLE in attrs else rt_table
+            if table is not None and rt_table != int(table):
+                continue
+            route = {"table": rt_table, "type": rt_type, "protocol": protocol}
+            if RTA_DST in attrs:
+                route["dst"] = "%s/%d" % (ipaddress.ip_address(bytes(attrs[RTA_DST])), dst_len)
+            else:
+                route["dst"] = "::/0" if rt_family == socket.AF_INET6 else "0.0.0.0/0"
+            if RTA_GATEWAY in attrs:
+                route["gateway"] = str(ipaddress.ip_address(bytes(attrs[RTA_GATEWAY])))
+            if RTA_OIF in attrs:
+                route["oif_index"] = struct.unpack("=i", attrs[RTA_OIF])[0]
+            if RTA_PRIORITY in attrs:
+                route["metric"] = struct.unpack("=I", attrs[RTA_PRIORITY])[0]
+            if RTA_MULTIPATH in attrs:
+                route["nexthops"] = self._parse_nexthops(attrs[RTA_MULTIPATH])
+            encap_type = struct.unpack("=H", attrs.get(RTA_ENCAP_TYPE, b"\0\0"))[0]
+            if RTA_ENCAP in attrs and encap_type == LWTUNNEL_ENCAP_SEG6:
+                encap = parse_attrs(attrs[RTA_ENCAP]).get(SEG6_IPTUNNEL_SRH)
+                if encap is not None:
+                    mode = struct.unpack_from("=i", encap)[0]
+                    segs = parse_srh(encap[4:])
+                    route["encap"] = {"mode": {v: k for k, v in SEG6_MODES.items()}.get(mode, mode),
+                                      "segs": segs[:-1] if mode == SEG6_MODES["inline"] else segs}
+            elif RTA_ENCAP in attrs and encap_type == LWTUNNEL_ENCAP_SEG6_LOCAL:
+                local = parse_attrs(attrs[RTA_ENCAP])
+                action = struct.unpack("=I", local[SEG6_LOCAL_ACTION])[0] if SEG6_LOCAL_ACTION in local else 0
+                route["seg6local"] = {"action": {v: k for k, v in SEG6_LOCAL_ACTIONS.items()}.get(action, action)}
+            routes.append(route)
+        return routes
+
+    @staticmethod
+    def _parse_nexthops(data):
+        nexthops = []
+        offset = 0
+        while offset + RTNEXTHOP.size <= len(data):
+            length, _, hops, ifindex = RTNEXTHOP.unpack_from(data, offset)
+            nh = {"weight": hops + 1, "oif_index": ifindex}
+            attrs = parse_attrs(data[offset:offset + length], RTNEXTHOP.size)
+            if RTA_GATEWAY in attrs:
+                nh["gateway"] = str(ipaddress.ip_address(bytes(attrs[RTA_GATEWAY])))
+            nexthops.append(nh)
+            offset += align(length)
+        return nexthops
+
+    def flush_table(self, table):
+        """Remove every IPv6 route of a table
+
+        :return: the number of removed routes"""
+        routes = [{"dst": r["dst"], "table": table, "metric": r.get("metric")} for r in self.dump_routes(table=table)]
+        errors = self.delete_routes(routes)
+        failed = [(route["dst"], e) for route, e in zip(routes, errors) if e is not None]
+        if failed:
+            lg.error("Cannot remove %d routes of table %d: %s\n"
+                     % (len(failed), table, ", ".join("%s (%s)" % f for f in failed[:10])))
+        return len(routes) - len(failed)
+
+    # Rules
+
+    @staticmethod
+    def _rule_payload(rule):
+        dst = ipaddress.ip_network(rule["dst"], strict=False)
+        family = socket.AF_INET6 if dst.version == 6 else socket.AF_INET
+        table = int(rule["table"])
+        attrs = rtattr(FRA_DST, dst.network_address.packed) + rtattr(FRA_TABLE, struct.pack("=I", table))
+        if rule.get("priority") is not None:
+            attrs += rtattr(FRA_PRIORITY, struct.pack("=I", int(rule["priority"])))
+        return FIB_RULE_HDR.pack(family, dst.prefixlen, 0, 0, table if table < 256 else RT_TABLE_UNSPEC,
+                                 0, 0, FR_ACT_TO_TBL, 0) + attrs
+
+    def add_rules(self, rules):
+        """Add rules sending the traffic directed to 'dst' to the routing table 'table'
+
+        :param rules: a list of dicts with dst, table and (optionally) priority
+        :return: the list of errors (None for success)"""
+        return self.request([(RTM_NEWRULE, NLM_F_CREATE | NLM_F_EXCL, self._rule_payload(r)) for r in rules])
+
+    def delete_rules(self, rules):
+        return self.request([(RTM_DELRULE, 0, self._rule_payload(r)) for r in rules])
+
+
+class GenericNetlink(NetlinkSocket):
+
+    def __init__(self, family_name, version, pid=None, **kwargs):
+        super().__init__(pid=pid, protocol=NETLINK_GENERIC, **kwargs)
+        self.version = version
+        self.family_id = self._resolve(family_name)
+
+    def _resolve(self, family_name):
+        payload = GENLMSGHDR.pack(CTRL_CMD_GETFAMILY, 1, 0) + \
+            rtattr(CTRL_ATTR_FAMILY_NAME, family_name.encode() + b"\0")
+        with self.lock:
+            seq, message = self._message(GENL_ID_CTRL, NLM_F_REQUEST, payload)
+            self.sock.sendall(message)
+            for msg_type, _, reply_seq, reply in self._messages():
+                if reply_seq != seq:
+                    continue
+                if msg_type == NLMSG_ERROR:
+                    raise NetlinkError(-NLMSGERR.unpack_from(reply)[0], family_name)
+                attrs = parse_attrs(reply, GENLMSGHDR.size)
+                return struct.unpack("=H", attrs[CTRL_ATTR_FAMILY_ID][:2])[0]
+
+    def command(self, cmd, attrs):
+        errors = self.request([(self.family_id, 0, GENLMSGHDR.pack(cmd, self.version, 0) + attrs)])
+        if errors[0] is not None:
+            raise errors[0]
+
+
+class NodeNetlink:
+    """The netlink sockets of a node, opened on first use"""
+
+    def __init__(self, node):
+        self._node = node
+        self._route = None
+        self._seg6 = None
+
+    @property
+    def route(self):
+        if self._route is None:
+            self._route = RTNetlink(pid=self._node.pid)
+        return self._route
+
+    def set_tunsrc(self, address):
+        """Set the source address of the SRv6 encapsulations (as 'ip sr tunsrc set')"""
+        if self._seg6 is None:
+            self._seg6 = GenericNetlink(SEG6_GENL_NAME, SEG6_GENL_VERSION, pid=self._node.pid)
+        self._seg6.command(SEG6_CMD_SET_TUNSRC, rtattr(SEG6_ATTR_DST, ipaddress.ip_address(address).packed))
+
+    def close(self):
+        for sock in (self._route, self._seg6):
+            if sock is not None:
+                sock.close()
+        self._route = None
+        self._seg6 = None
+
+
+def node_netlink(node):
+    """Return the netlink sockets of a node, or None if the node uses the 'ip' commands,
+       either because it was asked to or because the sockets cannot be opened"""
+    if not getattr(node, "use_netlink", False):
+        return None
+    nl = getattr(node, "netlink", None)
+    if nl is None:
+        nl = NodeNetlink(node)
+        try:
+            nl.route.links()
+        except (OSError, NetlinkError) as e:
+            lg.warn("%s: Cannot use netlink (%s), falling back to the ip commands\n" % (node.name, e))
+            node.use_netlink = False
+            return None
+        node.netlink = nl
+    return nl
+
+
+def ip_route_args(route):
+    """Return the arguments of 'ip -6 route <add|del|replace>' equivalent to a route dict"""
+    args = [route["dst"]]
+    if route.get("encap"):
+        args.extend(["encap", "seg6", "mode", route["encap"].get("mode", "encap"),
+                     "segs", ",".join(route["encap"]["segs"])])
+    elif route.get("seg6local"):
+        local = route["seg6local"]
+        args.extend(["encap", "seg6local", "action", local["action"]])
+        if local.get("nh6"):
+            args.extend(["nh6", local["nh6"]])
+        if local.get("table") is not None:
+            args.extend(["table", str(local["table"])])
+        if local.get("segs"):
+            args.extend(["srh", "segs", ",".join(local["segs"])])
+    if route.get("gateway"):
+        args.extend(["via", route["gateway"]])
+    if route.get("oif"):
+        args.extend(["dev", route["oif"]])
+    if route.get("table") is not None:
+        args.extend(["table", str(route["table"])])
+    if route.get("metric") is not None:
+        args.extend(["metric", str(route["metric"])])
+    for nh in route.get("nexthops", ()):
+        args.append("nexthop")
+        if nh.get("gateway"):
+            args.extend(["via", nh["gateway"]])
+        if nh.get("oif"):
+            args.extend(["dev", nh["oif"]])
+        args.extend(["weight", str(nh.get("weight", 1))])
+    return args
@@ -0,0 +1,306 @@
+import ctypes
+import os
+import pickle
+import selectors
+import shutil
+import signal
+import socket
+import subprocess
+import time
+import traceback
+
+from mininet.log import lg
+
+from . import resources
+from .netlink import CLONE_NEWNET
+from .resources import available_cpus, create_cgroup, parse_size, remove_cgroup
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWPID = 0x20000000
+PR_SET_PDEATHSIG = 1
+
+IPROUTE2_DIR = "/etc/iproute2"
+# Cgroup holding one cgroup per instance
+INSTANCES_CGROUP = "srnmininet-instances"
+
+
+def unshare(flags):
+    if hasattr(os, "unshare"):
+        os.unshare(flags)
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(flags) != 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+
+
+def die_with_parent():
+    """Make the kernel kill this process when its parent exits"""
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.prctl(PR_SET_PDEATHSIG, signal.SIGKILL)
+
+
+def available_memory():
+    """Return the memory (in bytes) available for new processes"""
+    with open("/proc/meminfo") as fileobj:
+        for line in fileobj:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) * 1024
+    raise Exception("Cannot read the available memory in /proc/meminfo")
+
+
+def remove_cgroup_tree(path):
+    """Remove a cgroup and its descendants whose processes are terminated"""
+    if not os.path.isdir(path):
+        return
+    for name in os.listdir(path):
+        if os.path.isdir(os.path.join(path, name)):
+            remove_cgroup_tree(os.path.join(path, name))
+    remove_cgroup(path)
+
+
+class Job:
+    """An experiment run in its own SRN instance"""
+
+    def __init__(self, name, func, cpus=1, memory=None, timeout=None, **kwargs):
+        """:param name: The name of the job
+           :param func: The function running the experiment, called as func(instance, **kwargs)
+                        in the instance. Its return value must be picklable.
+           :param cpus: The number of cores reserved for the job
+           :param memory: The memory reserved for the job (in bytes or with a K, M or G suffix)
+           :param timeout: The maximum duration (in seconds) of the job
+           :param kwargs: The parameters of the experiment"""
+        self.name = name
+        self.func = func
+        self.cpus = cpus
+        self.memory = parse_size(memory) if memory is not None else 0
+        self.timeout = timeout
+        self.kwargs = kwargs
+
+
+class Instance:
+    """The isolated environment of a job.
+
+       The instance runs in its own network, mount, UTS and PID namespaces, so that the node names,
+       the interfaces of the switches, the local SID tables of /etc/iproute2/rt_tables, the files of /tmp
+       (e.g., the FIFO of SRDNSProxy), the ports of the root namespace and the cgroups of the daemons
+       of several networks do not collide. The process running the job is the init process
+       of the PID namespace: when it exits, the kernel kills every process of the instance
+       and the namespaces (with their links) disappear."""
+
+    def __init__(self, name, path, cpus, memory):
+        """:param name: The name of the instance (also used as hostname and as name of its cgroup)
+           :param path: The directory of the instance (its /tmp is in path/tmp)
+           :param cpus: The cores on which the instance runs
+           :param memory: The memory limit of the instance (in bytes, 0 for no limit)"""
+        self.name = name
+        self.path = path
+        self.cpus = cpus
+        self.memory = memory
+
+    @property
+    def cgroup(self):
+        return os.path.join(resources.CGROUP_ROOT, INSTANCES_CGROUP, self.name)
+
+    def enter(self):
+        """Move the calling process in the namespaces of the instance.
+           The PID namespace only applies to the children of the calling process."""
+        tmp = os.path.join(self.path, "tmp")
+        os.makedirs(tmp, exist_ok=True)
+        os.sched_setaffinity(0, self.cpus)
+        if self.memory and os.path.exists(os.path.join(resources.CGROUP_ROOT, "cgroup.controllers")):
+            create_cgroup(self.cgroup, memory_max=self.memory)
+            # Processes cannot be in a cgroup whose controllers are enabled for its children
+            main = create_cgroup(os.path.join(self.cgroup, "main"))
+            with open(os.path.join(main, "cgroup.procs"), "w") as fileobj:
+                fileobj.write(str(os.getpid()))
+        unshare(CLONE_NEWNET | CLONE_NEWNS | CLONE_NEWUTS | CLONE_NEWPID)
+        socket.sethostname(self.name)
+
+    def mount(self):
+        """Mount the private file systems of the instance (called by its init process)"""
+        def run(*cmd):
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+
+        run("mount", "--make-rprivate", "/")
+        run("mount", "-t", "proc", "proc", "/proc")
+        run("mount", "-t", "sysfs", "sysfs", "/sys")  # Shows the interfaces of the new network namespace
+        try:
+            # Hidden by the new sysfs
+            run("mount", "-t", "cgroup2", "cgroup2", resources.CGROUP_ROOT)
+        except subprocess.CalledProcessError:
+            lg.debug("%s: cgroup v2 is not available\n" % self.name)
+        if os.path.isdir(IPROUTE2_DIR):
+            # The whole directory is private, rt_tables is rewritten with a rename in it (see teardown.py)
+            # and a file that is a mount point cannot be replaced
+            private_iproute2 = os.path.join(self.path, "iproute2")
+            shutil.copytree(IPROUTE2_DIR, private_iproute2, symlinks=True, dirs_exist_ok=True)
+            run("mount", "--bind", private_iproute2, IPROUTE2_DIR)
+        run("mount", "--bind", os.path.join(self.path, "tmp"), "/tmp")
+        run("ip", "link", "set", "dev", "lo", "up")
+        # The cgroups of the daemons of this instance
+        resources.CGROUP_PARENT = os.path.join(INSTANCES_CGROUP, self.name, "daemons")
+
+
+def _send_result(fd, result):
+    with os.fdopen(fd, "wb") as fileobj:
+        pickle.dump(result, fileobj)
+
+
+def _run_instance(instance, job, fd):
+    """Run a job in a new instance and write its result to fd (in a forked process)"""
+    try:
+        die_with_parent()
+        instance.enter()
+    except BaseException:
+        _send_result(fd, ("error", traceback.format_exc()))
+        os._exit(1)
+    pid = os.fork()
+    if pid == 0:
+        # Init process of the instance
+        status = 0
+        try:
+            die_with_parent()
+            instance.mount()
+            result = ("ok", job.func(instance, **job.kwargs))
+        except BaseException:
+            result = ("error", traceback.format_exc())
+            status = 1
+        try:
+            _send_result(fd, result)
+        finally:
+            os._exit(status)
+    os.close(fd)
+    _, status = os.waitpid(pid, 0)
+    os._exit(os.waitstatus_to_exitcode(status) & 0xff)
+
+
+class Orchestrator:
+    """Run experiments in parallel, each one in its own SRN instance (see Instance).
+
+       Jobs are started in order as soon as enough cores and memory are free;
+       smaller jobs can start before a larger one that does not fit yet. Each job is pinned
+       to its own cores. Its instance is cleaned up by the kernel when the job ends,
+       crashes or reaches its timeout, without touching the other instances."""
+
+    def __init__(self, path, prefix="srn", cpus=None, memory=None, reserved_cpus=1, limit_memory=False):
+        """:param path: The directory of the instances
+           :param prefix: The prefix of the names of the instances
+           :param cpus: The cores available for the jobs (the cores of this process by default)
+           :param memory: The memory available for the jobs (the available memory of the host by default)
+           :param reserved_cpus: The number of first cores left for the orchestrator
+           :param limit_memory: Whether the memory of each job is limited to its reservation (requires cgroup v2)"""
+        self.path = os.path.abspath(path)
+        self.prefix = prefix
+        cpus = resources.parse_cpus(cpus) if cpus is not None else available_cpus()
+        self.cpus = cpus[reserved_cpus:] if len(cpus) > reserved_cpus else cpus
+        self.memory = parse_size(memory) if memory is not None else available_memory()
+        self.limit_memory = limit_memory
+        self.jobs = []
+        self.results = {}
+
+    def add(self, name, func, cpus=1, memory=None, timeout=None, **kwargs):
+        """Add a job (see Job for the parameters)"""
+        job = Job(name, func, cpus=cpus, memory=memory, timeout=timeout, **kwargs)
+        if job.cpus > len(self.cpus) or job.memory > self.memory:
+            raise Exception("Job %s needs more resources than available (%d cores and %d bytes)"
+                            % (name, len(self.cpus), self.memory))
+        self.jobs.append(job)
+        return job
+
+    def _start(self, job, index, free_cpus):
+        cpus = free_cpus[:job.cpus]
+        del free_cpus[:job.cpus]
+        instance = Instance("%s%d" % (self.prefix, index), os.path.join(self.path, "%s%d" % (self.prefix, index)),
+                            cpus, job.memory if self.limit_memory else 0)
+        os.makedirs(instance.path, exist_ok=True)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                _run_instance(instance, job, write_fd)
+            finally:
+                os._exit(1)
+        os.close(write_fd)
+        lg.info("*** Job %s started in %s on cores %s\n" % (job.name, instance.name, cpus))
+        return {"job": job, "instance": instance, "pid": pid, "fileobj": os.fdopen(read_fd, "rb"), "data": [],
+                "start": time.monotonic()}
+
+    def _finish(self, running, free_cpus, killed=False):
+        _, status = os.waitpid(running["pid"], 0)
+        running["fileobj"].close()
+        free_cpus.extend(running["instance"].cpus)
+        free_cpus.sort()
+        remove_cgroup_tree(running["instance"].cgroup)
+        job = running["job"]
+        result = {"instance": running["instance"].name, "duration": time.monotonic() - running["start"],
+                  "cpus": running["instance"].cpus, "status": "error", "result": None, "error": None}
+        try:
+            status_name, value = pickle.loads(b"".join(running["data"]))
+            result["status"] = status_name
+            result["result" if status_name == "ok" else "error"] = value
+        except Exception:
+            result["error"] = "The instance exited with status %d without a result" % os.waitstatus_to_exitcode(status)
+        if killed:
+            result["status"] = "timeout" if job.timeout else "error"
+            result["error"] = "The job did not end in %d seconds" % job.timeout if job.timeout \
+                else "The job was interrupted"
+        if result["status"] != "ok":
+            lg.error("*** Job %s failed: %s\n" % (job.name, result["error"]))
+        else:
+            lg.info("*** Job %s done in %.3f seconds\n" % (job.name, result["duration"]))
+        self.results[job.name] = result
+
+    def run(self):
+        """Run all the jobs and wait until they end
+
+        :return: the dict {job name: {'instance', 'status', 'result', 'error', 'duration', 'cpus'}}
+                 where status is 'ok', 'error' or 'timeout'"""
+        pending = list(self.jobs)
+        self.jobs = []
+        free_cpus = list(self.cpus)
+        free_memory = self.memory
+        running = {}  # {read fd: running job}
+        index = 0
+        selector = selectors.DefaultSelector()
+        try:
+            while pending or running:
+                for job in list(pending):
+                    if job.cpus <= len(free_cpus) and job.memory <= free_memory:
+                        pending.remove(job)
+                        free_memory -= job.memory
+                        started = self._start(job, index, free_cpus)
+                        index += 1
+                        running[started["fileobj"].fileno()] = started
+                        selector.register(started["fileobj"], selectors.EVENT_READ, started)
+
+                deadlines = [r["start"] + r["job"].timeout for r in running.values() if r["job"].timeout]
+                timeout = max(0., min(deadlines) - time.monotonic()) if deadlines else None
+                for key, _ in selector.select(timeout=timeout):
+                    started = key.data
+                    data = os.read(key.fd, 1 << 16)
+                    if data:
+                        started["data"].append(data)
+                        continue
+                    selector.unregister(started["fileobj"])
+                    del running[key.fd]
+                    free_memory += started["job"].memory
+                    self._finish(started, free_cpus)
+
+                now = time.monotonic()
+                for fd, started in list(running.items()):
+                    if started["job"].timeout and now - started["start"] > started["job"].timeout:
+                        # The init process of the instance dies with its parent
+                        os.kill(started["pid"], signal.SIGKILL)
+                        selector.unregister(started["fileobj"])
+                        del running[fd]
+                        free_memory += started["job"].memory
+                        self._finish(started, free_cpus, killed=True)
+        finally:
+            for started in running.values():
+                os.kill(started["pid"], signal.SIGKILL)
+                self._finish(started, free_cpus, killed=True)
+            selector.close()
+        return self.results
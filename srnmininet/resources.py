@@ -0,0 +1,175 @@
+import os
+import re
+import shlex
+
+from mininet.log import lg
+
+# Root of the cgroup v2 hierarchy
+CGROUP_ROOT = "/sys/fs/cgroup"
+# Cgroup holding the cgroups of the daemons
+CGROUP_PARENT = "srnmininet"
+# Period (in microseconds) of the CPU bandwidth limits
+CPU_PERIOD = 100000
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(size):
+    """Return the number of bytes of a memory size (e.g., 1048576, '512M' or '2G')"""
+    if isinstance(size, int):
+        return size
+    match = re.match(r"^\s*(\d+)\s*([KMG]?)i?B?\s*$", str(size), re.IGNORECASE)
+    if match is None:
+        raise Exception("Cannot parse the memory size '%s'" % size)
+    return int(match.group(1)) * SIZE_UNITS[match.group(2).upper()]
+
+
+def parse_cpus(cpus):
+    """Return the sorted list of CPU ids of a CPU list (e.g., [0, 2], range(4) or '0-3,6')"""
+    if cpus is None:
+        return None
+    if isinstance(cpus, int):
+        return [cpus]
+    if not isinstance(cpus, str):
+        return sorted(set(int(cpu) for cpu in cpus))
+    ids = set()
+    for part in cpus.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            ids.update(range(int(first), int(last) + 1))
+        else:
+            ids.add(int(part))
+    return sorted(ids)
+
+
+def available_cpus():
+    """Return the sorted list of CPU ids on which this process can run"""
+    return sorted(os.sched_getaffinity(0))
+
+
+def cgroup_parent():
+    """Return the path of the cgroup holding the cgroups of the daemons"""
+    return os.path.join(CGROUP_ROOT, CGROUP_PARENT)
+
+
+def cgroup_path(name):
+    return os.path.join(cgroup_parent(), name)
+
+
+def _write(path, value):
+    with open(path, "w") as fileobj:
+        fileobj.write(value)
+
+
+def create_cgroup(path, cpu_quota=None, memory_max=None):
+    """Create a cgroup v2 limiting the CPU bandwidth and the memory of its processes
+
+    :param path: The path of the cgroup (see cgroup_path())
+    :param cpu_quota: The maximum number of CPUs used by the processes (e.g., 0.5 for half a core)
+    :param memory_max: The maximum memory of the processes (in bytes or with a K, M or G suffix)"""
+    if not os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers")):
+        raise Exception("Cannot limit resources: cgroup v2 is not mounted on %s" % CGROUP_ROOT)
+
+    controllers = []
+    if cpu_quota is not None:
+        controllers.append("cpu")
+    if memory_max is not None:
+        controllers.append("memory")
+
+    # The controllers must be enabled in every ancestor
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    ancestors = [CGROUP_ROOT]
+    for part in os.path.relpath(parent, CGROUP_ROOT).split(os.sep):
+        if part != os.curdir:
+            ancestors.append(os.path.join(ancestors[-1], part))
+    for ancestor in ancestors:
+        with open(os.path.join(ancestor, "cgroup.subtree_control")) as fileobj:
+            enabled = fileobj.read().split()
+        missing = " ".join("+" + c for c in controllers if c not in enabled)
+        if missing:
+            _write(os.path.join(ancestor, "cgroup.subtree_control"), missing)
+
+    os.makedirs(path, exist_ok=True)
+    if cpu_quota is not None:
+        _write(os.path.join(path, "cpu.max"), "%d %d" % (max(1000, int(cpu_quota * CPU_PERIOD)), CPU_PERIOD))
+    if memory_max is not None:
+        _write(os.path.join(path, "memory.max"), str(parse_size(memory_max)))
+        if os.path.exists(os.path.join(path, "memory.swap.max")):
+            # Otherwise, the limit only moves the pages of the processes to the swap
+            _write(os.path.join(path, "memory.swap.max"), "0")
+    return path
+
+
+def remove_cgroup(path):
+    """Remove a cgroup whose processes are terminated"""
+    try:
+        os.rmdir(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        lg.error("Cannot remove cgroup %s: %s\n" % (path, e))
+
+
+def wrap_command(command, cpus=None, nice=None, cgroup=None):
+    """Return the command line launching a command with a CPU affinity, a nice level and in a cgroup.
+       The launchers replace themselves by the command so that the process keeps the command line
+       of the command.
+
+    :param command: The command line
+    :param cpus: The CPUs on which the command runs (see parse_cpus())
+    :param nice: The nice level of the command
+    :param cgroup: The path of the cgroup of the command"""
+    cpus = parse_cpus(cpus)
+    prefix = []
+    if cpus:
+        prefix += ["taskset", "-c", ",".join(str(cpu) for cpu in cpus)]
+    if nice is not None:
+        prefix += ["nice", "-n", str(int(nice))]
+    line = " ".join(prefix + [command])
+    if cgroup is None:
+        return line
+    script = "echo $$ > %s && exec %s" % (shlex.quote(os.path.join(cgroup, "cgroup.procs")), line)
+    return "sh -c %s" % shlex.quote(script)
+
+
+def place_daemons(net, cpus=None, reserved=1, daemon_names=None):
+    """Spread the daemons of the controllers and of the access routers across cores.
+       Each daemon of a controller gets its own core (e.g., ovsdb-server and sr-ctrl) while
+       the daemons of an access router share the same one. Cores are given in turn
+       and reused once they are all taken. The daemons with an explicit CPU list are not moved.
+       This must be called before the network is started.
+
+    :param net: The SRNNet
+    :param cpus: The CPUs available for the daemons (the CPUs of this process by default)
+    :param reserved: The number of first available CPUs left for the other processes
+                     (e.g., OSPF, netem and the test harness)
+    :param daemon_names: The names of the daemons to place (all the daemons supporting a CPU list by default)
+    :return: the dict {(router name, daemon name): CPU id}"""
+    cpus = parse_cpus(cpus) if cpus is not None else available_cpus()
+    if len(cpus) > reserved:
+        cpus = cpus[reserved:]
+
+    slots = []  # List of (router, daemons sharing a core)
+    controllers = [r for r in net.routers if r.controller]
+    access_routers = [r for r in net.routers if r.access_router and not r.controller]
+    for r in controllers + access_routers:
+        daemons = [d for d in r.nconfig.daemons if "cpus" in d.options and d.options.cpus is None
+                   and (daemon_names is None or d.NAME in daemon_names)]
+        if r.controller:
+            slots.extend((r, [d]) for d in daemons)
+        elif daemons:
+            slots.append((r, daemons))
+
+    placement = {}
+    for i, (r, daemons) in enumerate(slots):
+        cpu = cpus[i % len(cpus)]
+        for d in daemons:
+            d.options.cpus = [cpu]
+            placement[(r.name, d.NAME)] = cpu
+    if len(slots) > len(cpus):
+        lg.warn("%d groups of daemons share %d cores\n" % (len(slots), len(cpus)))
+    return placement
@@ -0,0 +1,244 @@
+"""Declarative specification of SRN topologies.
+
+A specification is a stream of records, read one at a time so that very large
+topologies never need the whole parsed document in memory. Records are either
+YAML documents (separated by '---') or JSON values: either a standard JSON document
+whose top-level array holds the records, or JSON Lines (one object per line). The elements
+of a top-level JSON array are streamed one at a time. A YAML document or a JSON line can
+also hold a list of records.
+
+Each record is a mapping whose kind is given by one of its keys:
+
+- topology: global options (link_delay, link_bandwidth, schema, max_queue_size)
+- router: a router name, the other keys are router parameters
+  (e.g., lo_addresses) and the roles 'controller: true', 'access_router: true'
+  and 'sr_controller: <controller name>' (to assign an access router to a controller)
+- host: a host name, the other keys are host parameters
+- link: [node1, node2] with the optional keys delay, bw, max_queue_size,
+  params1 and params2 (per-side parameters such as ip, delay or bw)
+- domain: options of the SRCtrlDomain overlay (hosts: the list of hosts of the DNS zone,
+  all the hosts by default)
+
+Example (YAML)::
+
+    topology: {link_delay: 1ms, link_bandwidth: 100}
+    ---
+    router: A
+    access_router: true
+    ---
+    router: B
+    controller: true
+    ---
+    host: client
+    ---
+    link: [client, A]
+    ---
+    link: [A, B]
+    delay: 5ms
+    params1: {ip: ["2042:0:1::1/64"]}
+    params2: {ip: ["2042:0:1::2/64"]}
+"""
+import json
+import os
+
+from .config import SRCtrlDomain
+from .srntopo import MAX_QUEUE, SRNTopo
+
+RECORD_KINDS = ("topology", "router", "host", "link", "domain")
+YAML_EXTENSIONS = (".yaml", ".yml")
+JSON_BLANKS = " \t\r\n"
+CHUNK_SIZE = 1 << 16
+
+
+class JSONStream:
+    """Reader of the successive JSON values of a file, parsed one at a time from a buffer"""
+
+    def __init__(self, fileobj, path):
+        self.fileobj = fileobj
+        self.path = path
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.lines = 0  # Lines before the buffer
+        self.eof = False
+
+    def _read(self):
+        """Read the next chunk of the file, return False at the end of the file"""
+        if self.eof:
+            return False
+        if self.pos > CHUNK_SIZE:
+            self.lines += self.buf.count("\n", 0, self.pos)
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunk = self.fileobj.read(CHUNK_SIZE)
+        self.eof = not chunk
+        self.buf += chunk
+        return not self.eof
+
+    def error(self, message):
+        return ValueError("%s:%d: %s" % (self.path, self.lines + self.buf.count("\n", 0, self.pos) + 1, message))
+
+    def peek(self):
+        """Skip the blanks and the comment lines ('#'), return the next character ('' at the end of the file)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in JSON_BLANKS:
+                self.pos += 1
+            if self.pos == len(self.buf):
+                if not self._read():
+                    return ""
+            elif self.buf[self.pos] == "#":
+                end = self.buf.find("\n", self.pos)
+                while end < 0 and self._read():
+                    end = self.buf.find("\n", self.pos)
+                self.pos = len(self.buf) if end < 0 else end
+            else:
+                return self.buf[self.pos]
+
+    def take(self):
+        self.pos += 1
+
+    def value(self):
+        """Parse the next value, reading more of the file if it is not complete in the buffer"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number could continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    # The position of the error in the buffer is not the one in the file
+                    self.pos = e.pos
+                    raise self.error(e.msg)
+            self._read()
+
+
+def iter_json(path):
+    """Yield the values of a JSON or JSON Lines file one at a time, the elements of a top-level array
+       are yielded one by one"""
+    with open(path) as fileobj:
+        stream = JSONStream(fileobj, path)
+        while True:
+            char = stream.peek()
+            if not char:
+                return
+            if char != "[":
+                yield stream.value()
+                continue
+            stream.take()
+            if stream.peek() == "]":
+                stream.take()
+                continue
+            while True:
+                yield stream.value()
+                char = stream.peek()
+                stream.take()
+                if char == "]":
+                    break
+                if char != ",":
+                    raise stream.error("Expecting ',' or ']' after a record of the top-level array")
+
+
+def iter_documents(path):
+    """Yield the documents of a specification file one at a time"""
+    if os.path.splitext(path)[1].lower() in YAML_EXTENSIONS:
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("PyYAML is required to load the YAML topology specification %s" % path)
+        with open(path) as fileobj:
+            loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+            for document in yaml.load_all(fileobj, Loader=loader):
+                if document is not None:
+                    yield document
+    else:
+        yield from iter_json(path)
+
+
+def iter_records(path):
+    """Yield the (kind, record) of a specification file one at a time"""
+    for document in iter_documents(path):
+        for record in (document if isinstance(document, list) else [document]):
+            if not isinstance(record, dict):
+                raise ValueError("Invalid record in %s: %s" % (path, record))
+            kinds = [kind for kind in RECORD_KINDS if kind in record]
+            if len(kinds) != 1:
+                raise ValueError("A record of %s must have exactly one of the keys %s: %s"
+                                 % (path, ", ".join(RECORD_KINDS), record))
+            yield kinds[0], record
+
+
+class SpecTopo(SRNTopo):
+    """A SRN topology built from a specification file (see the module documentation)"""
+
+    def __init__(self, spec, schema_tables=None, link_delay=None, link_bandwidth=None, *args, **kwargs):
+        """:param spec: The path to the specification file
+           :param schema_tables: The schema table of ovsdb (overrides the 'schema' topology option)
+           :param link_delay: The default link delay (overrides the 'link_delay' topology option)
+           :param link_bandwidth: The default link bandwidth (overrides the 'link_bandwidth' topology option)"""
+        self.spec = spec
+        self.schema_tables = schema_tables
+        self.link_delay = link_delay
+        self.link_bandwidth = link_bandwidth
+        self.max_queue_size = MAX_QUEUE
+
+        super().__init__((), *args, **kwargs)
+
+    def build(self, *args, **kwargs):
+        access_routers = []
+        partition = {}
+        domain = {}
+
+        for kind, record in iter_records(self.spec):
+            if kind == "topology":
+                self.apply_options(record["topology"] or {})
+            elif kind == "router":
+                params = dict(record)
+                name = str(params.pop("router"))
+                if params.pop("controller", False):
+                    self.controllers.append(name)
+                if params.pop("access_router", False):
+                    access_routers.append(name)
+                sr_controller = params.pop("sr_controller", None)
+                if sr_controller is not None:
+                    partition[name] = sr_controller
+                self.addRouter(name, **params)
+            elif kind == "host":
+                params = dict(record)
+                self.addHost(str(params.pop("host")), **params)
+            elif kind == "link":
+                params = dict(record)
+                node1, node2 = params.pop("link")
+                self.addLink(str(node1), str(node2), **params)
+            else:
+                domain.update(record["domain"] or {})
+
+        if self.controllers:
+            hosts = domain.get("hosts")
+            self.addOverlay(SRCtrlDomain(access_routers=access_routers, sr_controller=self.controllers,
+                                         schema_tables=self.schema_tables if self.schema_tables else {},
+                                         hosts=self.hosts() if hosts is None else hosts,
+                                         partition=partition))
+
+        super().build(*args, **kwargs)
+
+    def apply_options(self, options):
+        if self.link_delay is None:
+            self.link_delay = options.get("link_delay")
+        if self.link_bandwidth is None:
+            self.link_bandwidth = options.get("link_bandwidth")
+        self.max_queue_size = options.get("max_queue_size", self.max_queue_size)
+        if self.schema_tables is None and options.get("schema"):
+            schema_path = options["schema"]
+            if not os.path.isabs(schema_path):
+                schema_path = os.path.join(os.path.dirname(os.path.abspath(self.spec)), schema_path)
+            with open(schema_path) as fileobj:
+                self.schema_tables = json.load(fileobj)["tables"]
+
+    def addLink(self, node1, node2, delay=None, bw=None, max_queue_size=None, **opts):
+        delay = self.link_delay if delay is None else delay
+        bw = self.link_bandwidth if bw is None else bw
+        max_queue_size = self.max_queue_size if max_queue_size is None else max_queue_size
+        return super().addLink(node1, node2, delay=delay, bw=bw, max_queue_size=max_queue_size, **opts)
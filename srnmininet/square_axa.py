@@ -17,22 +17,26 @@ class SquareAxA(SRNTopo):
     """
 
     def __init__(self, controller_idx=2, square_size=3, schema_tables=None,
-                 link_delay="1ms", link_bandwidth=100, *args, **kwargs):
-        """:param controller_idx: The index of routers that will run the SR controller
+                 link_delay="1ms", link_bandwidth=100, access_router_idx=(0,), *args, **kwargs):
+        """:param controller_idx: The index (or list of indexes) of routers that will run the SR controller
            :param square_size: The size of the squares of routers (> 0)
            :param link_delay: The link delay
-           :param link_bandwidth: The link bandwidth"""
+           :param link_bandwidth: The link bandwidth
+           :param access_router_idx: The indexes of the access routers, each of them gets a client host"""
 
         self.link_delay = link_delay
         self.square_size = square_size
         self.link_bandwidth = link_bandwidth
+        controller_idx = [controller_idx] if isinstance(controller_idx, int) else list(controller_idx)
+        self.access_router_idx = list(access_router_idx)
 
         if self.square_size <= 0:
             raise Exception("Negative square size for %s" % type(self).__name__)
-        elif controller_idx <= 0 or controller_idx >= self.square_size * self.square_size:
-            raise Exception("Negative or too big index for the router hosting the controller"
-                            + "(square size %d, index %s) for %s"
-                            % (self.square_size, controller_idx, type(self).__name__))
+        for idx in controller_idx:
+            if idx <= 0 or idx >= self.square_size * self.square_size:
+                raise Exception("Negative or too big index for the router hosting the controller"
+                                + "(square size %d, index %s) for %s"
+                                % (self.square_size, idx, type(self).__name__))
 
         char_list = list(string.ascii_uppercase)
         self.grid = char_list
@@ -42,10 +46,10 @@ class SquareAxA(SRNTopo):
             loop_alphabet += 1
         del self.grid[self.square_size ** 2:]
 
-        controller = self.grid[controller_idx]
+        controllers = [self.grid[idx] for idx in controller_idx]
         self.schema_tables = schema_tables if schema_tables else {}
 
-        super().__init__(controller, *args, **kwargs)
+        super().__init__(controllers, *args, **kwargs)
 
     def build(self, *args, **kwargs):
 
@@ -61,13 +65,15 @@ class SquareAxA(SRNTopo):
                 if i != self.square_size - 1:
                     self.addLink(self.grid[idx], self.grid[idx + self.square_size])
 
-        client = self.addHost("client")
+        for i, idx in enumerate(self.access_router_idx):
+            client = self.addHost("client" if i == 0 else "client%d" % i)
+            self.addLink(self.grid[idx], client)
         server = self.addHost("server")
-        self.addLink(self.grid[0], client)
         self.addLink(self.grid[-1], server)
 
-        self.addOverlay(SRCtrlDomain(access_routers=(self.grid[0],), sr_controller=self.controllers[0],
-                                     schema_tables=self.schema_tables, hosts=self.hosts()))
+        self.addOverlay(SRCtrlDomain(access_routers=[self.grid[idx] for idx in self.access_router_idx],
+                                     sr_controller=self.controllers, schema_tables=self.schema_tables,
+                                     hosts=self.hosts()))
 
         super().build(*args, **kwargs)
 
@@ -1,9 +1,123 @@
+import ipaddress
+import os
+import re
+import tempfile
+import time
+
 from ipmininet.host import IPHost
 from ipmininet.srv6 import enable_srv6
+from mininet.log import lg
+
+from .netlink import ip_route_args, node_netlink
+from .sysctl import SysctlNodeMixin
 
 
-class SRNHost(IPHost):
+class SRNHost(SysctlNodeMixin, IPHost):
+
+    def __init__(self, name, use_netlink=True, *args, **kwargs):
+        """:param use_netlink: Whether routes are managed through netlink sockets instead of 'ip' commands"""
+        self.use_netlink = use_netlink
+        self.netlink = None
+        self.sr_routes = {}  # SRv6 encapsulation routes installed by this API, indexed by destination prefix
+        super().__init__(name, *args, **kwargs)
 
     def start(self):
         enable_srv6(self)
+        self.apply_sysctls()
         super().start()
+
+    def terminate(self):
+        super().terminate()
+        if self.netlink is not None:
+            self.netlink.close()
+
+    def sr_route(self, destination, segments, mode="inline", intf=None):
+        """Return the SRv6 encapsulation route towards a destination
+
+        :param destination: The destination address or prefix
+        :param segments: The segment list or a single segment (e.g., a binding SID)
+        :param mode: The seg6 mode ('inline' or 'encap')
+        :param intf: The outgoing interface name (the default interface by default)"""
+        segments = [segments] if isinstance(segments, str) else list(segments)
+        return {"dst": ipaddress.ip_network(destination, strict=False).with_prefixlen,
+                "oif": intf if intf else self.defaultIntf().name,
+                "encap": {"mode": mode, "segs": segments}}
+
+    def install_sr_routes(self, segments, mode="inline", replace=False, intf=None):
+        """Install SRv6 encapsulation routes in batches
+
+        :param segments: The dict {destination address or prefix: segment list or binding SID}
+        :param mode: The seg6 mode ('inline' or 'encap')
+        :param replace: Whether routes to the same destinations are replaced
+        :param intf: The outgoing interface name (the default interface by default)
+        :return: the dict with the number of routes installed, the list of (route, error)
+                 that could not be installed, the duration and the installation rate (routes per second)"""
+        routes = [self.sr_route(destination, segs, mode=mode, intf=intf) for destination, segs in segments.items()]
+        report = self._sr_route_batch(routes, "replace" if replace else "add")
+        failed = {route["dst"] for route, _ in report["failed"]}
+        for route in routes:
+            if route["dst"] not in failed:
+                self.sr_routes[route["dst"]] = route
+        return report
+
+    def remove_sr_routes(self, destinations=None):
+        """Remove SRv6 encapsulation routes in batches
+
+        :param destinations: The destination addresses or prefixes (all the routes installed by this API by default)
+        :return: the same report as install_sr_routes()"""
+        if destinations is None:
+            routes = list(self.sr_routes.values())
+        else:
+            routes = []
+            for destination in destinations:
+                dst = ipaddress.ip_network(destination, strict=False).with_prefixlen
+                routes.append(self.sr_routes.get(dst, {"dst": dst}))
+        report = self._sr_route_batch(routes, "del")
+        failed = {route["dst"] for route, _ in report["failed"]}
+        for route in routes:
+            if route["dst"] not in failed:
+                self.sr_routes.pop(route["dst"], None)
+        return report
+
+    def _sr_route_batch(self, routes, action):
+        start = time.time()
+        nl = node_netlink(self)
+        if nl is not None:
+            if action == "del":
+                errors = nl.route.delete_routes(routes)
+            else:
+                errors = nl.route.add_routes(routes, replace=(action == "replace"))
+            failed = [(route, error) for route, error in zip(routes, errors) if error is not None]
+        else:
+            failed = self._ip_batch(routes, action)
+        duration = time.time() - start
+
+        report = {"installed" if action != "del" else "removed": len(routes) - len(failed),
+                  "failed": failed, "duration": duration,
+                  "rate": (len(routes) - len(failed)) / duration if duration > 0 else 0.}
+        lg.info("*** %s: %s %d SRv6 routes in %.3f seconds (%.0f routes/s, %d failed)\n"
+                % (self.name, "removed" if action == "del" else "installed", len(routes) - len(failed),
+                   duration, report["rate"], len(failed)))
+        return report
+
+    def _ip_batch(self, routes, action):
+        """Run the route commands in a single 'ip -batch' process
+
+        :return: the list of (route, error) that failed"""
+        if not routes:
+            return []
+        with tempfile.NamedTemporaryFile("w", prefix="sr-routes-%s-" % self.name, suffix=".batch",
+                                         delete=False) as fileobj:
+            for route in routes:
+                fileobj.write("-6 route %s %s\n" % (action, " ".join(ip_route_args(route))))
+        try:
+            _, err, _ = self.pexec(["ip", "-force", "-batch", fileobj.name])
+        finally:
+            os.unlink(fileobj.name)
+
+        failed = []
+        for line in err.splitlines():
+            match = re.search(r"Command failed \S+:(\d+)", line)
+            if match is not None and 0 < int(match.group(1)) <= len(routes):
+                failed.append((routes[int(match.group(1)) - 1], line))
+        return failed
@@ -1,5 +1,7 @@
 import heapq
 import ipaddress
+import itertools
+import re
 import time
 
 from ipmininet.ipnet import IPNet
@@ -7,10 +9,19 @@ from ipmininet.utils import L3Router, otherIntf, realIntfList
 from mininet.log import lg as log
 from mininet.node import Switch
 
-from .config import OVSDB, SRNOSPF6
+from .addressing import AddressIndex
+from .config import OVSDB, SRNOSPF6, SRNDaemon, SRNNamed, SRRouted
+from .convergence import OSPF6Gate
+from .cost import get_cost_model, parse_delay
 from .link import SRNIntf
+from .multipath import WeightedMultipath
+from .netlink import RT_TABLE_MAIN, ip_route_args, node_netlink
+from .resources import place_daemons
 from .srnhost import SRNHost
-from .srnrouter import SRNConfig, SRNRouter
+from .srnrouter import SRNConfig, SRNLightRouter, SRNRouter
+from .teardown import Teardown
+from .telemetry import LinkTelemetry, OVSDBMaintenance
+from .utils import daemon_in_node
 
 
 class SRNNet(IPNet):
@@ -23,14 +34,71 @@ class SRNNet(IPNet):
                  host=SRNHost,
                  static_routing=False,
                  try_route_timeout=4,
+                 lightweight_transit=True,
+                 use_netlink=True,
+                 weighted_multipath=False,
+                 multipath_tolerance=0.,
+                 cost_model=None,
+                 fast_teardown=True,
+                 spread_daemons=False,
+                 wait_convergence=True,
+                 convergence_timeout=30.,
                  *args, **kwargs):
+        """:param static_routing: Whether routes are computed and inserted at start-up instead of using SRNOSPF6
+           :param try_route_timeout: The number of seconds to retry the insertion of a static route
+           :param lightweight_transit: Whether routers that are neither controllers nor access routers
+                                       run without any process in static routing mode
+           :param use_netlink: Whether routes, rules and SRv6 settings are managed through netlink sockets
+                               instead of 'ip' commands
+           :param weighted_multipath: Whether the nexthops of static multipath routes are weighted
+                                      by the bottleneck bandwidth of their branch instead of splitting traffic evenly
+           :param multipath_tolerance: With weighted multipath, the maximum relative cost increase of the
+                                       loop-free paths used in addition to the shortest ones
+           :param cost_model: The model of the link costs used by static routes, SRNOSPF6 and the controllers:
+                              the name of a model of srnmininet.cost.COST_MODELS ('igp' by default),
+                              a dict {model: weight} for a weighted combination or a function of an interface
+           :param fast_teardown: Whether stop() uses the batched and parallel teardown of srnmininet.teardown
+                                 instead of stopping the nodes and the links one by one
+           :param spread_daemons: Whether the daemons of the controllers and of the access routers are pinned
+                                  to different cores (see srnmininet.resources.place_daemons)
+           :param wait_convergence: Whether start() and reset() block until the IGP has converged
+                                    when SRNOSPF6 is used (see srnmininet.convergence.OSPF6Gate)
+           :param convergence_timeout: The maximum number of seconds without progress of the IGP convergence"""
         self.static_routing = static_routing
+        self.weighted_multipath = weighted_multipath
+        self.multipath_tolerance = multipath_tolerance
+        self.cost_model = cost_model
+        self.lightweight_transit = lightweight_transit
+        self.use_netlink = use_netlink
         self.try_route_timeout = try_route_timeout
+        self.address_index = None  # Parsed addresses and prefixes of the interfaces, built at start-up
+        self.controller_ovsdbs = {}  # OVSDB daemons of the controllers indexed by router name
+        self.ovsdb_rows = []  # Initial rows of the controller databases
+        self.initial_link_params = {}
+        self.static_routes = {}  # Static routes installed at start-up indexed by router name
+        self.initial_kernel_state = {}  # Links, traffic control and routes of the nodes right after start-up
+        self.telemetry = None
+        self.ovsdb_maintenance = None
+        self.fast_teardown = fast_teardown
+        self.spread_daemons = spread_daemons
+        self.daemon_placement = {}
+        self.wait_convergence = wait_convergence
+        self.convergence_timeout = convergence_timeout
+        self.convergence_times = {}
+        self.teardown_durations = {}
         super().__init__(*args, router=router, intf=intf, config=config, host=host, use_v4=False, use_v6=True, **kwargs)
 
     def addRouter(self, name, cls=None, **params):
         params["static_routing"] = self.static_routing
-        super().addRouter(name, cls, **params)
+        params.setdefault("use_netlink", self.use_netlink)
+        if cls is None and self.router is SRNRouter and self.static_routing and self.lightweight_transit \
+                and not params.get("controller", False) and not params.get("access_router", False):
+            cls = SRNLightRouter
+        return super().addRouter(name, cls, **params)
+
+    def addHost(self, name, **params):
+        params.setdefault("use_netlink", self.use_netlink)
+        return super().addHost(name, **params)
 
     def _try_add_route(self, node, cmd):
         """Try for some time to insert the route
@@ -44,32 +112,78 @@ class SRNNet(IPNet):
             out = node.cmd(cmd)
         return out
 
-    def _add_static_routes_to_itf(self, r, dest, routes):
-        """Add static the "routes" between "r" and "dest_itf" as an IGP protocol would do."""
+    def _try_add_routes(self, nl, routes, replace=False):
+        """Try for some time to insert the routes through netlink
+           If addition is tried directly, the operation is likely to fail.
+
+        :param replace: Whether existing routes to the same destinations are replaced
+        :return: the list of (route, error) that could not be inserted"""
+        failed = list(zip(routes, nl.route.add_routes(routes, replace=replace)))
+        step = 10
+        for i in range(0, self.try_route_timeout * 1000, step):
+            failed = [(route, error) for route, error in failed if error is not None]
+            if not failed:
+                break
+            time.sleep(step / 1000.)
+            retried = [route for route, _ in failed]
+            failed = list(zip(retried, nl.route.add_routes(retried, replace=replace)))
+        return [(route, error) for route, error in failed if error is not None]
+
+    def _static_routes_to_itf(self, r, dest, routes, weights=None):
+        """Return the static "routes" between "r" and "dest_itf" as an IGP protocol would do.
+
+        :param weights: The weights of the nexthops of each route (all equal to 1 by default)"""
         dest_itf = routes[0][1]  # dest_itfs in routes are all on the same LAN and thus have the same prefixes
-        for ip6 in dest_itf.ip6s(exclude_lls=True, exclude_lbs=True):
-            dest_prefix = ip6.network.with_prefixlen
+        specs = []
+        for prefix in self.address_index[dest_itf].prefixes:
+            dest_prefix = prefix.with_prefixlen
 
             if len(routes) == 1:
                 cost, _, direct_peer_itf = routes[0]
-                if ipaddress.ip_address(direct_peer_itf.ip6) in ipaddress.ip_network(dest_prefix):
+                peer = self.address_index[direct_peer_itf]
+                if peer.address in prefix:
                     continue  # Already a route for this prefix
-                cmd = ["ip", "-6", "route", "add", dest_prefix,
-                       "via", direct_peer_itf.ip6, "metric", str(cost)]
-                out = self._try_add_route(r, cmd)
-                if len(out) > 0:
-                    log.error("Route from %s to %s<%s>: " % (r.name, dest, dest_itf.name) + " ".join(cmd) + "\n")
-                    log.error(out)
+                specs.append({"dst": dest_prefix, "gateway": peer.ip6, "metric": cost})
             elif len(routes) > 0:
-                cmd = ["ip", "-6", "route", "add", dest_prefix, "metric", str(routes[0][0])]
-                for cost, _, direct_peer_itf in routes:
-                    if ipaddress.ip_address(direct_peer_itf.ip6) in ipaddress.ip_network(dest_prefix):
+                nexthops = []
+                for i, (cost, _, direct_peer_itf) in enumerate(routes):
+                    peer = self.address_index[direct_peer_itf]
+                    if peer.address in prefix:
                         continue  # Already a route for this prefix
-                    cmd.extend(["nexthop", "via", direct_peer_itf.ip6, "weight", "1"])
-                out = self._try_add_route(r, cmd)
-                if len(out) > 0:
-                    log.error("Route from %s to %s<%s>: " % (r.name, dest, dest_itf.name) + " ".join(cmd) + "\n")
-                    log.error(out)
+                    nexthops.append({"gateway": peer.ip6, "weight": weights[i] if weights else 1})
+                if nexthops:
+                    specs.append({"dst": dest_prefix, "metric": routes[0][0], "nexthops": nexthops})
+        return specs
+
+    @staticmethod
+    def _weighted_routes(multipath, r, dest, routes):
+        """Return the routes and the weights of their nexthops between "r" and "dest"
+           or the equal-cost "routes" if no weighted route is found"""
+        nexthops = sorted(multipath.nexthops(r, dest), key=lambda nexthop: nexthop[0])
+        if not nexthops:
+            return routes, None
+        dest_itf = routes[0][1]
+        return [(cost, dest_itf, peer_intf) for cost, peer_intf, _ in nexthops], \
+               [weight for _, _, weight in nexthops]
+
+    def _add_static_routes(self, r, specs, replace=False):
+        """Install the static routes of a router, in bulk through netlink if available
+
+        :param replace: Whether existing routes to the same destinations are replaced"""
+        verb = "replace" if replace else "add"
+        nl = node_netlink(r)
+        if nl is not None:
+            for route, error in self._try_add_routes(nl, specs, replace=replace):
+                log.error("Route from %s: ip -6 route %s %s\n" % (r.name, verb, " ".join(ip_route_args(route))))
+                log.error("%s\n" % error)
+            return
+
+        for route in specs:
+            cmd = ["ip", "-6", "route", verb] + ip_route_args(route)
+            out = self._try_add_route(r, cmd)
+            if len(out) > 0:
+                log.error("Route from %s: " % r.name + " ".join(cmd) + "\n")
+                log.error(out)
 
     def ovsdb_node_entry(self, r, ospfv3_id, prefix):
         """
@@ -83,10 +197,7 @@ class SRNNet(IPNet):
 
         # Add host prefixes so that sr-ctrl can find the hosts in its computations
         prefix_list = [prefix.network.with_prefixlen]
-        for itf in realIntfList(self[r.name]):
-            if not L3Router.is_l3router_intf(otherIntf(itf)):
-                for ip6 in itf.ip6s(exclude_lls=True):
-                    prefix_list.append(ip6.network.with_prefixlen)
+        prefix_list.extend(p.with_prefixlen for p in self.address_index.host_prefixes(self[r.name]))
 
         entry = {"routerName": r.name, "routerId": ospfv3_id,
                  "addr": prefix.ip.compressed,
@@ -116,7 +227,8 @@ class SRNNet(IPNet):
                 continue
             visited.add(i)
             n = otherIntf(i)
-            n_delay = i_delay + int(i.delay.split("ms")[0])
+            # Parsed as by the cost model so that both agree on the delay of the links
+            n_delay = i_delay + parse_delay(i.delay)
             if i_bw == 0:  # 0 means no bandwidth limit
                 n_bw = i.bw
             elif i.bw != 0:
@@ -127,7 +239,8 @@ class SRNNet(IPNet):
                 for s_i in realIntfList(n.node):
                     to_visit.append((s_i, i_delay + n_delay, n_bw))
             elif n.name == end.name:
-                return n_delay, n_bw
+                # The delay of the rows is a whole number of milliseconds
+                return int(round(n_delay)), n_bw
         return None, None
 
     def ovsdb_link_entry(self, intf1, intf2, ospfv3_id1, ospfv3_id2):
@@ -142,9 +255,9 @@ class SRNNet(IPNet):
         """
         ms_delay, bw = self.find_path_properties(start=intf1, end=intf2)
         entry = {"name1": intf1.node.name, "name2": intf2.node.name,
-                 "addr1": str(next(intf1.ip6s(exclude_lls=True)).ip),
+                 "addr1": str(self.address_index[intf1].globals[0].ip),
                  # Can raise an exception if none exists
-                 "addr2": str(next(intf2.ip6s(exclude_lls=True)).ip),
+                 "addr2": str(self.address_index[intf2].globals[0].ip),
                  # Can raise an exception if none exists
                  "metric": intf1.igp_metric,
                  "bw": bw,
@@ -157,29 +270,59 @@ class SRNNet(IPNet):
             entry["routerId2"] = ospfv3_id2
             return "AvailableLink", entry
 
+    def apply_cost_model(self):
+        """Set the IGP metric of every router interface according to the cost model
+           so that the static routes, SRNOSPF6 and the link rows of the controllers use the same costs"""
+        if self.cost_model is None:
+            return
+        cost = get_cost_model(self.cost_model)
+        # Compute all the costs first since the model can depend on the current IGP metrics
+        costs = [(intf, cost(intf)) for r in self.routers for intf in realIntfList(r)]
+        for intf, value in costs:
+            intf.params["igp_metric"] = value
+
     def start(self):
+        start = time.monotonic()
         # Controller nodes must be started first (because of ovsdb daemon)
         self.routers = sorted(self.routers, key=lambda router: not router.controller)
 
+        self.apply_cost_model()
+        # The addresses are allocated when the network is built
+        self.address_index = AddressIndex(self)
+        for node in self.values():
+            # Used by the daemons when their configuration is built
+            node.address_index = self.address_index
+        if self.spread_daemons:
+            self.daemon_placement = place_daemons(self)
+
         if self.static_routing:
             log.output("*** Inserting static routes\n")
+            paths = {r.name: find_closest_paths(r) for r in self.routers}
+            multipath = WeightedMultipath(paths, tolerance=self.multipath_tolerance) \
+                if self.weighted_multipath else None
             for r in self.routers:
-                lans, loopbacks = find_closest_paths(r)
-                for lan, routes in lans.items():
-                    self._add_static_routes_to_itf(r, lan, routes)
-                for node, routes in loopbacks.items():
-                    self._add_static_routes_to_itf(r, node, routes)
+                lans, loopbacks = paths[r.name]
+                specs = []
+                for dest, routes in itertools.chain(lans.items(), loopbacks.items()):
+                    weights = None
+                    if multipath is not None:
+                        routes, weights = self._weighted_routes(multipath, r, dest, routes)
+                    specs.extend(self._static_routes_to_itf(r, dest, routes, weights))
+                self.static_routes[r.name] = specs
+                self._add_static_routes(r, specs)
 
         super().start()
+        # The link-local addresses only exist once the interfaces are up
+        self.address_index.refresh()
 
         # Insert the initial topology info to SRDB
         name_ospfid_mapping = {}
         name_prefix_mapping = {}
-        sr_controller_ovsdb = None
+        controller_ovsdbs = {}
         for router in self.routers:
-            for ip6 in self[router.name].intf("lo").ip6s(exclude_lls=True, exclude_lbs=True):
-                name_prefix_mapping[router.name] = ip6
-                break
+            loopbacks = self.address_index.loopbacks(self[router.name])
+            if loopbacks:
+                name_prefix_mapping[router.name] = loopbacks[0]
             for daemon in router.nconfig.daemons:
                 if daemon.NAME == SRNOSPF6.NAME:
                     if daemon.options.routerid:
@@ -189,38 +332,352 @@ class SRNNet(IPNet):
                             router.nconfig.routerid
                     name_ospfid_mapping[router.name] = int(ipaddress.ip_address(name_ospfid_mapping[router.name]))
                 elif daemon.NAME == OVSDB.NAME:
-                    sr_controller_ovsdb = daemon
+                    controller_ovsdbs[router.name] = daemon
 
-        if sr_controller_ovsdb:
-            log.info('*** Inserting mapping between names and ids to OVSDB\n')
+        self.controller_ovsdbs = controller_ovsdbs
+        self.ovsdb_rows = []
+        if controller_ovsdbs:
+            log.info('*** Building mapping between names and ids\n')
             for r in self.routers:
-                print(sr_controller_ovsdb.insert_entry(*self.ovsdb_node_entry(r, name_ospfid_mapping.get(r.name, None),
-                                                                              name_prefix_mapping[r.name])))
+                self.ovsdb_rows.append(self.ovsdb_node_entry(r, name_ospfid_mapping.get(r.name, None),
+                                                             name_prefix_mapping[r.name]))
 
-            log.info('*** Inserting mapping between links, router ids and ipv6 addresses to OVSDB\n')
-            print(len(self.broadcast_domains))
+            log.info('*** Building mapping between links, router ids and ipv6 addresses\n')
             for domain in self.broadcast_domains:
-                print(domain.interfaces)
                 if len(domain.routers) <= 1:
                     continue
-                print(len(domain.routers))
                 for intf_r1 in list(domain.routers):
                     for intf_r2 in list(domain.routers):
                         if intf_r1.name <= intf_r2.name:
                             continue
-                        print(intf_r1.name)
-                        print(intf_r2.name)
                         # TODO Links should be oriented in the future !
-                        print(sr_controller_ovsdb.insert_entry(
-                            *self.ovsdb_link_entry(intf_r1, intf_r2,
-                                                   name_ospfid_mapping.get(intf_r1.node.name, None),
-                                                   name_ospfid_mapping.get(intf_r2.node.name, None))))
+                        self.ovsdb_rows.append(self.ovsdb_link_entry(intf_r1, intf_r2,
+                                                                     name_ospfid_mapping.get(intf_r1.node.name, None),
+                                                                     name_ospfid_mapping.get(intf_r2.node.name, None)))
+
+            # Every controller has its own replica of the topology
+            for name, ovsdb in controller_ovsdbs.items():
+                log.info('*** Inserting %d topology rows to OVSDB of %s\n' % (len(self.ovsdb_rows), name))
+                log.debug('%s\n' % ovsdb.insert_entries(self.ovsdb_rows))
+
+        self.initial_link_params = {intf: intf.tc_params for node in self.values()
+                                    for intf in realIntfList(node)}
+        self.initial_kernel_state = {node.name: self.settled_kernel_state(node) for node in self.hosts + self.routers}
 
         log.info('*** Individual daemon commands with netns commands\n')
         for r in self.routers:
             for d in r.nconfig.daemons:
                 log.info('ip netns exec %s "%s"\n' % (r.name, d.startup_line))
 
+        if self.wait_convergence and not self.static_routing:
+            self.wait_igp(start=start)
+
+    def wait_igp(self, start=None):
+        """Block until every router running SRNOSPF6 has its adjacencies, its full LSDB
+           and routes towards all the loopbacks
+
+        :param start: The time.monotonic() reference of the convergence times (the call by default)
+        :return: the dict {router name: convergence time in seconds}"""
+        log.info('*** Waiting for the IGP convergence\n')
+        self.convergence_times = OSPF6Gate(self, stall_timeout=self.convergence_timeout).wait(start=start)
+        if self.convergence_times:
+            log.info('*** IGP converged in %.3f seconds\n' % max(self.convergence_times.values()))
+        return self.convergence_times
+
+    def stop(self):
+        self.stop_telemetry()
+        self.stop_ovsdb_maintenance()
+        if not self.fast_teardown:
+            return super().stop()
+        self.teardown_durations = Teardown(self).run()
+
+    def start_telemetry(self, **kwargs):
+        """Start updating the available bandwidth of the links in the controller databases
+           according to the traffic (see LinkTelemetry for the parameters)
+
+        :return: the LinkTelemetry instance"""
+        self.stop_telemetry()
+        self.telemetry = LinkTelemetry(self, **kwargs)
+        self.telemetry.start()
+        return self.telemetry
+
+    def stop_telemetry(self):
+        if self.telemetry is not None:
+            self.telemetry.stop()
+            self.telemetry = None
+
+    def start_ovsdb_maintenance(self, **kwargs):
+        """Start monitoring the controller databases and compacting them when they grow too much
+           (see OVSDBMaintenance for the parameters)
+
+        :return: the OVSDBMaintenance instance"""
+        self.stop_ovsdb_maintenance()
+        self.ovsdb_maintenance = OVSDBMaintenance(self, **kwargs)
+        self.ovsdb_maintenance.start()
+        return self.ovsdb_maintenance
+
+    def stop_ovsdb_maintenance(self):
+        if self.ovsdb_maintenance is not None:
+            self.ovsdb_maintenance.stop()
+            self.ovsdb_maintenance = None
+
+    def update_dns(self, added=(), removed=(), zone="test.sr"):
+        """Register or unregister hosts in the DNS zones of the SRN while it is running.
+           A host goes to the sub-zone of its access router if the domain uses sub-zones.
+
+        :param added: The hosts to register
+        :param removed: The hosts to unregister
+        :param zone: The name of the zone of the domain"""
+        zone = zone.rstrip(".") + "."
+        masters = {}  # {zone name: (SRNNamed, SRNZone)}
+        for r in self.routers:
+            named = daemon_in_node(r, SRNNamed)
+            if named is not None:
+                for z in named.master_zones():
+                    masters[z.name] = (named, z)
+
+        changes = {}  # {zone name: (added, removed)}
+        for host in added:
+            access_router = host.defaultIntf().broadcast_domain.routers[0].node.name
+            name = "%s.%s" % (access_router, zone) if "%s.%s" % (access_router, zone) in masters else zone
+            changes.setdefault(name, ([], []))[0].append(host.name)
+        for host in removed:
+            for name, (_, z) in masters.items():
+                if host.name in z.hosts:
+                    changes.setdefault(name, ([], []))[1].append(host.name)
+
+        for name, (zone_added, zone_removed) in changes.items():
+            if name not in masters:
+                raise Exception("Cannot find the master of the DNS zone %s" % name)
+            named, z = masters[name]
+            named.update_zone(z, added=zone_added, removed=zone_removed)
+
+    def sr_daemons(self):
+        """Return the list of (router, daemon) for the daemons that hold SRN state,
+           ordered by startup order"""
+        return [(r, d) for r in self.routers for d in r.nconfig.daemons
+                if isinstance(d, (SRNDaemon, SRNOSPF6))]
+
+    def shaped_intfs(self):
+        """Return the interfaces on which a delay is enforced"""
+        return [intf for intf in self.initial_link_params if intf.params.get("delay")]
+
+    def reset(self, link_params=None, check=True):
+        """Bring the network back to the state it had right after start()
+           while keeping the namespaces, the links and the addresses.
+           SRN daemons are restarted, the local SID tables are flushed,
+           the controller database is reset to its initial rows,
+           the links left down are brought back up with their addresses,
+           the link parameters are reapplied (the queuing disciplines that differ
+           from the ones after start() are rebuilt) and the static routes are reinstalled
+           if the kernel dropped some of them.
+
+        :param link_params: a dict {interface: {tc parameter: value}} overriding
+                            the initial traffic control parameters of these interfaces
+        :param check: whether to check that no state leaked from the previous experiment
+        :return: the time spent (in seconds) to reset the network"""
+        start = time.time()
+        link_params = link_params if link_params else {}
+        sr_daemons = self.sr_daemons()
+        telemetry = self.telemetry
+        if telemetry is not None:
+            telemetry.stop()
+
+        log.info('*** Stopping SRN daemons\n')
+        for r, d in reversed(sr_daemons):
+            r.stop_daemon(d)
+
+        log.info('*** Flushing local SID tables\n')
+        for _, d in sr_daemons:
+            if isinstance(d, SRRouted):
+                d.flush_localsid_table()
+
+        log.info('*** Resetting the controller databases\n')
+        for ovsdb in self.controller_ovsdbs.values():
+            ovsdb.reset_tables(self.ovsdb_rows)
+
+        log.info('*** Restoring links\n')
+        states = {name: self.kernel_state(self[name]) for name in self.initial_kernel_state}
+        self.restore_links(states)
+
+        log.info('*** Reapplying link parameters\n')
+        for intf, initial_params in self.initial_link_params.items():
+            params = dict(initial_params)
+            params.update(link_params.get(intf, {}))
+            tc = states.get(intf.node.name, {}).get("tc", {}).get(intf.name)
+            if params == initial_params and tc != self.initial_kernel_state[intf.node.name]["tc"].get(intf.name):
+                # Left behind by tc commands (e.g., an aborted FaultTimeline), mininet does not clear
+                # the queuing disciplines of an interface without parameters
+                intf.cmd("tc qdisc del dev %s root" % intf.name)
+                intf.reconfigure(**params)
+            elif params != intf.tc_params:
+                intf.reconfigure(**params)
+
+        if self.static_routing:
+            for r in self.routers:
+                if self.kernel_state(r)["routes"] != self.initial_kernel_state[r.name]["routes"]:
+                    log.info('*** Reinstalling the static routes of %s\n' % r.name)
+                    self._add_static_routes(r, self.static_routes.get(r.name, []), replace=True)
+
+        if check:
+            leaks = self.leaked_state(link_params)
+            if leaks:
+                for leak in leaks:
+                    log.error(leak + "\n")
+                raise Exception("State leaked from the previous experiment")
+
+        log.info('*** Restarting SRN daemons\n')
+        for r, d in sr_daemons:
+            r.start_daemon(d)
+        if self.wait_convergence and not self.static_routing:
+            self.wait_igp()
+
+        if telemetry is not None:
+            # The available bandwidths were reset with the databases
+            self.start_telemetry(interval=telemetry.interval, smoothing=telemetry.smoothing,
+                                 threshold=telemetry.threshold, max_duty=telemetry.max_duty,
+                                 recorder=telemetry.recorder)
+
+        duration = time.time() - start
+        log.info('*** Network reset in %.3f seconds\n' % duration)
+        return duration
+
+    def restore_links(self, states, timeout=5.):
+        """Bring back up the interfaces that were up right after start(), restore their addresses
+           and the commands of ipmininet (e.g., the default routes of the hosts), and wait until
+           their operational states are back
+
+        :param states: the dict {node name: kernel state} of the nodes (see kernel_state())
+        :param timeout: the maximum number of seconds to wait for the operational states"""
+        restored = {}
+        for name, initial in self.initial_kernel_state.items():
+            node = self[name]
+            for intf in realIntfList(node):
+                up, _ = initial["links"].get(intf.name, (False, None))
+                if up and not states[name]["links"].get(intf.name, (False, None))[0]:
+                    log.info('*** Bringing %s up\n' % intf.name)
+                    lines = ["ip link set dev %s up" % intf.name]
+                    lines.extend("ip addr replace %s dev %s" % (ip6.with_prefixlen, intf.name)
+                                 for ip6 in intf.ip6s(exclude_lls=True))
+                    node.cmd("; ".join(lines + intf.restore_cmds))
+                    restored.setdefault(name, []).append(intf.name)
+
+        deadline = time.monotonic() + timeout
+        while restored and time.monotonic() < deadline:
+            for name in list(restored):
+                links = self.kernel_state(self[name], routes=False)["links"]
+                initial = self.initial_kernel_state[name]["links"]
+                if all(links.get(intf) == initial.get(intf) for intf in restored[name]):
+                    del restored[name]
+            if restored:
+                time.sleep(.01)
+
+    def settled_kernel_state(self, node, timeout=5.):
+        """Return the kernel state of a node (see kernel_state()) once the operational state
+           of its interfaces that are administratively up is no longer down
+
+        :param timeout: the maximum number of seconds to wait for the operational states"""
+        # The kernel updates the operational state of the links asynchronously
+        deadline = time.monotonic() + timeout
+        state = self.kernel_state(node)
+        while time.monotonic() < deadline \
+                and any(link and link[0] and link[1] in ("DOWN", "LOWERLAYERDOWN") for link in state["links"].values()):
+            time.sleep(.01)
+            state = self.kernel_state(node)
+        return state
+
+    def kernel_state(self, node, routes=True):
+        """Return the state of a node read from the kernel, i.e., the dict with:
+           - links: {interface name: (whether it is administratively up, operational state)}
+           - tc: {interface name: list of its queuing disciplines and classes}
+           - routes: the sorted list of the routes of the main IPv6 table (None if the routes
+                     are computed by an IGP or not asked)
+
+        :param node: the host or the router
+        :param routes: whether the routes are read"""
+        names = [intf.name for intf in realIntfList(node)]
+        state = {"routes": None}
+        nl = node_netlink(node)
+        if nl is not None:
+            links = nl.route.link_states()
+            tc = nl.route.traffic_control()
+            state["links"] = {name: links.get(name) for name in names}
+            state["tc"] = {name: tc.get(name, []) for name in names}
+            if routes and self.static_routing:
+                intfs = {index: name for name, index in nl.route.links(refresh=True).items()}
+                lines = []
+                for route in nl.route.dump_routes(table=RT_TABLE_MAIN):
+                    nexthops = [dict(nh, oif=intfs.get(nh["oif_index"])) for nh in route.get("nexthops", [])]
+                    route = dict(route, oif=intfs.get(route.get("oif_index")), nexthops=nexthops)
+                    del route["table"]
+                    lines.append(" ".join(ip_route_args(route)))
+                state["routes"] = sorted(lines)
+            return state
+
+        state["links"] = {}
+        for line in node.cmd("ip -o link show").splitlines():
+            fields = line.split()
+            if len(fields) < 3:
+                continue
+            name = fields[1].rstrip(":").split("@")[0]
+            operstate = fields[fields.index("state") + 1] if "state" in fields else "UNKNOWN"
+            if name in names:
+                state["links"][name] = ("UP" in fields[2].strip("<>").split(","), operstate)
+        state["links"] = {name: state["links"].get(name) for name in names}
+        # The qdiscs of htb report a packet counter
+        state["tc"] = {name: sorted(re.sub(r" direct_packets_stat \d+", "", line).strip()
+                                    for line in node.cmd("tc qdisc show dev %s; tc class show dev %s"
+                                                         % (name, name)).splitlines() if line.strip())
+                       for name in names}
+        if routes and self.static_routing:
+            # The nexthops of multipath routes are on the following lines
+            state["routes"] = sorted(re.sub(r"\s*\n\s+", " ", node.cmd("ip -6 route show table main")).splitlines())
+        return state
+
+    def leaked_state(self, link_params=None):
+        """Return the list of differences between the current state of the network
+           and the one right after start() (SRN daemons are expected to be stopped).
+           The links, the queuing disciplines and, with static routing, the routes of the main table
+           are read from the kernel, the queuing disciplines of the interfaces whose parameters
+           are overridden by link_params are not compared."""
+        link_params = link_params if link_params else {}
+        leaks = []
+        for r, d in self.sr_daemons():
+            if r.daemon_processes(d):
+                leaks.append("%s is still running on %s" % (d.NAME, r.name))
+            if isinstance(d, SRRouted):
+                routes = d.localsid_routes()
+                if routes:
+                    leaks.append("%d routes remain in %s: %s" % (len(routes), d.localsid_name, routes))
+
+        for name, ovsdb in self.controller_ovsdbs.items():
+            expected = {table: 0 for table in ovsdb.options.schema_tables}
+            for table, _ in self.ovsdb_rows:
+                expected[table] = expected.get(table, 0) + 1
+            counts = ovsdb.row_counts(expected.keys())
+            for table, count in expected.items():
+                if counts.get(table) != count:
+                    leaks.append("Table %s of %s has %s rows instead of %d"
+                                 % (table, name, counts.get(table), count))
+
+        overridden = {intf.name for intf, params in link_params.items()
+                      if dict(self.initial_link_params.get(intf, {}), **params) != self.initial_link_params.get(intf)}
+        for name, initial in self.initial_kernel_state.items():
+            state = self.kernel_state(self[name])
+            for intf, link in initial["links"].items():
+                if state["links"].get(intf) != link:
+                    leaks.append("Interface %s is %s instead of %s" % (intf, state["links"].get(intf), link))
+            for intf, tc in initial["tc"].items():
+                if intf not in overridden and state["tc"].get(intf) != tc:
+                    leaks.append("Interface %s has the traffic control %s instead of %s"
+                                 % (intf, state["tc"].get(intf), tc))
+            if initial["routes"] is not None and state["routes"] != initial["routes"]:
+                missing = sorted(set(initial["routes"]) - set(state["routes"]))
+                added = sorted(set(state["routes"]) - set(initial["routes"]))
+                leaks.append("The main table of %s lacks %d routes %s and has %d new routes %s"
+                             % (name, len(missing), missing[:10], len(added), added[:10]))
+        return leaks
+
 
 def cost_intf(intf):
     return intf.igp_metric
@@ -1,5 +1,9 @@
 import errno
 import os
+import shlex
+import time
+
+import psutil
 
 from ipmininet.router import Router
 from ipmininet.router.config import RouterConfig
@@ -7,6 +11,10 @@ from ipmininet.router.config.ospf6 import OSPF6RedistributedRoute
 from ipmininet.srv6 import enable_srv6
 from mininet.log import lg
 
+from .netlink import NetlinkError, node_netlink
+from .resources import create_cgroup
+from .sysctl import SysctlNodeMixin
+
 
 class SRNConfig(RouterConfig):
 
@@ -36,6 +44,19 @@ class SRNConfig(RouterConfig):
                 d.append(SRRouted)
         d.extend(additional_daemons)
         super().__init__(node, daemons=d, *args, **kwargs)
+        # RouterConfig.build() only registers the dependencies when the node starts, register them now
+        # so that they can be configured before (e.g., placed on a core by place_daemons())
+        self.register_dependencies()
+
+    def register_dependencies(self):
+        """Register the daemons (and their own dependencies) needed by the registered daemons"""
+        count = None
+        while count != len(self._daemons):
+            count = len(self._daemons)
+            for daemon in list(self._daemons.values()):
+                for cls in daemon.DEPENDS:
+                    if cls.NAME not in self._daemons:
+                        self.register_daemon(cls)
 
 
 def mkdir_p(path):
@@ -48,27 +69,179 @@ def mkdir_p(path):
             raise
 
 
-class SRNRouter(Router):
+class SRNRouter(SysctlNodeMixin, Router):
+    # Whether the router needs a working directory for the configuration of its daemons
+    USES_CWD = True
 
-    def __init__(self, name, config=SRNConfig, cwd="/tmp", static_routing=False, *args, **kwargs):
+    def __init__(self, name, config=SRNConfig, cwd="/tmp", static_routing=False, use_netlink=True, *args, **kwargs):
+        """:param static_routing: Whether routes are inserted at start-up instead of using SRNOSPF6
+           :param use_netlink: Whether routes, rules and SRv6 settings are managed through netlink sockets
+                               instead of 'ip' commands"""
         # Variables defined before to be accessible for config daemons
         self.static_routing = static_routing
+        self.use_netlink = use_netlink
+        self.netlink = None
+        self.start_duration = None
         super().__init__(name, config=config, cwd=cwd, *args, **kwargs)
-        mkdir_p(cwd)
+        if self.USES_CWD:
+            mkdir_p(cwd)
 
     def start(self):
+        start = time.time()
         enable_srv6(self)
+        self.apply_sysctls()
+
+        self.set_tunsrc()
 
-        # Set SRv6 source address for encapsulation
+        super().start()
+        self.start_duration = time.time() - start
+
+    def set_tunsrc(self):
+        """Set SRv6 source address for encapsulation"""
         for ip6 in self.intf('lo').ip6s(exclude_lls=True, exclude_lbs=True):
+            nl = node_netlink(self)
+            if nl is not None:
+                try:
+                    nl.set_tunsrc(ip6.ip.compressed)
+                    return
+                except (OSError, NetlinkError) as e:
+                    lg.debug(self.name, 'Cannot set SRv6 source address through netlink:', str(e))
+
             cmd = ["ip", "sr", "tunsrc", "set", ip6.ip.compressed]
             out, err, code = self.pexec(cmd)
             if code:
                 lg.error(self.name, 'Cannot set SRv6 source address [rcode:', str(code),
                          ']\nstdout:', str(out), '\nstderr:', str(err))
-            break
+            return
 
-        super().start()
+    def terminate(self):
+        super().terminate()
+        if self.netlink is not None:
+            self.netlink.close()
+
+    def daemon_processes(self, daemon):
+        """Return the psutil processes running the given daemon on this router"""
+        # The launchers of the startup line (e.g., taskset) are replaced by the daemon process
+        cmdline = shlex.split(getattr(daemon, "command_line", daemon.startup_line))
+        processes = []
+        for p in psutil.process_iter(attrs=["cmdline"]):
+            if p.info["cmdline"] == cmdline:
+                processes.append(p)
+        return processes
+
+    def stop_daemon(self, daemon, timeout=2):
+        """Terminate the processes of a daemon without cleaning its configuration files
+
+        :param daemon: the daemon to stop
+        :param timeout: the time (in seconds) given to the processes to terminate before being killed"""
+        processes = self.daemon_processes(daemon)
+        for p in processes:
+            try:
+                p.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        _, alive = psutil.wait_procs(processes, timeout=timeout)
+        for p in alive:
+            try:
+                p.kill()
+            except psutil.NoSuchProcess:
+                pass
+        psutil.wait_procs(alive)
+
+    def start_daemon(self, daemon, timeout=30.):
+        """Launch a daemon whose configuration files were already written and wait until it is started
+
+        :param daemon: the daemon to start
+        :param timeout: the maximum time (in seconds) to wait for the daemon to be started"""
+        start = time.time()
+        self._processes.popen(shlex.split(daemon.startup_line))
+        while not daemon.has_started():
+            if time.time() - start > timeout:
+                raise Exception("%s of %s is not started after %d seconds (see %s)"
+                                % (daemon.NAME, self.name, timeout, daemon.options.get("logfile")))
+            time.sleep(.001)
+
+    def restart_daemon(self, daemon, timeout=30.):
+        self.stop_daemon(daemon)
+        self.start_daemon(daemon, timeout=timeout)
+
+    def daemon_ready(self, daemon):
+        """Return whether a daemon is running and listens on its ports (see the listen_ports of the daemon)"""
+        processes = self.daemon_processes(daemon)
+        if not processes or not daemon.has_started():
+            return False
+        ports = set(getattr(daemon, "listen_ports", ()))
+        if not ports:
+            return True
+        for p in processes:
+            try:
+                ports.difference_update(c.laddr[1] for c in p.connections(kind="inet") if c.laddr)
+            except psutil.NoSuchProcess:
+                return False
+        return not ports
+
+    def reconfigure_daemon(self, daemon, timeout=30., **options):
+        """Change the options of a running daemon and restart only this daemon.
+           The configuration of the daemon is built and rendered again while the old process is running
+           and only the files whose content changed are rewritten. The daemon is not restarted
+           if neither its files nor its startup line changed. The other daemons, including ovsdb-server
+           and its database, are left untouched.
+
+        :param daemon: The daemon (or its name) to reconfigure
+        :param timeout: The maximum time (in seconds) to wait for the daemon to be ready again
+        :param options: The options to change (e.g., worker_threads=4 or loglevel='info')
+        :return: the dict {'changed': list of rewritten files, 'restarted', 'downtime', 'duration'}
+                 where 'downtime' is the time (in seconds) between the termination of the old process
+                 and the readiness of the new one"""
+        from .config import OVSDB, ResourceLimitedDaemon, SRRouted
+        start = time.time()
+        if isinstance(daemon, str):
+            daemon = self.nconfig.daemon(daemon)
+        if isinstance(daemon, OVSDB):
+            raise Exception("%s cannot be reconfigured without losing the state of its clients" % daemon.NAME)
+        unknown = [key for key in options if key not in daemon.options]
+        if unknown:
+            raise Exception("Unknown options of %s: %s" % (daemon.NAME, ", ".join(unknown)))
+
+        startup_line = daemon.startup_line
+        daemon.options.update(**options)
+        cfg = self.nconfig._cfg
+        cfg[daemon.NAME] = daemon.build()
+        changed = []
+        for filename, content in daemon.render(cfg).items():
+            try:
+                with open(filename) as fileobj:
+                    if fileobj.read() == content:
+                        continue
+            except FileNotFoundError:
+                pass
+            with open(filename, "w") as fileobj:
+                fileobj.write(content)
+            changed.append(filename)
+        daemon.files = list(dict.fromkeys(daemon.files))  # render() appends the files at each call
+
+        report = {"changed": changed, "restarted": False, "downtime": 0., "duration": 0.}
+        if changed or daemon.startup_line != startup_line:
+            if isinstance(daemon, ResourceLimitedDaemon) and daemon.cgroup is not None:
+                create_cgroup(daemon.cgroup, cpu_quota=daemon.options.cpu_quota,
+                              memory_max=daemon.options.memory_max)
+            stop = time.time()
+            self.stop_daemon(daemon)
+            if isinstance(daemon, SRRouted):
+                # As in SRNNet.reset(), sr-routed installs its binding SIDs again from the database
+                daemon.flush_localsid_table()
+            self._processes.popen(shlex.split(daemon.startup_line))
+            while not self.daemon_ready(daemon):
+                if time.time() - stop > timeout:
+                    raise Exception("%s of %s is not ready after %d seconds (see %s)"
+                                    % (daemon.NAME, self.name, timeout, daemon.options.get("logfile")))
+                time.sleep(.01)
+            report["restarted"] = True
+            report["downtime"] = time.time() - stop
+        report["duration"] = time.time() - start
+        lg.info("*** %s of %s reconfigured in %.3f seconds (downtime %.3f seconds)\n"
+                % (daemon.NAME, self.name, report["duration"], report["downtime"]))
+        return report
 
     @property
     def controller(self):
@@ -82,6 +255,54 @@ class SRNRouter(Router):
     def sr_controller(self):
         return self.get('sr_controller', None)
 
+    @property
+    def sr_controllers(self):
+        """The names of the routers running a SRN controller that this router can use"""
+        return self.get('sr_controllers', [self.sr_controller] if self.sr_controller else [])
+
     @property
     def schema_tables(self):
         return self.get('schema_tables', None)
+
+
+class SRNLightRouter(SRNRouter):
+    """A transit router for static routing that only needs kernel state.
+       It does not start any daemon and it does not write configuration files:
+       its sysctls are set in one pass, its SRv6 source address through netlink and the end
+       of the duplicate address detection is checked through netlink.
+       Sysctls are not restored on termination since they die with the network namespace."""
+    USES_CWD = False
+
+    def start(self):
+        if self.nconfig.daemons:
+            # Additional daemons were requested, fall back to the full lifecycle,
+            # with the directory of their files that was not created in __init__()
+            mkdir_p(self.cwd)
+            return super().start()
+
+        start = time.time()
+        enable_srv6(self)
+        self.apply_sysctls()
+        self.set_tunsrc()
+        self.wait_dad()
+        self.start_duration = time.time() - start
+
+    def wait_dad(self, poll=.01):
+        """Wait until the IPv6 addresses passed the duplicate address detection, as IPNode.start(),
+           so that the routes installed next do not use tentative addresses
+
+        :param poll: the time (in seconds) between two checks"""
+        nl = node_netlink(self)
+        while True:
+            if nl is not None:
+                tentative = nl.route.tentative_addresses()
+                failed = any(dadfailed for _, dadfailed in tentative)
+            else:
+                out, _, _ = self.pexec(["ip", "-6", "addr", "show", "tentative"])
+                tentative = out.strip()
+                failed = "dadfailed" in out
+            if failed:
+                raise Exception("At least two nodes have the same IPv6 address as %s" % self.name)
+            if not tentative:
+                return
+            time.sleep(poll)
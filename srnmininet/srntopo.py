@@ -7,11 +7,14 @@ MAX_QUEUE = 1000000000
 
 class SRNTopo(IPTopo):
 
-    def __init__(self, controllers, cwd=None, *args, **kwargs):
-        """:param controllers: The name (or list of names) of routers that will run a SRN controller"""
+    def __init__(self, controllers, cwd=None, daemon_resources=None, *args, **kwargs):
+        """:param controllers: The name (or list of names) of routers that will run a SRN controller
+           :param daemon_resources: The default CPU, memory and nice settings of the daemons of every router
+                                    indexed by daemon name (see srnmininet.config.ResourceLimitedDaemon)"""
 
         self.access_routers = []
         self.cwd = cwd
+        self.daemon_resources = daemon_resources
         self.controllers = [controllers] if isinstance(controllers, str) else list(controllers)
         self.inter_switches = {}
         self.switch_count = 0
@@ -21,6 +24,8 @@ class SRNTopo(IPTopo):
     def addRouter(self, name, **params):
         if self.cwd is not None and "cwd" not in params:
             params["cwd"] = os.path.join(self.cwd, name)
+        if self.daemon_resources is not None and "daemon_resources" not in params:
+            params["daemon_resources"] = self.daemon_resources
         return super().addRouter(name, **params)
 
     def addLink(self, node1, node2, delay=None, bw=None, max_queue_size=MAX_QUEUE, **opts):
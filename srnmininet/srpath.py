@@ -0,0 +1,375 @@
+"""Reference computation of SR paths and segment lists.
+
+The graph is built from the rows describing the topology in the controller
+databases (NodeState/NameIdMapping and LinkState/AvailableLink), either the
+ones generated by SRNNet or the ones read back from an OVSDB server.
+
+Nodes and links are indexed by integers and stored in flat lists so that
+all-pairs computations stay fast on topologies of a few thousands of routers.
+Links are bidirectional: each row gives one arc in each direction.
+
+A segment list is made of node segments (the loopback address of a router,
+reached through the IGP shortest paths) and, when a link is not on the IGP
+shortest path, of adjacency segments (the address of the next router on that link,
+which is reached through the connected route of the link).
+"""
+import heapq
+import ipaddress
+
+NODE_TABLES = ("NodeState", "NameIdMapping")
+LINK_TABLES = ("LinkState", "AvailableLink")
+
+INF = float("inf")
+WEIGHTS = ("metric", "delay")
+
+
+class SRGraph:
+
+    def __init__(self, allow_ecmp=False):
+        """:param allow_ecmp: Whether a node segment can encode a subpath
+                              that is one of several equal-cost IGP shortest paths"""
+        self.allow_ecmp = allow_ecmp
+
+        # Nodes
+        self.names = []
+        self.index = {}  # {name: node index}
+        self.addrs = []
+        self.prefixes = []  # [(ipaddress.IPv6Network, node index)]
+        self.addr_index = {}  # {address: (node index, link index or None)}
+        self.adj = []  # {node index: [link index]}
+
+        # Arcs (a row of the databases gives two arcs)
+        self.src = []
+        self.dst = []
+        self.metric = []
+        self.delay = []
+        self.bw = []
+        self.ava_bw = []
+        self.dst_addr = []  # Address of the destination node on the link (adjacency segment)
+
+        self._igp_trees = {}
+
+    # Construction
+
+    def add_node(self, name, addr=None, prefixes=()):
+        idx = self.index.get(name)
+        if idx is None:
+            idx = self.index[name] = len(self.names)
+            self.names.append(name)
+            self.addrs.append(None)
+            self.adj.append([])
+        if addr:
+            self.addrs[idx] = addr
+            self.addr_index[ipaddress.ip_address(addr).compressed] = (idx, None)
+        for prefix in prefixes:
+            if prefix:
+                self.prefixes.append((ipaddress.ip_network(prefix, strict=False), idx))
+        return idx
+
+    def _add_arc(self, u, v, metric, delay, bw, ava_bw, addr):
+        link = len(self.src)
+        self.src.append(u)
+        self.dst.append(v)
+        self.metric.append(metric)
+        self.delay.append(delay)
+        self.bw.append(bw)
+        self.ava_bw.append(ava_bw)
+        self.dst_addr.append(addr)
+        self.adj[u].append(link)
+        if addr:
+            self.addr_index[ipaddress.ip_address(addr).compressed] = (v, link)
+        return link
+
+    def add_link(self, name1, name2, metric=1, delay=0, bw=0, ava_bw=None, addr1=None, addr2=None):
+        """Add a bidirectional link (bw=0 means unlimited bandwidth)"""
+        u = self.add_node(name1)
+        v = self.add_node(name2)
+        ava_bw = bw if ava_bw is None else ava_bw
+        self._add_arc(u, v, metric, delay, bw, ava_bw, addr2)
+        self._add_arc(v, u, metric, delay, bw, ava_bw, addr1)
+        self._igp_trees = {}
+
+    def add_row(self, table, row):
+        if table in NODE_TABLES:
+            self.add_node(row.get("name", row.get("routerName")), row.get("addr"),
+                          row.get("prefix", "").split(";"))
+        elif table in LINK_TABLES:
+            self.add_link(row["name1"], row["name2"], metric=row.get("metric", 1), delay=row.get("delay", 0),
+                          bw=row.get("bw", 0), ava_bw=row.get("ava_bw"),
+                          addr1=row.get("addr1"), addr2=row.get("addr2"))
+
+    @classmethod
+    def from_rows(cls, rows, **kwargs):
+        """Build the graph from a list of (table name, row), e.g., SRNNet.ovsdb_rows"""
+        graph = cls(**kwargs)
+        for table, row in rows:
+            graph.add_row(table, row)
+        return graph
+
+    @classmethod
+    def from_ovsdb(cls, ovsdb, static_routing=True, **kwargs):
+        """Build the graph from the rows currently stored in a controller database
+
+        :param ovsdb: The OVSDB daemon of the controller
+        :param static_routing: Whether the network uses the NodeState/LinkState tables
+                               instead of NameIdMapping/AvailableLink"""
+        tables = ("NodeState", "LinkState") if static_routing else ("NameIdMapping", "AvailableLink")
+        results = ovsdb.transact([{"op": "select", "table": table, "where": []} for table in tables])
+        if results is None:
+            raise Exception("Cannot read the topology from the database of %s" % ovsdb._node.name)
+        return cls.from_rows([(table, row) for table, result in zip(tables, results)
+                              for row in result.get("rows", [])], **kwargs)
+
+    # Lookups
+
+    def node_of(self, address):
+        """Return the index of the node owning an address (or a prefix containing it), None if not found"""
+        address = ipaddress.ip_address(address)
+        owner = self.addr_index.get(address.compressed)
+        if owner is not None:
+            return owner[0]
+        best = None
+        for prefix, idx in self.prefixes:
+            if address in prefix and (best is None or prefix.prefixlen > best[0].prefixlen):
+                best = (prefix, idx)
+        return best[1] if best else None
+
+    def nodes(self, path, src):
+        """Return the node indexes of a path given as a list of arcs"""
+        return [src] + [self.dst[link] for link in path]
+
+    def path_properties(self, path):
+        """Return the dict with the metric, the delay and the bottleneck (available) bandwidth of a path
+           (0 for unlimited bandwidth)"""
+        bws = [self.ava_bw[link] for link in path if self.bw[link]]
+        return {"metric": sum(self.metric[link] for link in path),
+                "delay": sum(self.delay[link] for link in path),
+                "bw": min(bws) if bws else 0}
+
+    def _usable(self, link, min_bw):
+        return not min_bw or not self.bw[link] or self.ava_bw[link] >= min_bw
+
+    # Shortest paths
+
+    def shortest_path_tree(self, src, weight="metric", min_bw=0):
+        """Compute the shortest paths from a node
+
+        :param src: The node index
+        :param weight: 'metric' or 'delay'
+        :param min_bw: Links whose available bandwidth is lower are ignored
+        :return: the lists (distance, number of shortest paths capped to 2, last arc) indexed by node"""
+        weights = getattr(self, weight)
+        dist = [INF] * len(self.names)
+        count = [0] * len(self.names)
+        pred = [-1] * len(self.names)
+        dist[src] = 0
+        count[src] = 1
+        heap = [(0, src)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for link in self.adj[u]:
+                if min_bw and not self._usable(link, min_bw):
+                    continue
+                v = self.dst[link]
+                nd = d + weights[link]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    count[v] = count[u]
+                    pred[v] = link
+                    heapq.heappush(heap, (nd, v))
+                elif nd == dist[v]:
+                    count[v] = min(2, count[v] + count[u])
+        return dist, count, pred
+
+    def igp_tree(self, src):
+        tree = self._igp_trees.get(src)
+        if tree is None:
+            tree = self._igp_trees[src] = self.shortest_path_tree(src)
+        return tree
+
+    @staticmethod
+    def _tree_path(pred, src_arcs, dst):
+        path = []
+        while pred[dst] != -1:
+            link = pred[dst]
+            path.append(link)
+            dst = src_arcs[link]
+        path.reverse()
+        return path
+
+    def shortest_path(self, src, dst, weight="delay", min_bw=0, max_delay=None):
+        """Compute the shortest path between two nodes under constraints
+
+        :param src: The source node (name or index)
+        :param dst: The destination node (name or index)
+        :param weight: The metric to minimize ('metric' or 'delay')
+        :param min_bw: The minimum available bandwidth on every link of the path
+        :param max_delay: The maximum delay of the path
+        :return: the list of arcs of the path or None if no path satisfies the constraints"""
+        src = self.index.get(src, src)
+        dst = self.index.get(dst, dst)
+        if weight not in WEIGHTS:
+            raise Exception("Unknown path weight '%s' (available: %s)" % (weight, ", ".join(WEIGHTS)))
+
+        if weight == "delay" or max_delay is None:
+            dist, _, pred = self.shortest_path_tree(src, weight, min_bw)
+            if dist[dst] == INF or (max_delay is not None and dist[dst] > max_delay):
+                return None
+            return self._tree_path(pred, self.src, dst)
+
+        # Minimum metric under a delay bound: label-setting on the Pareto front of (metric, delay)
+        # The minimum delay to the destination prunes the labels that cannot meet the bound
+        min_delay, _, _ = self.shortest_path_tree(dst, "delay", min_bw)
+        if min_delay[src] > max_delay:
+            return None
+        labels = [(src, -1, -1)]  # (node, arc, parent label)
+        fronts = [[] for _ in self.names]  # {node: [(metric, delay)]} non-dominated labels
+        heap = [(0, 0, 0)]  # (metric, delay, label)
+        while heap:
+            metric, delay, label = heapq.heappop(heap)
+            u = labels[label][0]
+            if u == dst:
+                path = []
+                while labels[label][1] != -1:
+                    path.append(labels[label][1])
+                    label = labels[label][2]
+                path.reverse()
+                return path
+            for link in self.adj[u]:
+                if min_bw and not self._usable(link, min_bw):
+                    continue
+                v = self.dst[link]
+                n_metric = metric + self.metric[link]
+                n_delay = delay + self.delay[link]
+                if n_delay + min_delay[v] > max_delay:
+                    continue
+                if any(m <= n_metric and d <= n_delay for m, d in fronts[v]):
+                    continue
+                fronts[v] = [(m, d) for m, d in fronts[v] if m < n_metric or d < n_delay]
+                fronts[v].append((n_metric, n_delay))
+                labels.append((v, link, label))
+                heapq.heappush(heap, (n_metric, n_delay, len(labels) - 1))
+        return None
+
+    def all_pairs(self, weight="delay", min_bw=0):
+        """Yield (source name, destination name, path, segment list) for every pair of connected nodes"""
+        for src in range(len(self.names)):
+            dist, _, pred = self.shortest_path_tree(src, weight, min_bw)
+            for dst in range(len(self.names)):
+                if dst == src or dist[dst] == INF:
+                    continue
+                path = self._tree_path(pred, self.src, dst)
+                yield self.names[src], self.names[dst], path, self.segment_list(path, src)
+
+    # Segment lists
+
+    def segment_list(self, path, src=None):
+        """Return the minimal list of segments that forces the traffic on the path
+
+        :param path: The list of arcs
+        :param src: The source node (name or index, deduced from the path if not empty)"""
+        if not path:
+            return []
+        src = self.index.get(src, src)
+        nodes = self.nodes(path, self.src[path[0]] if src is None else src)
+        segments = []
+        i = 0
+        while i < len(path):
+            dist, count, _ = self.igp_tree(nodes[i])
+            # The longest subpath that is the IGP shortest path is encoded by a node segment.
+            # If a subpath is not one, none of its extensions are.
+            best = i
+            cost = 0
+            for j in range(i + 1, len(nodes)):
+                cost += self.metric[path[j - 1]]
+                if cost != dist[nodes[j]] or (count[nodes[j]] > 1 and not self.allow_ecmp):
+                    break
+                best = j
+            if best == i:  # Adjacency segment
+                segments.append(self.dst_addr[path[i]])
+                i += 1
+            else:
+                segments.append(self.addrs[nodes[best]])
+                i = best
+        return segments
+
+    def decode(self, src, segments, dst=None):
+        """Return the path followed by the traffic from a node with a segment list
+
+        :param src: The source node (name or index)
+        :param segments: The list of segment addresses
+        :param dst: The final destination node (name or index) reached by IGP routing after the last segment
+        :return: the tuple (list of arcs, whether equal-cost paths could have been followed instead,
+                 e.g., when the address of a link is reached with equal costs through the link and another path)"""
+        cur = self.index.get(src, src)
+        path = []
+        ambiguous = False
+        targets = []
+        for segment in segments:
+            owner = self.addr_index.get(ipaddress.ip_address(segment).compressed)
+            if owner is None:
+                node = self.node_of(segment)
+                if node is None:
+                    raise Exception("Cannot find the node of the segment %s" % segment)
+                owner = (node, None)
+            targets.append(owner)
+        if dst is not None:
+            targets.append((self.index.get(dst, dst), None))
+
+        for node, link in targets:
+            if link is not None:
+                # The address of the link is reached through the closest end of the link
+                other = self.src[link]
+                dist, count, _ = self.igp_tree(cur)
+                if dist[other] + self.metric[link] <= dist[node] or cur == other:
+                    if cur != other:
+                        ambiguous |= self._follow_igp(cur, other, path)
+                        # The link is then on a shortest path towards its far end,
+                        # the traffic is split if it is not the only one
+                        ambiguous |= count[node] > 1
+                    path.append(link)
+                    cur = node
+                    continue
+            if node != cur:
+                ambiguous |= self._follow_igp(cur, node, path)
+                cur = node
+        return path, ambiguous
+
+    def _follow_igp(self, src, dst, path):
+        dist, count, pred = self.igp_tree(src)
+        if dist[dst] == INF:
+            raise Exception("%s cannot reach %s" % (self.names[src], self.names[dst]))
+        path.extend(self._tree_path(pred, self.src, dst))
+        return count[dst] > 1
+
+    def check(self, src, dst, segments, weight="delay", min_bw=0, max_delay=None, tolerance=0.):
+        """Compare a segment list computed by a controller to the reference
+
+        :param src: The ingress node (name or index)
+        :param dst: The egress node (name or index)
+        :param segments: The segment list to check
+        :param tolerance: The relative increase of the path weight still considered as optimal
+        :return: a dict describing the path of the segment list and the reference one"""
+        src = self.index.get(src, src)
+        dst = self.index.get(dst, dst)
+        path, ambiguous = self.decode(src, segments, dst)
+        properties = self.path_properties(path)
+        reference = self.shortest_path(src, dst, weight=weight, min_bw=min_bw, max_delay=max_delay)
+        report = {"source": self.names[src], "destination": self.names[dst],
+                  "path": [self.names[n] for n in self.nodes(path, src)],
+                  "properties": properties,
+                  "ambiguous": ambiguous,
+                  "constraints_met": (not min_bw or not properties["bw"] or properties["bw"] >= min_bw)
+                                     and (max_delay is None or properties["delay"] <= max_delay),
+                  "minimal": len(segments) <= len(self.segment_list(path, src))}
+        if reference is None:
+            report.update(reference=None, optimal=False)
+        else:
+            ref_properties = self.path_properties(reference)
+            report.update(reference=[self.names[n] for n in self.nodes(reference, src)],
+                          reference_properties=ref_properties,
+                          reference_segments=self.segment_list(reference, src),
+                          optimal=properties[weight] <= ref_properties[weight] * (1 + tolerance))
+        return report
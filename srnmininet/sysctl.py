@@ -0,0 +1,130 @@
+import shlex
+
+from mininet.log import lg
+
+
+class SysctlManager:
+    """Collect the sysctls of a node and of its interfaces and apply them in one pass.
+       All the values are written (and read back) directly in /proc/sys by a single shell process
+       running in the namespace of the node."""
+
+    def __init__(self, node, deferred=False):
+        """:param node: The node whose namespace is configured
+           :param deferred: Whether the sysctls are kept pending until apply() is called.
+                            Otherwise, every call to set() applies the value immediately."""
+        self._node = node
+        self.deferred = deferred
+        # Sysctls are indexed by their path in /proc/sys so that the same knob is never written twice
+        self.pending = {}  # {path: value} not yet written
+        self.applied = {}  # {path: value} written and verified
+        self.previous = {}  # {path: value} before the first write
+
+    @staticmethod
+    def proc_path(key):
+        """Return the path in /proc/sys of a sysctl key.
+           As for the sysctl command, a key containing a '/' uses it as separator
+           (so that interface names can contain '.')."""
+        if "/" in key:
+            return "/proc/sys/" + key.strip("/")
+        return "/proc/sys/" + key.replace(".", "/")
+
+    @staticmethod
+    def normalize(value):
+        return " ".join(str(value).split())
+
+    def set(self, key, value):
+        """Register a sysctl value
+
+        :param key: the sysctl key (e.g., net.ipv6.conf.all.forwarding)
+        :param value: the value to set
+        :return: the value of the sysctl before it was first written by this manager (if known)"""
+        path = self.proc_path(key)
+        value = self.normalize(value)
+        if self.applied.get(path) == value:
+            self.pending.pop(path, None)
+        else:
+            self.pending[path] = value
+        if not self.deferred:
+            self.apply()
+        return self.previous.get(path)
+
+    def set_intf(self, intf, family, option, value):
+        """Register a sysctl value for an interface
+
+        :param intf: the interface name
+        :param family: 'ipv4' or 'ipv6'
+        :param option: the name of the option in net.<family>.conf.<intf>"""
+        return self.set("net/%s/conf/%s/%s" % (family, intf, option), value)
+
+    def apply(self):
+        """Write every pending value and check the result
+
+        :return: the dict {path: value read back} of the sysctls that could not be set"""
+        if not self.pending:
+            return {}
+
+        lines = []
+        for path, value in self.pending.items():
+            path = shlex.quote(path)
+            lines.append('old=; new=; read -r old < {path}; echo {value} > {path}; read -r new < {path};'
+                         ' printf "%s|%s|%s\\n" {path} "$old" "$new"'
+                         .format(path=path, value=shlex.quote(value)))
+        out, err, code = self._node.pexec(["sh", "-c", "\n".join(lines) + "\n"])
+
+        failed = {}
+        results = {}
+        for line in out.splitlines():
+            try:
+                path, old, new = line.split("|")
+            except ValueError:
+                continue
+            results[path] = (old, new)
+        for path, value in self.pending.items():
+            old, new = results.get(path, (None, None))
+            if old and path not in self.previous:
+                self.previous[path] = old
+            if new is not None and self.normalize(new) == value:
+                self.applied[path] = value
+            else:
+                failed[path] = new
+        self.pending = {}
+
+        for path, value in failed.items():
+            lg.error("%s: Cannot set sysctl %s (value read: %s)\n" % (self._node.name, path, value))
+        if failed and err:
+            lg.error("%s: %s\n" % (self._node.name, err))
+        return failed
+
+
+def sysctl_manager(node):
+    """Return the sysctl manager of a node. Nodes that do not defer their sysctls
+       (e.g., switches) get a manager applying each value immediately."""
+    manager = getattr(node, "sysctl_manager", None)
+    if manager is None:
+        manager = node.sysctl_manager = SysctlManager(node)
+    return manager
+
+
+class SysctlNodeMixin:
+    """Make an IPNode set all its sysctls (and the ones of its interfaces) in one pass"""
+
+    def __init__(self, *args, **kwargs):
+        self.sysctl_manager = SysctlManager(self, deferred=True)
+        super().__init__(*args, **kwargs)
+
+    def apply_sysctls(self):
+        """Apply the sysctls of the node configuration and of its interfaces.
+           The following ones are applied immediately."""
+        for opt, val in self.nconfig.sysctl:
+            self.sysctl_manager.set(opt, val)
+        self.sysctl_manager.apply()
+        self.sysctl_manager.deferred = False
+
+    def _set_sysctl(self, key, val):
+        # Values were already set by apply_sysctls()
+        return self.sysctl_manager.set(key, val)
+
+    def terminate(self):
+        # Sysctls are not restored since they disappear with the namespace
+        self._old_sysctl = {}
+        super().terminate()
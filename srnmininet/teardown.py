@@ -0,0 +1,341 @@
+import os
+import re
+import signal
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ipmininet.host.config as host_daemons
+import ipmininet.router.config as router_daemons
+import psutil
+from ipmininet.utils import has_cmd, is_container
+from mininet.log import lg
+from mininet.nodelib import LinuxBridge
+from mininet.term import cleanUpScreens
+
+import srnmininet.config as srn_daemons
+from .config import SRRouted
+from .resources import cgroup_parent, remove_cgroup
+
+RT_TABLES = "/etc/iproute2/rt_tables"
+# Lines of the local SID tables created by SRRouted.add_localsid_table()
+LOCALSID_LINE = re.compile(r"^\d+\s+\S+\.localsid(\.\d+)?\s*$")
+# Interfaces created by the links of Mininet
+LINK_NAME = re.compile(r"^[-_.\w]+-eth\d+$")
+# Marker of the shells of the Mininet nodes (see mininet.node.Node.startShell)
+NODE_SHELL = "mininet:"
+
+
+def netns_id(pid):
+    """Return the identifier of the network namespace of a process (None if the process is gone)"""
+    try:
+        return os.stat("/proc/%d/ns/net" % pid).st_ino
+    except OSError:
+        return None
+
+
+def namespace_processes():
+    """Return the dict {network namespace identifier: [psutil processes]} of all the processes.
+       /proc is scanned once for the whole network."""
+    namespaces = {}
+    for p in psutil.process_iter(attrs=["cmdline"]):
+        ns = netns_id(p.pid)
+        if ns is not None:
+            namespaces.setdefault(ns, []).append(p)
+    return namespaces
+
+
+def kill_process_groups(processes, timeout=2., exclude=()):
+    """Terminate the process groups of the processes and kill the processes still alive after the timeout
+
+    :param processes: The psutil processes
+    :param timeout: The time (in seconds) given to the processes to terminate before being killed
+    :param exclude: The process groups that are left untouched
+    :return: the number of processes that had to be killed"""
+    exclude = set(exclude)
+    exclude.add(os.getpgrp())
+    groups = set()
+    targets = []
+    for p in processes:
+        try:
+            pgid = os.getpgid(p.pid)
+        except ProcessLookupError:
+            continue
+        if pgid not in exclude:
+            groups.add(pgid)
+            targets.append(p)
+    for pgid in groups:
+        try:
+            os.killpg(pgid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    _, alive = psutil.wait_procs(targets, timeout=timeout)
+    for p in alive:
+        try:
+            p.kill()
+        except psutil.NoSuchProcess:
+            pass
+    psutil.wait_procs(alive)
+    return len(alive)
+
+
+def delete_links(names):
+    """Delete links of the root namespace with a single 'ip' process.
+       Links that do not exist anymore are ignored.
+
+    :return: the number of links that could not be deleted"""
+    names = list(names)
+    if not names:
+        return 0
+    batch = "".join("link del dev %s\n" % name for name in names)
+    p = subprocess.run(["ip", "-force", "-batch", "-"], input=batch, universal_newlines=True,
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    remaining = [name for name in names if os.path.exists("/sys/class/net/%s" % name)]
+    for name in remaining:
+        lg.error("Cannot delete link %s\n" % name)
+    if remaining and p.stderr:
+        lg.debug(p.stderr)
+    return len(remaining)
+
+
+def remove_rt_tables(match):
+    """Remove the lines of /etc/iproute2/rt_tables for which match(line) is true in one rewrite
+
+    :return: the number of removed lines"""
+    try:
+        with open(RT_TABLES) as fileobj:
+            content = fileobj.readlines()
+    except FileNotFoundError:
+        return 0
+    kept = [line for line in content if not match(line)]
+    if len(kept) != len(content):
+        with open(RT_TABLES + ".tmp", "w") as fileobj:
+            fileobj.writelines(kept)
+        os.replace(RT_TABLES + ".tmp", RT_TABLES)
+    return len(content) - len(kept)
+
+
+def daemon_patterns():
+    """Return the process names of the daemons of IPMininet and SRNMininet"""
+    patterns = set()
+    for package in (router_daemons, host_daemons, srn_daemons):
+        for d in package.__all__:
+            obj = getattr(package, d, None)
+            killp = getattr(obj, "KILL_PATTERNS", None)
+            if not killp and package is srn_daemons:
+                killp = getattr(obj, "NAME", None)
+            if not killp:
+                continue
+            if not is_container(killp):
+                killp = [killp]
+            patterns.update(killp)
+    return patterns
+
+
+class Teardown:
+    """Stop a network with a few batched operations instead of node by node.
+
+       The processes of all the namespaces are found with a single scan of /proc and
+       the daemons of the nodes are killed by process group, in parallel for each namespace.
+       The entries of all the local SID tables are removed from /etc/iproute2/rt_tables in one rewrite
+       (their rules and routes disappear with the namespaces).
+       The links of the root namespace (i.e., the ports of the switches) and the bridges are deleted
+       by a single 'ip' process, the other ones disappear with the namespaces.
+
+       Every step ignores what is already gone so that the teardown can be run several times."""
+
+    def __init__(self, net, workers=32, timeout=2.):
+        """:param net: The network to stop
+           :param workers: The maximum number of nodes stopped in parallel
+           :param timeout: The time (in seconds) given to the daemons to terminate before being killed"""
+        self.net = net
+        self.workers = workers
+        self.timeout = timeout
+        self.durations = {}  # {step name: duration in seconds}
+
+    @staticmethod
+    def is_running(node):
+        return getattr(node, "shell", None) is not None
+
+    def _step(self, name, func, *args):
+        start = time.time()
+        result = func(*args)
+        self.durations[name] = time.time() - start
+        return result
+
+    def _parallel(self, func, items):
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items))) as executor:
+            return list(executor.map(func, items))
+
+    def stop_controllers(self):
+        for controller in self.net.controllers:
+            controller.stop()
+        if self.net.terms:
+            for term in self.net.terms:
+                try:
+                    os.kill(term.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            self.net.terms = []
+            cleanUpScreens()
+
+    def kill_daemons(self):
+        """Kill every process of the namespaces of the nodes but their shells
+
+        :return: the number of processes that had to be killed"""
+        nodes = [n for n in self.net.routers + self.net.hosts if self.is_running(n) and n.inNamespace]
+        namespaces = namespace_processes()
+        root = netns_id(os.getpid())
+
+        def kill(node):
+            ns = netns_id(node.pid)
+            if ns is None or ns == root:
+                return 0
+            try:
+                shell_group = os.getpgid(node.pid)
+            except ProcessLookupError:
+                return 0
+            return kill_process_groups(namespaces.get(ns, []), timeout=self.timeout, exclude=(shell_group,))
+
+        return sum(self._parallel(kill, nodes))
+
+    def remove_localsid_tables(self):
+        """Remove the local SID tables of all the routers from rt_tables in one rewrite"""
+        daemons = [d for r in self.net.routers for d in r.nconfig.daemons
+                   if isinstance(d, SRRouted) and d.localsid_idx > 0]
+        lines = {d.rt_tables_line() for d in daemons}
+        removed = remove_rt_tables(lambda line: line in lines)
+        for d in daemons:
+            # SRRouted.cleanup() has nothing left to do
+            d.localsid_idx = -1
+        return removed
+
+    def terminate_nodes(self):
+        nodes = [n for n in self.net.routers + self.net.hosts if self.is_running(n)]
+        self._parallel(lambda n: n.terminate(), nodes)
+        return len(nodes)
+
+    def delete_links(self):
+        """Delete the links and the bridges of the root namespace and stop the switches"""
+        names = []
+        for node in self.net.switches + self.net.routers + self.net.hosts:
+            if not node.inNamespace:
+                names.extend(intf.name for intf in node.intfList() if node.name in intf.name)
+        switches = [s for s in self.net.switches if self.is_running(s)]
+        names.extend(s.name for s in switches if isinstance(s, LinuxBridge))
+        failed = delete_links(names)
+
+        # Other switches are shut down by their own class, without deleting their interfaces again
+        others = {}
+        for switch in switches:
+            if not isinstance(switch, LinuxBridge):
+                others.setdefault(type(switch), []).append(switch)
+        for cls, group in others.items():
+            stopped = cls.batchShutdown(group) if hasattr(cls, "batchShutdown") else []
+            for switch in group:
+                if switch not in stopped:
+                    switch.stop(deleteIntfs=False)
+
+        self._parallel(lambda s: s.terminate(), [s for s in switches if self.is_running(s)])
+        return failed
+
+    def run(self):
+        """Stop the network
+
+        :return: the dict {step name: duration in seconds}"""
+        start = time.time()
+        lg.info('*** Stopping %d controllers\n' % len(self.net.controllers))
+        self._step("controllers", self.stop_controllers)
+        lg.info('*** Killing the daemons of %d nodes\n' % (len(self.net.routers) + len(self.net.hosts)))
+        killed = self._step("daemons", self.kill_daemons)
+        if killed:
+            lg.info('*** %d processes did not terminate in time and were killed\n' % killed)
+        lg.info('*** Removing the local SID tables\n')
+        self._step("rt_tables", self.remove_localsid_tables)
+        lg.info('*** Stopping %d routers and %d hosts\n' % (len(self.net.routers), len(self.net.hosts)))
+        self._step("nodes", self.terminate_nodes)
+        lg.info('*** Deleting %d links and stopping %d switches\n'
+                % (len(self.net.links), len(self.net.switches)))
+        self._step("links", self.delete_links)
+        self.durations["total"] = time.time() - start
+        lg.info('*** Network stopped in %.3f seconds\n' % self.durations["total"])
+        return self.durations
+
+
+def cleanup(level='info', workers=32, timeout=2.):
+    """Remove what a crashed run left behind, without the network object:
+       the processes of the namespaces holding a Mininet shell or a daemon of IPMininet or SRNMininet,
+       the links of the root namespace named as the ones of Mininet, the bridges whose ports were such links,
+       the cgroups of the daemons and the local SID tables of /etc/iproute2/rt_tables.
+
+       It can be used instead of ipmininet.clean.cleanup() for SRNs since it does not wait for each
+       process name in turn, but it only handles the Linux bridges and the Open vSwitch bridges."""
+    lg.setLogLevel(level)
+    start = time.time()
+    root = netns_id(os.getpid())
+    patterns = daemon_patterns()
+
+    lg.info('*** Killing the processes of leftover nodes\n')
+    namespaces = namespace_processes()
+    leftovers = []
+    shells = []
+    for ns, processes in namespaces.items():
+        node_shells = []
+        has_daemon = False
+        for p in processes:
+            cmdline = p.info["cmdline"] or []
+            if any(arg.startswith(NODE_SHELL) for arg in cmdline):
+                node_shells.append(p)
+            elif cmdline and any(os.path.basename(cmdline[0]).startswith(pattern) for pattern in patterns):
+                has_daemon = True
+        if ns == root:
+            shells.extend(node_shells)  # The shells of the switches, nothing else is killed there
+        elif node_shells or has_daemon:
+            leftovers.append(processes)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(leftovers) + 1))) as executor:
+        killed = list(executor.map(lambda processes: kill_process_groups(processes, timeout=timeout),
+                                   leftovers + [shells]))
+    lg.info('*** %d namespaces cleaned, %d processes killed\n' % (len(leftovers), sum(killed)))
+
+    lg.info('*** Removing leftover links and bridges\n')
+    links = [name for name in os.listdir("/sys/class/net") if LINK_NAME.match(name)]
+    bridges = []
+    for name in os.listdir("/sys/class/net"):
+        brif = "/sys/class/net/%s/brif" % name
+        if os.path.isdir(brif) and any(LINK_NAME.match(port) for port in os.listdir(brif)):
+            bridges.append(name)
+    if has_cmd("ovs-vsctl"):
+        out = subprocess.run(["ovs-vsctl", "--timeout=1", "list-br"], universal_newlines=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+        ovs_bridges = []
+        for bridge in out.split():
+            ports = subprocess.run(["ovs-vsctl", "--timeout=1", "list-ports", bridge], universal_newlines=True,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+            if any(LINK_NAME.match(port) for port in ports.split()):
+                ovs_bridges.append(bridge)
+        if ovs_bridges:
+            cmd = ["ovs-vsctl"]
+            for bridge in ovs_bridges:
+                cmd += ["--", "--if-exists", "del-br", bridge]
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    delete_links(links + bridges)
+    lg.info('*** %d links and %d bridges deleted\n' % (len(links), len(bridges)))
+
+    lg.info('*** Removing leftover cgroups\n')
+    parent = cgroup_parent()
+    if os.path.isdir(parent):
+        for name in os.listdir(parent):
+            if os.path.isdir(os.path.join(parent, name)):
+                remove_cgroup(os.path.join(parent, name))
+
+    lg.info('*** Removing leftover local SID tables\n')
+    removed = remove_rt_tables(LOCALSID_LINE.match)
+    lg.info('*** %d tables removed\n' % removed)
+    lg.info('*** Cleanup done in %.3f seconds\n' % (time.time() - start))
+
+
+if __name__ == '__main__':
+    cleanup()
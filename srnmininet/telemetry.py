@@ -0,0 +1,287 @@
+import os
+import threading
+import time
+
+import psutil
+from ipmininet.utils import realIntfList
+from mininet.log import lg
+
+from .netlink import NetlinkError, node_netlink
+from .resources import parse_size
+
+# Tables of the controller databases describing links
+LINK_TABLES = ("LinkState", "AvailableLink")
+
+SYSFS_COUNTERS = 'for i in /sys/class/net/*; do read -r tx < "$i/statistics/tx_bytes" && echo "${i##*/} $tx"; done'
+
+
+class LinkTelemetry:
+    """Sample the transmitted bytes of the router interfaces and update
+       the available bandwidth (ava_bw) of the links in the controller databases.
+
+       Each sampling pass reads the counters of every router with a single netlink dump
+       (or a single process reading /sys/class/net if netlink is not used).
+       The utilisation of a link is smoothed by an exponentially weighted moving average
+       and only the changes larger than a threshold are pushed, as one transaction per database."""
+
+    def __init__(self, net, interval=1., smoothing=0.5, threshold=0.05, max_duty=0.1, recorder=None):
+        """:param net: The started SRNNet
+           :param interval: The number of seconds between two sampling passes
+           :param smoothing: The weight of the previous estimation of the utilisation in [0, 1[
+           :param threshold: The minimum change of available bandwidth (relative to the link bandwidth)
+                             that is pushed to the controller databases
+           :param max_duty: The maximum fraction of the time spent sampling and pushing updates.
+                            The interval is extended if a pass takes too long.
+           :param recorder: A measurement Recorder receiving the smoothed used bandwidth of every interface"""
+        self.net = net
+        self.interval = interval
+        self.smoothing = smoothing
+        self.threshold = threshold
+        self.max_duty = max_duty
+        self.recorder = recorder
+
+        self.links = self._links()  # List of dicts with the table, row and interface of each link
+        self.counters = {}  # {(router name, interface name): (timestamp, transmitted bytes)}
+        self.used_bw = {}  # {(router name, interface name): smoothed used bandwidth}
+        self.pushed = {}  # {link index: last ava_bw pushed}
+        self.passes = 0
+        self.updates = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _links(self):
+        intf_by_addr = {}
+        for r in self.net.routers:
+            for intf in realIntfList(r):
+                for ip6 in self.net.address_index[intf].globals:
+                    intf_by_addr[(r.name, str(ip6.ip))] = intf
+
+        links = []
+        for table, row in self.net.ovsdb_rows:
+            if table not in LINK_TABLES or not row.get("bw"):
+                continue  # Links without bandwidth limit are never full
+            intf = intf_by_addr.get((row["name1"], row["addr1"]))
+            if intf is None:
+                lg.warn("Cannot find the interface of %s with address %s\n" % (row["name1"], row["addr1"]))
+                continue
+            links.append({"table": table, "row": row, "intf": intf})
+        return links
+
+    @staticmethod
+    def read_counters(node):
+        """Return the dict {interface name: transmitted bytes} of a node"""
+        nl = node_netlink(node)
+        if nl is not None:
+            try:
+                return {name: tx for name, (_, tx) in nl.route.link_stats().items()}
+            except (OSError, NetlinkError) as e:
+                lg.error("%s: Cannot read interface counters (%s)\n" % (node.name, e))
+                return {}
+        out, _, _ = node.pexec(["sh", "-c", SYSFS_COUNTERS])
+        counters = {}
+        for line in out.splitlines():
+            try:
+                name, tx = line.split()
+                counters[name] = int(tx)
+            except ValueError:
+                continue
+        return counters
+
+    def sample(self):
+        """Read the counters of every router and update the smoothed used bandwidth (in Mbps)"""
+        routers = {link["intf"].node.name: link["intf"].node for link in self.links}
+        for name, node in routers.items():
+            now = time.monotonic()
+            for intf_name, tx in self.read_counters(node).items():
+                key = (name, intf_name)
+                previous = self.counters.get(key)
+                self.counters[key] = (now, tx)
+                if previous is None or now <= previous[0] or tx < previous[1]:
+                    continue
+                used = (tx - previous[1]) * 8 / (now - previous[0]) / 10 ** 6
+                if key in self.used_bw:
+                    used = self.smoothing * self.used_bw[key] + (1 - self.smoothing) * used
+                self.used_bw[key] = used
+                if self.recorder is not None:
+                    self.recorder.record("used_bw", used, node=name, intf=intf_name)
+
+    def operations(self):
+        """Return the OVSDB update operations for the links whose available bandwidth changed enough"""
+        operations = []
+        for i, link in enumerate(self.links):
+            row = link["row"]
+            used = self.used_bw.get((link["intf"].node.name, link["intf"].name))
+            if used is None:
+                continue
+            ava_bw = max(0., row["bw"] - used)
+            if isinstance(row["bw"], int):
+                ava_bw = int(round(ava_bw))
+            if abs(ava_bw - self.pushed.get(i, row["ava_bw"])) < self.threshold * row["bw"]:
+                continue
+            self.pushed[i] = ava_bw
+            operations.append({"op": "update", "table": link["table"],
+                               "where": [[column, "==", row[column]]
+                                         for column in ("name1", "name2", "addr1", "addr2")],
+                               "row": {"ava_bw": ava_bw}})
+        return operations
+
+    def step(self):
+        """Run one sampling pass and push the changes
+
+        :return: the number of updated links"""
+        self.sample()
+        operations = self.operations()
+        if operations:
+            for name, ovsdb in self.net.controller_ovsdbs.items():
+                if ovsdb.transact(operations) is None:
+                    lg.error("Cannot update the available bandwidth in the database of %s\n" % name)
+        self.passes += 1
+        self.updates += len(operations)
+        return len(operations)
+
+    def run(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            self.step()
+            elapsed = time.monotonic() - start
+            self._stop.wait(max(self.interval - elapsed, elapsed * (1 - self.max_duty) / self.max_duty))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        lg.info("*** Starting link telemetry on %d links\n" % len(self.links))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="link-telemetry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        lg.info("*** Link telemetry stopped after %d passes and %d updates\n" % (self.passes, self.updates))
+
+
+class OVSDBMaintenance:
+    """Watch the controller databases during long runs and compact them when they grow too much.
+
+       At each pass, the size of the database file, the row count of every table,
+       the latency of this counting transaction, the resident memory of ovsdb-server
+       and the number of cells that it reports are sampled for every controller.
+       The database of a controller is compacted online through its unixctl socket
+       when one of the thresholds is crossed."""
+
+    def __init__(self, net, interval=10., max_file_size=None, growth_ratio=4., max_rss=None, recorder=None):
+        """:param net: The started SRNNet
+           :param interval: The number of seconds between two passes
+           :param max_file_size: The size of the database file (in bytes or with a K, M or G suffix)
+                                 above which it is compacted
+           :param growth_ratio: The database file is compacted when it becomes this many times larger
+                                than after its last compaction (or than at the first pass)
+           :param max_rss: The resident memory of the server (in bytes or with a K, M or G suffix)
+                           above which the database is compacted
+           :param recorder: A measurement Recorder receiving the sampled metrics"""
+        self.net = net
+        self.interval = interval
+        self.max_file_size = parse_size(max_file_size) if max_file_size is not None else None
+        self.growth_ratio = growth_ratio
+        self.max_rss = parse_size(max_rss) if max_rss is not None else None
+        self.recorder = recorder
+
+        self.samples = {}  # {controller name: last sample}
+        self.baselines = {}  # {controller name: file size after the last compaction}
+        self.compactions = {}  # {controller name: number of compactions}
+        self.passes = 0
+        self._processes = {}  # {controller name: psutil process of ovsdb-server}
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _rss(self, name, ovsdb):
+        p = self._processes.get(name)
+        if p is None or not p.is_running():
+            processes = self.net[name].daemon_processes(ovsdb)
+            if not processes:
+                return None
+            p = self._processes[name] = processes[0]
+        try:
+            return p.memory_info().rss
+        except psutil.NoSuchProcess:
+            del self._processes[name]
+            return None
+
+    def sample(self, name, ovsdb):
+        """Return the metrics of the database of a controller"""
+        start = time.monotonic()
+        rows = ovsdb.row_counts()
+        sample = {"timestamp": time.time(),
+                  "latency": time.monotonic() - start,
+                  "rows": rows,
+                  "file_size": os.path.getsize(ovsdb.database_path),
+                  "rss": self._rss(name, ovsdb)}
+        sample.update(ovsdb.memory_usage())
+        return sample
+
+    def needs_compaction(self, name, sample):
+        if self.max_file_size is not None and sample["file_size"] > self.max_file_size:
+            return True
+        if self.growth_ratio and sample["file_size"] > self.growth_ratio * self.baselines[name]:
+            return True
+        return self.max_rss is not None and sample["rss"] is not None and sample["rss"] > self.max_rss
+
+    def _record(self, name, sample):
+        if self.recorder is None:
+            return
+        timestamp = sample["timestamp"]
+        for metric in ("latency", "file_size", "rss", "cells", "compaction_time"):
+            if sample.get(metric) is not None:
+                self.recorder.record("ovsdb_" + metric, sample[metric], node=name, timestamp=timestamp)
+        for table, count in sample["rows"].items():
+            self.recorder.record("ovsdb_rows", count, node=name, timestamp=timestamp, table=table)
+
+    def step(self):
+        """Run one pass on every controller database
+
+        :return: the number of compacted databases"""
+        compacted = 0
+        for name, ovsdb in self.net.controller_ovsdbs.items():
+            sample = self.sample(name, ovsdb)
+            self.baselines.setdefault(name, sample["file_size"])
+            if self.needs_compaction(name, sample):
+                start = time.monotonic()
+                if ovsdb.compact():
+                    sample["compaction_time"] = time.monotonic() - start
+                    self.baselines[name] = os.path.getsize(ovsdb.database_path)
+                    self.compactions[name] = self.compactions.get(name, 0) + 1
+                    compacted += 1
+                    lg.info("*** Database of %s compacted from %d to %d bytes in %.3f seconds\n"
+                            % (name, sample["file_size"], self.baselines[name], sample["compaction_time"]))
+            self.samples[name] = sample
+            self._record(name, sample)
+        self.passes += 1
+        return compacted
+
+    def run(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            self.step()
+            self._stop.wait(max(0., self.interval - (time.monotonic() - start)))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        lg.info("*** Starting the maintenance of %d controller databases\n" % len(self.net.controller_ovsdbs))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="ovsdb-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        lg.info("*** OVSDB maintenance stopped after %d passes and %d compactions\n"
+                % (self.passes, sum(self.compactions.values())))